@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Benchmark de memoria de los modelos de datos
+Compara ParkingSpace/OccupancyStatus (con __slots__ y NamedTuple) contra las
+dataclasses equivalentes con __dict__ por instancia, y la lista de estados
+contra FrameOccupancy basado en arreglos.
+
+Uso: python benchmark_models.py [espacios] [estados]
+"""
+
+import gc
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+from src.models import ParkingSpace, OccupancyStatus, FrameOccupancy
+
+@dataclass
+class DictParkingSpace:
+    """ParkingSpace original (dataclass con __dict__) como referencia"""
+    x: int
+    y: int
+    width: int
+    height: int
+    id: Optional[str] = None
+    confidence: float = 0.0
+
+@dataclass
+class DictOccupancyStatus:
+    """OccupancyStatus original (dataclass con __dict__) como referencia"""
+    space_id: str
+    is_occupied: bool
+    confidence: float
+    timestamp: str
+
+def measure(label, build):
+    """Memoria retenida y tiempo de construcción de build()"""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - start
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    count = len(result)
+    print(f"  {label:<34} {retained / 1e6:8.1f} MB  {retained / count:6.1f} B/elem  {elapsed * 1000:8.1f} ms")
+    del result
+    return retained
+
+def benchmark_spaces(count):
+    print(f"\n📐 {count:,} espacios")
+    ids = [f"S{i:06d}" for i in range(count)]  # Los IDs se comparten entre variantes
+    coords = [(i % 1000 * 8, i // 1000 * 8) for i in range(count)]
+
+    before = measure("dataclass (__dict__)",
+                     lambda: [DictParkingSpace(x, y, 107, 48, ids[i], 1.0) for i, (x, y) in enumerate(coords)])
+    after = measure("ParkingSpace (__slots__)",
+                    lambda: [ParkingSpace(x, y, 107, 48, ids[i], 1.0) for i, (x, y) in enumerate(coords)])
+    print(f"  → ahorro: {(1 - after / before) * 100:.0f}%")
+
+def benchmark_statuses(count):
+    print(f"\n🚗 {count:,} estados de ocupación")
+    timestamp = "2024-01-01T00:00:00"
+    ids = [f"S{i:06d}" for i in range(count)]
+
+    before = measure("dataclass (__dict__)",
+                     lambda: [DictOccupancyStatus(ids[i], i % 3 == 0, 0.5, timestamp) for i in range(count)])
+    after = measure("OccupancyStatus (NamedTuple)",
+                    lambda: [OccupancyStatus(ids[i], i % 3 == 0, 0.5, timestamp) for i in range(count)])
+    frame = measure("FrameOccupancy (arreglos)",
+                    lambda: FrameOccupancy(ids, np.arange(count) % 3 == 0, np.full(count, 0.5),
+                                           np.zeros(count, dtype=np.int32), timestamp))
+    print(f"  → ahorro NamedTuple: {(1 - after / before) * 100:.0f}%  "
+          f"FrameOccupancy: {(1 - frame / before) * 100:.0f}%")
+
+if __name__ == "__main__":
+    spaces = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    statuses = int(sys.argv[2]) if len(sys.argv) > 2 else 1_000_000
+    print("=" * 70)
+    print("BENCHMARK DE MEMORIA - MODELOS")
+    print("=" * 70)
+    benchmark_spaces(spaces)
+    benchmark_statuses(statuses)
@@ -12,6 +12,11 @@ SRC_DIR = os.path.join(BASE_DIR, "src")
 ASSETS_DIR = os.path.join(BASE_DIR, "assets")
 DOCS_DIR = os.path.join(BASE_DIR, "docs")
 LEGACY_DIR = os.path.join(BASE_DIR, "legacy")
+CACHE_DIR = os.path.join(BASE_DIR, ".cache")
+DETECTION_CACHE_DIR = os.path.join(CACHE_DIR, "detection")
+DATA_DIR = os.path.join(BASE_DIR, "data")
+HISTORY_DB_PATH = os.path.join(DATA_DIR, "occupancy_history.db")
+CLASSIFIER_WEIGHTS_PATH = os.path.join(DATA_DIR, "occupancy_classifier.json")
 
 # Archivos de ejemplo incluidos
 EXAMPLE_VIDEO = os.path.join(ASSETS_DIR, "carPark.mp4")
@@ -30,6 +35,17 @@ DEFAULT_CONFIG = {
     "empty_space_color": (0, 255, 0),    # Verde
     "analysis_methods": ["fixed", "adaptive", "background"],
     "default_analysis_method": "adaptive",
+    "detection_cache_max_mb": 256,
+    "history_enabled": True,
+    "history_batch_size": 500,
+    "undo_memory_budget_mb": 8,
+    "background_update_interval": 10,   # Frames entre actualizaciones del fondo
+    "background_learning_rate": 0.05,
+    "background_relearn_after": 100,    # Frames ocupado antes de revisar si el auto está en el fondo
+    "drift_compensation": False,        # Alinear el layout si la cámara se mueve
+    "drift_update_interval": 10,        # Frames entre estimaciones de deriva
+    "drift_scale": 0.25,                # Reducción del frame para estimar la deriva
+    "video_frame_cache_mb": 128,        # Caché de frames decodificados para navegar el video
 }
 
 def get_asset_path(filename: str) -> str:
@@ -38,7 +54,7 @@ def get_asset_path(filename: str) -> str:
 
 def ensure_directories():
     """Asegura que todas las carpetas necesarias existan"""
-    for directory in [SRC_DIR, ASSETS_DIR, DOCS_DIR, LEGACY_DIR]:
+    for directory in [SRC_DIR, ASSETS_DIR, DOCS_DIR, LEGACY_DIR, DATA_DIR]:
         os.makedirs(directory, exist_ok=True)
 
 def get_project_info() -> dict:
@@ -73,6 +89,7 @@ if __name__ == "__main__":
     print(f"Assets: {ASSETS_DIR}")
     print(f"Documentación: {DOCS_DIR}")
     print(f"Legacy: {LEGACY_DIR}")
+    print(f"Caché: {CACHE_DIR}")
     
     print(f"\nMódulos principales:")
     for module in info['modules']:
@@ -14,12 +14,14 @@ from datetime import datetime
 current_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, current_dir)
 
-# Configurar logging
+from src.io_worker import BackgroundLogHandler, get_background_writer
+
+# Configurar logging (el archivo de log se escribe en el hilo de E/S)
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s',
     handlers=[
-        logging.FileHandler('carpark.log'),
+        BackgroundLogHandler('carpark.log'),
         logging.StreamHandler()
     ]
 )
@@ -124,6 +126,9 @@ def main():
         # Ejecutar la aplicación
         root.mainloop()
         
+        # Completar escrituras pendientes (logs, capturas, layouts)
+        get_background_writer().flush(timeout=5.0)
+        
     except ImportError as e:
         error_msg = f"No se pudo cargar la aplicación:\n{str(e)}\n\nVerifica que todos los archivos estén presentes en src/"
         print(f"❌ Error: {error_msg}")
@@ -0,0 +1,198 @@
+"""
+Análisis de ocupación por sustracción de fondo incremental (método "background")
+Mantiene un modelo del estacionamiento vacío (media móvil con
+cv2.accumulateWeighted) y mide en cada espacio la fracción de píxeles que
+difieren del fondo mediante una imagen integral de la máscara de diferencia.
+El modelo se actualiza cada K frames y solo dentro de los espacios libres, de
+modo que los autos estacionados no se incorporan al fondo.
+
+Si no se fija un fondo con set_background, el primer frame se toma como
+estacionamiento vacío. Para corregir una semilla equivocada (un auto presente
+en ese frame), los espacios que siguen ocupados durante relearn_after frames
+se revisan: si el fondo guardado tiene más textura que el frame actual, el
+auto está en el fondo y no en la escena, y el espacio se vuelve a aprender.
+"""
+import cv2
+import numpy as np
+from typing import List, Optional, Union
+from .models import ParkingSpace, OccupancyStatus, FrameOccupancy, BatchOccupancy, AnalysisStats
+from .batch_analysis import Frames, frame_list, to_gray, valid_space_ids
+from .roi_stats import boxes_from_spaces, clip_boxes, roi_areas, roi_sums
+from .space_labels import get_label_map, has_polygons, layout_key
+
+class BackgroundOccupancyAnalyzer:
+    """Analizador por sustracción de un fondo aprendido incrementalmente"""
+
+    def __init__(self, diff_threshold: int = 30, occupied_fraction: float = 0.25,
+                 learning_rate: float = 0.05, update_interval: int = 10, blur_size: int = 5,
+                 relearn_after: int = 100, texture_ratio: float = 1.5):
+        """
+        Args:
+            diff_threshold: Diferencia de intensidad (0-255) para considerar un píxel distinto del fondo
+            occupied_fraction: Fracción de píxeles distintos a partir de la cual un espacio está ocupado
+            learning_rate: Peso de cada actualización del fondo (accumulateWeighted)
+            update_interval: Cada cuántos frames se actualiza el fondo (K)
+            blur_size: Tamaño del desenfoque previo para reducir ruido (0 = sin desenfoque)
+            relearn_after: Frames seguidos ocupado tras los que se revisa el fondo del espacio (0 = nunca)
+            texture_ratio: Cuánta más textura debe tener el fondo que el frame para volver a aprenderlo
+        """
+        self.diff_threshold = diff_threshold
+        self.occupied_fraction = occupied_fraction
+        self.learning_rate = learning_rate
+        self.update_interval = max(1, update_interval)
+        self.blur_size = blur_size
+        self.relearn_after = relearn_after
+        self.texture_ratio = texture_ratio
+
+        self.frame_count = 0
+        self.seeded_from_frame = False                     # True si el fondo es el primer frame visto
+        self.relearned_spaces = 0                          # Espacios re-aprendidos desde el último reinicio
+        self._background: Optional[np.ndarray] = None     # Modelo float32 H×W
+        self._background_u8: Optional[np.ndarray] = None  # Copia uint8 para la diferencia
+        self._diff: Optional[np.ndarray] = None           # Buffers reutilizados entre frames
+        self._mask: Optional[np.ndarray] = None
+        self._update_mask: Optional[np.ndarray] = None
+        self._label_map = None                             # Para layouts con polígonos
+        self._streak: Optional[np.ndarray] = None         # Frames seguidos ocupado, por espacio
+        self._streak_key = None
+
+    def reset(self):
+        """Descarta el modelo de fondo (se reinicia con el próximo frame)"""
+        self.frame_count = 0
+        self.seeded_from_frame = False
+        self.relearned_spaces = 0
+        self._background = None
+        self._background_u8 = None
+        self._streak = None
+        self._streak_key = None
+
+    def has_background(self) -> bool:
+        return self._background is not None
+
+    def _prepare(self, frame: np.ndarray) -> np.ndarray:
+        gray = to_gray(frame)
+        if self.blur_size > 1:
+            gray = cv2.GaussianBlur(gray, (self.blur_size, self.blur_size), 0)
+        return gray
+
+    def set_background(self, frame: np.ndarray):
+        """Usa un frame del estacionamiento vacío como fondo inicial"""
+        self.reset()
+        self._reset_model(self._prepare(frame))
+
+    def _reset_model(self, gray: np.ndarray):
+        self._background = gray.astype(np.float32)
+        self._background_u8 = gray.copy()
+        self._diff = np.empty_like(gray)
+        self._mask = np.empty_like(gray)
+        self._update_mask = np.zeros_like(gray)
+
+    def _update_background(self, gray: np.ndarray, corners: np.ndarray, free: np.ndarray):
+        """Mezcla el frame en el fondo solo dentro de los espacios libres"""
+        update_mask = self._update_mask
+        update_mask.fill(0)
+        for x0, y0, x1, y1 in corners[free].tolist():
+            update_mask[y0:y1, x0:x1] = 255
+        cv2.accumulateWeighted(gray, self._background, self.learning_rate, mask=update_mask)
+        cv2.convertScaleAbs(self._background, dst=self._background_u8)
+
+    @staticmethod
+    def _texture(image: np.ndarray) -> float:
+        """Textura media de una región (magnitud del laplaciano)"""
+        return float(np.mean(np.abs(cv2.Laplacian(image, cv2.CV_16S))))
+
+    def _relearn_stuck(self, gray: np.ndarray, corners: np.ndarray, stuck: np.ndarray) -> int:
+        """
+        Vuelve a aprender los espacios ocupados hace demasiado cuyo fondo contiene el auto
+
+        Un auto estacionado tiene más textura que el asfalto vacío: si el fondo
+        guardado es más texturado que el frame actual, el auto quedó en la
+        semilla del fondo y el espacio en realidad está libre.
+        """
+        relearned = 0
+        for index in np.flatnonzero(stuck).tolist():
+            x0, y0, x1, y1 = corners[index].tolist()
+            background = self._background_u8[y0:y1, x0:x1]
+            current = gray[y0:y1, x0:x1]
+            if self._texture(background) > self.texture_ratio * self._texture(current):
+                self._background[y0:y1, x0:x1] = current
+                background[...] = current
+                relearned += 1
+            self._streak[index] = 0  # Auto real: se vuelve a revisar tras otros relearn_after frames
+        return relearned
+
+    def _update_streak(self, spaces: List[ParkingSpace], shape: tuple, occupied: np.ndarray) -> np.ndarray:
+        """Cuenta los frames seguidos que cada espacio lleva ocupado"""
+        key = layout_key(spaces, shape)
+        if self._streak is None or key != self._streak_key:
+            self._streak = np.zeros(len(spaces), dtype=np.int64)
+            self._streak_key = key
+        self._streak = np.where(occupied, self._streak + 1, 0)
+        return self._streak
+
+    def analyze_spaces(self, frame: np.ndarray, spaces: List[ParkingSpace]) -> FrameOccupancy:
+        """
+        Analiza la ocupación comparando cada espacio con el fondo
+
+        Si todavía no hay fondo, el primer frame se toma como estacionamiento
+        vacío (seeded_from_frame queda en True hasta que se llame set_background).
+
+        Returns:
+            Estados de ocupación del frame (iterable como OccupancyStatus)
+        """
+        gray = self._prepare(frame)
+        if self._background is None or self._background.shape != gray.shape:
+            self.reset()
+            self._reset_model(gray)
+            self.seeded_from_frame = True
+
+        # Máscara de diferencia con el fondo: una pasada por píxel
+        cv2.absdiff(gray, self._background_u8, dst=self._diff)
+        cv2.threshold(self._diff, self.diff_threshold, 1, cv2.THRESH_BINARY, dst=self._mask)
+
+        # Fracción de píxeles distintos por espacio: cuatro lecturas de la integral
+        # (o un bincount sobre el mapa de etiquetas si hay espacios poligonales)
+        corners = clip_boxes(boxes_from_spaces(spaces), gray.shape)
+        if has_polygons(spaces):
+            self._label_map = get_label_map(self._label_map, spaces, gray.shape)
+            areas = self._label_map.areas
+            differing = self._label_map.counts(self._mask)
+        else:
+            areas = roi_areas(corners)
+            differing = roi_sums(cv2.integral(self._mask, sdepth=cv2.CV_32S), corners)
+        valid = areas > 0
+        fraction = differing / np.maximum(areas, 1)
+
+        occupied = fraction >= self.occupied_fraction
+        confidence = np.minimum(np.abs(fraction - self.occupied_fraction) * 2, 1.0)
+
+        streak = self._update_streak(spaces, gray.shape, valid & occupied)
+
+        # Actualización amortizada del fondo cada K frames
+        self.frame_count += 1
+        if self.frame_count % self.update_interval == 0:
+            self._update_background(gray, corners, valid & ~occupied)
+            if self.relearn_after > 0:
+                self.relearned_spaces += self._relearn_stuck(gray, corners, streak >= self.relearn_after)
+
+        return FrameOccupancy(valid_space_ids(spaces, valid), occupied[valid],
+                              confidence[valid], fraction[valid])
+
+    def analyze_batch(self, frames: Frames, spaces: List[ParkingSpace],
+                      workers: Optional[int] = None,
+                      is_batch: Optional[bool] = None) -> BatchOccupancy:
+        """
+        Analiza un lote de frames en orden (el fondo depende de los frames anteriores,
+        por eso no se reparte en hilos; workers se acepta por compatibilidad)
+        """
+        results = [self.analyze_spaces(frame, spaces) for frame in frame_list(frames, is_batch)]
+        if not results:
+            return BatchOccupancy.empty()
+        return BatchOccupancy(results[0].space_ids,
+                              np.stack([r.is_occupied for r in results]),
+                              np.stack([r.confidence for r in results]),
+                              np.stack([r.metric for r in results]))
+
+    def calculate_statistics(self, occupancy_results: Union[FrameOccupancy, List[OccupancyStatus]]) -> AnalysisStats:
+        """Calcula estadísticas generales (desde los arreglos si es un FrameOccupancy)"""
+        return AnalysisStats.from_results(occupancy_results)
@@ -0,0 +1,69 @@
+"""
+Utilidades para analizar lotes de frames
+Normaliza la entrada (arreglo T×H×W[×3] o lista de frames) y reparte el
+trabajo por frame de OpenCV en un pool de hilos (OpenCV libera el GIL), de
+modo que los analizadores solo vectoricen las decisiones sobre la matriz T×N.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Sequence, TypeVar, Union
+import cv2
+import numpy as np
+from .models import ParkingSpace
+
+Frames = Union[np.ndarray, Sequence[np.ndarray]]
+T = TypeVar('T')
+
+def frame_list(frames: Frames, is_batch: Optional[bool] = None) -> List[np.ndarray]:
+    """
+    Lista de frames a partir de un arreglo apilado T×H×W[×3] o de una secuencia
+
+    Args:
+        frames: Lote apilado, secuencia de frames o un único frame
+        is_batch: Cómo leer un arreglo de 3 ejes. True = lote gris T×H×W,
+                  False = un único frame H×W[×3]. None lo deduce de la forma y
+                  lanza ValueError si el último eje mide 3 (un lote gris de
+                  ancho 3 es indistinguible de un frame BGR)
+    """
+    if isinstance(frames, np.ndarray):
+        if is_batch is False or frames.ndim == 2:
+            return [frames]
+        if frames.ndim not in (3, 4):
+            raise ValueError(f"Lote con forma inválida: {frames.shape} (se espera T×H×W o T×H×W×3)")
+        if frames.ndim == 3 and is_batch is None and frames.shape[-1] == 3:
+            raise ValueError(f"Arreglo ambiguo {frames.shape}: indique is_batch "
+                             "(True = lote gris T×H×W, False = un frame BGR)")
+        return list(frames)
+    return list(frames)
+
+def to_gray(frame: np.ndarray) -> np.ndarray:
+    """Frame en escala de grises (los frames de un canal se devuelven tal cual)"""
+    if frame.ndim == 2:
+        return frame
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+def map_frames(function: Callable[[np.ndarray], T], frames: List[np.ndarray],
+               workers: Optional[int] = None) -> List[T]:
+    """
+    Aplica una función a cada frame conservando el orden
+
+    Args:
+        function: Trabajo por frame (debe ser seguro entre hilos)
+        frames: Frames a procesar
+        workers: Hilos a usar (None = núcleos disponibles, 1 = sin pool)
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(frames)))
+    if workers == 1:
+        return [function(frame) for frame in frames]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(function, frames))
+
+def valid_space_ids(spaces: Sequence[ParkingSpace], valid: np.ndarray) -> List[str]:
+    """IDs de los espacios con ROI válida (los anónimos se numeran entre ellos)"""
+    space_ids = []
+    for space, keep in zip(spaces, valid.tolist()):
+        if keep:
+            space_ids.append(space.id or f"space_{len(space_ids)}")
+    return space_ids
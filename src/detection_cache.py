@@ -0,0 +1,199 @@
+"""
+Caché persistente de detección de espacios
+Guarda en disco los resultados de SmartDetector y sus etapas intermedias
+(mapas de bordes, contornos candidatos, respuestas de template matching)
+indexados por el contenido de la imagen y los parámetros del detector.
+"""
+import os
+import json
+import hashlib
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import List, Optional, Dict, Any
+from .models import ParkingSpace
+
+class DetectionCache:
+    """Caché en disco con desalojo LRU limitado por tamaño"""
+
+    ARRAY_EXT = ".npy"
+    SPACES_EXT = ".json"
+
+    def __init__(self, cache_dir: str, max_bytes: int = 256 * 1024 * 1024):
+        """
+        Args:
+            cache_dir: Directorio donde se guardan las entradas
+            max_bytes: Tamaño máximo total de la caché en bytes
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, int]" = OrderedDict()  # nombre de archivo -> tamaño
+        self._total_bytes = 0
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._scan_existing()
+
+    def _scan_existing(self):
+        """Reconstruye el índice LRU a partir de los archivos existentes (más antiguo primero)"""
+        files = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith((self.ARRAY_EXT, self.SPACES_EXT)):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((stat.st_mtime, name, stat.st_size))
+
+        for _, name, size in sorted(files):
+            self._entries[name] = size
+            self._total_bytes += size
+
+        self._evict()
+
+    @staticmethod
+    def image_key(image: np.ndarray) -> str:
+        """Hash del contenido de la imagen (incluye forma y tipo)"""
+        digest = hashlib.sha1()
+        digest.update(str(image.shape).encode())
+        digest.update(str(image.dtype).encode())
+        digest.update(np.ascontiguousarray(image).data)
+        return digest.hexdigest()
+
+    @staticmethod
+    def make_key(image_key: str, stage: str, **params) -> str:
+        """Construye la clave de una etapa a partir de la imagen y sus parámetros"""
+        if params:
+            encoded = json.dumps(params, sort_keys=True, default=str)
+            params_hash = hashlib.sha1(encoded.encode()).hexdigest()[:16]
+        else:
+            params_hash = "noparams"
+        return f"{image_key[:32]}_{stage}_{params_hash}"
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.cache_dir, name)
+
+    def _touch(self, name: str):
+        """Marca una entrada como usada recientemente"""
+        self._entries.move_to_end(name)
+        try:
+            os.utime(self._path(name), None)
+        except OSError:
+            pass
+
+    def _register(self, name: str):
+        """Registra una entrada recién escrita y aplica el límite de tamaño"""
+        try:
+            size = os.path.getsize(self._path(name))
+        except OSError:
+            return
+
+        old_size = self._entries.pop(name, 0)
+        self._entries[name] = size
+        self._total_bytes += size - old_size
+        self._evict()
+
+    def _evict(self):
+        """Elimina las entradas menos usadas hasta respetar max_bytes"""
+        while self._total_bytes > self.max_bytes and self._entries:
+            name, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            try:
+                os.remove(self._path(name))
+            except OSError:
+                pass
+
+    def _forget(self, name: str):
+        size = self._entries.pop(name, 0)
+        self._total_bytes -= size
+
+    def get_array(self, key: str) -> Optional[np.ndarray]:
+        """Obtiene un mapa intermedio de la caché"""
+        name = key + self.ARRAY_EXT
+        with self._lock:
+            if name not in self._entries:
+                self.misses += 1
+                return None
+            try:
+                array = np.load(self._path(name), allow_pickle=False)
+            except Exception as e:
+                print(f"Error leyendo caché {name}: {e}")
+                self._forget(name)
+                self.misses += 1
+                return None
+            self._touch(name)
+            self.hits += 1
+            return array
+
+    def put_array(self, key: str, array: np.ndarray):
+        """Guarda un mapa intermedio en la caché"""
+        name = key + self.ARRAY_EXT
+        with self._lock:
+            try:
+                tmp_path = self._path(name + ".tmp")
+                with open(tmp_path, 'wb') as f:
+                    np.save(f, np.ascontiguousarray(array), allow_pickle=False)
+                os.replace(tmp_path, self._path(name))
+            except Exception as e:
+                print(f"Error escribiendo caché {name}: {e}")
+                return
+            self._register(name)
+
+    def get_spaces(self, key: str) -> Optional[List[ParkingSpace]]:
+        """Obtiene un resultado final de detección de la caché"""
+        name = key + self.SPACES_EXT
+        with self._lock:
+            if name not in self._entries:
+                self.misses += 1
+                return None
+            try:
+                with open(self._path(name), 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except Exception as e:
+                print(f"Error leyendo caché {name}: {e}")
+                self._forget(name)
+                self.misses += 1
+                return None
+            self._touch(name)
+            self.hits += 1
+            return [ParkingSpace.from_dict(d) for d in data]
+
+    def put_spaces(self, key: str, spaces: List[ParkingSpace]):
+        """Guarda un resultado final de detección en la caché"""
+        name = key + self.SPACES_EXT
+        with self._lock:
+            try:
+                tmp_path = self._path(name + ".tmp")
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump([space.to_dict() for space in spaces], f)
+                os.replace(tmp_path, self._path(name))
+            except Exception as e:
+                print(f"Error escribiendo caché {name}: {e}")
+                return
+            self._register(name)
+
+    def clear(self):
+        """Vacía la caché por completo"""
+        with self._lock:
+            for name in list(self._entries):
+                try:
+                    os.remove(self._path(name))
+                except OSError:
+                    pass
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Información de uso de la caché"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'total_bytes': self._total_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses
+            }
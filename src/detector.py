@@ -3,21 +3,72 @@ Detección inteligente de espacios de estacionamiento
 """
 import cv2
 import numpy as np
-from typing import List, Tuple, Optional
+from typing import List, Tuple, Optional, Callable
 from .models import ParkingSpace
+from .detection_cache import DetectionCache
 
 class SmartDetector:
     """Detector inteligente de espacios de estacionamiento"""
     
-    def __init__(self):
+    def __init__(self, cache: Optional[DetectionCache] = None):
+        """
+        Args:
+            cache: Caché persistente opcional para resultados y etapas intermedias
+        """
         self.min_area = 1000
         self.max_area = 50000
         self.aspect_ratio_range = (0.5, 3.0)
-        self.merge_distance = 50
+        self.merge_distance = 30      # Distancia entre centros para fusionar detecciones
+        self.row_tolerance = 30       # Diferencia de Y para considerar dos espacios en la misma fila
+        self.organize_grid = True     # Post-procesar la detección combinada en filas
+        self.template_size = (80, 40)
+        self.cache = cache
+    
+    def _detection_params(self) -> dict:
+        """Parámetros que influyen en el resultado final de la detección"""
+        return {
+            'min_area': self.min_area,
+            'max_area': self.max_area,
+            'aspect_ratio_range': list(self.aspect_ratio_range),
+            'merge_distance': self.merge_distance,
+            'row_tolerance': self.row_tolerance,
+            'organize_grid': self.organize_grid,
+            'template_size': list(self.template_size)
+        }
+    
+    def _image_key(self, image: np.ndarray) -> Optional[str]:
+        """Clave de contenido de la imagen (solo si hay caché)"""
+        return DetectionCache.image_key(image) if self.cache else None
+    
+    def _cached_array(self, image_key: Optional[str], stage: str,
+                      compute: Callable[[], np.ndarray], **params) -> np.ndarray:
+        """Obtiene una etapa intermedia de la caché o la calcula y la guarda"""
+        if self.cache is None or image_key is None:
+            return compute()
         
-    def detect_spaces_contours(self, image: np.ndarray) -> List[ParkingSpace]:
-        """Detecta espacios usando contornos"""
-        try:
+        key = DetectionCache.make_key(image_key, stage, **params)
+        array = self.cache.get_array(key)
+        if array is None:
+            array = compute()
+            self.cache.put_array(key, array)
+        return array
+    
+    def _cached_spaces(self, image_key: Optional[str], stage: str,
+                       compute: Callable[[], List[ParkingSpace]], **params) -> List[ParkingSpace]:
+        """Obtiene un resultado de la caché o lo calcula y lo guarda"""
+        if self.cache is None or image_key is None:
+            return compute()
+        
+        key = DetectionCache.make_key(image_key, stage, **params)
+        spaces = self.cache.get_spaces(key)
+        if spaces is None:
+            spaces = compute()
+            self.cache.put_spaces(key, spaces)
+        return spaces
+    
+    def _compute_contour_boxes(self, image: np.ndarray, image_key: Optional[str]) -> np.ndarray:
+        """Etapa intermedia: rectángulos candidatos (x, y, w, h, área) de los contornos"""
+        def compute_edges():
             # Preprocesamiento
             gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
             blur = cv2.GaussianBlur(gray, (5, 5), 0)
@@ -28,71 +79,109 @@ class SmartDetector:
             
             # Morfología para limpiar
             kernel = np.ones((3, 3), np.uint8)
-            edges = cv2.morphologyEx(edges, cv2.MORPH_CLOSE, kernel)
+            return cv2.morphologyEx(edges, cv2.MORPH_CLOSE, kernel)
+        
+        def compute_boxes():
+            edges = self._cached_array(image_key, "contour_edges", compute_edges)
             
             # Encontrar contornos
             contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
             
-            spaces = []
-            for contour in contours:
-                area = cv2.contourArea(contour)
-                if self.min_area <= area <= self.max_area:
-                    # Aproximar contorno a rectángulo
-                    rect = cv2.boundingRect(contour)
-                    x, y, w, h = rect
-                    
-                    # Verificar aspect ratio
-                    aspect_ratio = w / h if h > 0 else 0
-                    if self.aspect_ratio_range[0] <= aspect_ratio <= self.aspect_ratio_range[1]:
-                        confidence = min(area / self.max_area, 1.0)
-                        space = ParkingSpace(x, y, w, h, confidence=confidence)
-                        spaces.append(space)
+            boxes = np.zeros((len(contours), 5), dtype=np.float64)
+            for i, contour in enumerate(contours):
+                x, y, w, h = cv2.boundingRect(contour)
+                boxes[i] = (x, y, w, h, cv2.contourArea(contour))
+            return boxes
+        
+        return self._cached_array(image_key, "contour_boxes", compute_boxes)
+    
+    def detect_spaces_contours(self, image: np.ndarray, image_key: Optional[str] = None) -> List[ParkingSpace]:
+        """Detecta espacios usando contornos"""
+        try:
+            if image_key is None:
+                image_key = self._image_key(image)
             
-            # Fusionar espacios cercanos
-            return self._merge_overlapping_spaces(spaces)
+            def compute():
+                boxes = self._compute_contour_boxes(image, image_key)
+                
+                spaces = []
+                for x, y, w, h, area in boxes:
+                    if self.min_area <= area <= self.max_area:
+                        # Verificar aspect ratio
+                        aspect_ratio = w / h if h > 0 else 0
+                        if self.aspect_ratio_range[0] <= aspect_ratio <= self.aspect_ratio_range[1]:
+                            confidence = min(area / self.max_area, 1.0)
+                            space = ParkingSpace(int(x), int(y), int(w), int(h), confidence=confidence)
+                            spaces.append(space)
+                
+                # Fusionar espacios cercanos
+                return self._merge_overlapping_spaces(spaces)
+            
+            return self._cached_spaces(image_key, "result_contours", compute,
+                                       min_area=self.min_area, max_area=self.max_area,
+                                       aspect_ratio_range=list(self.aspect_ratio_range))
             
         except Exception as e:
             print(f"Error en detección por contornos: {e}")
             return []
     
-    def detect_spaces_lines(self, image: np.ndarray) -> List[ParkingSpace]:
-        """Detecta espacios usando líneas de Hough"""
-        try:
+    def _compute_hough_lines(self, image: np.ndarray, image_key: Optional[str]) -> np.ndarray:
+        """Etapa intermedia: segmentos de Hough (x1, y1, x2, y2)"""
+        def compute_edges():
             gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
             blur = cv2.GaussianBlur(gray, (5, 5), 0)
-            edges = cv2.Canny(blur, 50, 150, apertureSize=3)
+            return cv2.Canny(blur, 50, 150, apertureSize=3)
+        
+        def compute_lines():
+            edges = self._cached_array(image_key, "canny_edges", compute_edges)
             
             # Detectar líneas
             lines = cv2.HoughLinesP(edges, 1, np.pi/180, threshold=50, 
                                   minLineLength=30, maxLineGap=10)
-            
             if lines is None:
-                return []
-            
-            # Agrupar líneas en rectángulos potenciales
-            horizontal_lines = []
-            vertical_lines = []
+                return np.zeros((0, 4), dtype=np.int32)
+            return lines.reshape(-1, 4).astype(np.int32)
+        
+        return self._cached_array(image_key, "hough_lines", compute_lines)
+    
+    def detect_spaces_lines(self, image: np.ndarray, image_key: Optional[str] = None) -> List[ParkingSpace]:
+        """Detecta espacios usando líneas de Hough"""
+        try:
+            if image_key is None:
+                image_key = self._image_key(image)
             
-            for line in lines:
-                x1, y1, x2, y2 = line[0]
-                angle = np.arctan2(y2 - y1, x2 - x1) * 180 / np.pi
+            def compute():
+                lines = self._compute_hough_lines(image, image_key)
+                
+                if len(lines) == 0:
+                    return []
+                
+                # Agrupar líneas en rectángulos potenciales
+                horizontal_lines = []
+                vertical_lines = []
+                
+                for line in lines:
+                    x1, y1, x2, y2 = (int(v) for v in line)
+                    angle = np.arctan2(y2 - y1, x2 - x1) * 180 / np.pi
+                    
+                    if abs(angle) < 30 or abs(angle) > 150:  # Líneas horizontales
+                        horizontal_lines.append([x1, y1, x2, y2])
+                    elif 60 < abs(angle) < 120:  # Líneas verticales
+                        vertical_lines.append([x1, y1, x2, y2])
                 
-                if abs(angle) < 30 or abs(angle) > 150:  # Líneas horizontales
-                    horizontal_lines.append(line[0])
-                elif 60 < abs(angle) < 120:  # Líneas verticales
-                    vertical_lines.append(line[0])
+                # Formar rectángulos
+                return self._form_rectangles_from_lines(horizontal_lines, vertical_lines)
             
-            # Formar rectángulos
-            spaces = self._form_rectangles_from_lines(horizontal_lines, vertical_lines)
-            return spaces
+            return self._cached_spaces(image_key, "result_lines", compute)
             
         except Exception as e:
             print(f"Error en detección por líneas: {e}")
             return []
     
-    def detect_spaces_template(self, image: np.ndarray, template_size: Tuple[int, int] = (80, 40)) -> List[ParkingSpace]:
-        """Detecta espacios usando template matching"""
-        try:
+    def _compute_template_response(self, image: np.ndarray, image_key: Optional[str],
+                                   template_size: Tuple[int, int]) -> np.ndarray:
+        """Etapa intermedia: mapa de respuesta del template matching"""
+        def compute():
             gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
             
             # Crear template básico (rectángulo)
@@ -100,18 +189,36 @@ class SmartDetector:
             cv2.rectangle(template, (2, 2), (template_size[0]-2, template_size[1]-2), 255, 2)
             
             # Template matching
-            result = cv2.matchTemplate(gray, template, cv2.TM_CCOEFF_NORMED)
-            locations = np.where(result >= 0.3)
+            return cv2.matchTemplate(gray, template, cv2.TM_CCOEFF_NORMED)
+        
+        return self._cached_array(image_key, "template_response", compute,
+                                  template_size=list(template_size))
+    
+    def detect_spaces_template(self, image: np.ndarray, template_size: Optional[Tuple[int, int]] = None,
+                               image_key: Optional[str] = None) -> List[ParkingSpace]:
+        """Detecta espacios usando template matching"""
+        try:
+            if template_size is None:
+                template_size = self.template_size
+            if image_key is None:
+                image_key = self._image_key(image)
             
-            spaces = []
-            for pt in zip(*locations[::-1]):
-                x, y = pt
-                w, h = template_size
-                confidence = float(result[y, x])
-                space = ParkingSpace(x, y, w, h, confidence=confidence)
-                spaces.append(space)
+            def compute():
+                result = self._compute_template_response(image, image_key, template_size)
+                locations = np.where(result >= 0.3)
+                
+                spaces = []
+                for pt in zip(*locations[::-1]):
+                    x, y = int(pt[0]), int(pt[1])
+                    w, h = template_size
+                    confidence = float(result[y, x])
+                    space = ParkingSpace(x, y, w, h, confidence=confidence)
+                    spaces.append(space)
+                
+                return self._merge_overlapping_spaces(spaces)
             
-            return self._merge_overlapping_spaces(spaces)
+            return self._cached_spaces(image_key, "result_template", compute,
+                                       template_size=list(template_size))
             
         except Exception as e:
             print(f"Error en template matching: {e}")
@@ -119,28 +226,128 @@ class SmartDetector:
     
     def detect_spaces_combined(self, image: np.ndarray) -> List[ParkingSpace]:
         """Combina múltiples métodos de detección"""
-        all_spaces = []
+        image_key = self._image_key(image)
         
-        # Método 1: Contornos
-        contour_spaces = self.detect_spaces_contours(image)
-        all_spaces.extend(contour_spaces)
+        def compute():
+            all_spaces = []
+            
+            # Método 1: Contornos
+            contour_spaces = self.detect_spaces_contours(image, image_key=image_key)
+            all_spaces.extend(contour_spaces)
+            
+            # Método 2: Líneas de Hough
+            line_spaces = self.detect_spaces_lines(image, image_key=image_key)
+            all_spaces.extend(line_spaces)
+            
+            # Método 3: Template matching
+            template_spaces = self.detect_spaces_template(image, image_key=image_key)
+            all_spaces.extend(template_spaces)
+            
+            # Fusionar y filtrar
+            merged_spaces = self._merge_overlapping_spaces(all_spaces)
+            
+            # Agrupar detecciones cercanas y ordenar en filas (IDs por fila)
+            if self.organize_grid:
+                return self.postprocess_spaces(merged_spaces)
+            
+            # Asignar IDs
+            for i, space in enumerate(merged_spaces):
+                space.id = f"AUTO_{i:03d}"
+            
+            return merged_spaces
         
-        # Método 2: Líneas de Hough
-        line_spaces = self.detect_spaces_lines(image)
-        all_spaces.extend(line_spaces)
+        return self._cached_spaces(image_key, "result_combined", compute,
+                                   **self._detection_params())
+    
+    def postprocess_spaces(self, spaces: List[ParkingSpace]) -> List[ParkingSpace]:
+        """Fusiona detecciones cercanas y organiza el resultado en filas"""
+        return self.organize_in_grid(self.cluster_and_merge_spaces(spaces))
+    
+    def cluster_and_merge_spaces(self, spaces: List[ParkingSpace]) -> List[ParkingSpace]:
+        """
+        Agrupa y fusiona espacios cuyos centros están a menos de merge_distance
+        
+        Mismo resultado que la versión legacy (cada espacio todavía libre absorbe
+        a los siguientes cercanos), pero los vecinos se buscan en un hash
+        espacial de celdas de lado merge_distance: solo se comparan los espacios
+        de las 9 celdas vecinas, con distancias al cuadrado.
+        """
+        if not spaces:
+            return []
         
-        # Método 3: Template matching
-        template_spaces = self.detect_spaces_template(image)
-        all_spaces.extend(template_spaces)
+        radius = max(1, self.merge_distance)
+        radius_sq = self.merge_distance * self.merge_distance
+        centers = [space.center for space in spaces]
+        cells = {}
+        for i, (cx, cy) in enumerate(centers):
+            cells.setdefault((cx // radius, cy // radius), []).append(i)
+        
+        used = [False] * len(spaces)
+        merged = []
+        for i, (cx, cy) in enumerate(centers):
+            if used[i]:
+                continue
+            used[i] = True
+            
+            cell_x, cell_y = cx // radius, cy // radius
+            members = [i]
+            for nx in (cell_x - 1, cell_x, cell_x + 1):
+                for ny in (cell_y - 1, cell_y, cell_y + 1):
+                    for j in cells.get((nx, ny), ()):
+                        if j > i and not used[j]:
+                            dx, dy = centers[j][0] - cx, centers[j][1] - cy
+                            if dx * dx + dy * dy < radius_sq:
+                                members.append(j)
+            
+            if len(members) == 1:
+                merged.append(spaces[i])
+                continue
+            members.sort()
+            for j in members:
+                used[j] = True
+            merged.append(self._merge_cluster([spaces[j] for j in members]))
+        
+        return merged
+    
+    def _merge_cluster(self, cluster: List[ParkingSpace]) -> ParkingSpace:
+        """Fusiona un cluster de espacios en su rectángulo envolvente"""
+        min_x = min(space.x for space in cluster)
+        min_y = min(space.y for space in cluster)
+        max_x = max(space.x + space.width for space in cluster)
+        max_y = max(space.y + space.height for space in cluster)
+        avg_confidence = sum(space.confidence for space in cluster) / len(cluster)
+        return ParkingSpace(min_x, min_y, max_x - min_x, max_y - min_y, confidence=avg_confidence)
+    
+    def organize_in_grid(self, spaces: List[ParkingSpace]) -> List[ParkingSpace]:
+        """
+        Organiza espacios en filas con dimensiones normalizadas
+        
+        Barrido sobre los espacios ordenados por Y: un espacio abre una fila
+        nueva si está a más de row_tolerance del primero de la fila actual.
+        Cada fila se ordena por X y sus espacios toman la Y de la fila y la
+        mediana de ancho y alto; los IDs siguen el orden de filas (AUTO_000, ...).
+        """
+        if not spaces:
+            return []
         
-        # Fusionar y filtrar
-        merged_spaces = self._merge_overlapping_spaces(all_spaces)
+        rows = []
+        for space in sorted(spaces, key=lambda s: (s.y, s.x)):
+            if rows and space.y - rows[-1][0] <= self.row_tolerance:
+                rows[-1][1].append(space)
+            else:
+                rows.append((space.y, [space]))
         
-        # Asignar IDs
-        for i, space in enumerate(merged_spaces):
-            space.id = f"AUTO_{i:03d}"
+        organized = []
+        for row_y, row_spaces in rows:
+            row_spaces.sort(key=lambda s: s.x)
+            width = int(np.median([s.width for s in row_spaces]))
+            height = int(np.median([s.height for s in row_spaces]))
+            for space in row_spaces:
+                organized.append(ParkingSpace(space.x, row_y, width, height,
+                                              id=f"AUTO_{len(organized):03d}",
+                                              confidence=space.confidence))
         
-        return merged_spaces
+        return organized
     
     def _merge_overlapping_spaces(self, spaces: List[ParkingSpace]) -> List[ParkingSpace]:
         """Fusiona espacios superpuestos"""
@@ -0,0 +1,240 @@
+"""
+Compensación de movimiento de cámara (deriva del layout)
+Cuando una cámara montada en un poste se golpea o se mueve con el viento,
+todos los espacios quedan desalineados. En lugar de volver a detectarlos, el
+tracker estima cada K frames el desplazamiento global (o una transformación
+afín) del frame respecto a un frame de referencia, sobre una versión reducida
+en escala de grises, y desplaza el layout antes del análisis.
+
+    "translation"  correlación de fase (cv2.phaseCorrelate), ~1 ms a 1/4 de escala
+    "affine"       ECC (cv2.findTransformECC) inicializado con la traslación;
+                   los rectángulos pasan a ser polígonos transformados
+"""
+from collections import deque
+from typing import Deque, List, NamedTuple, Optional, Sequence, Tuple
+import cv2
+import numpy as np
+from .models import ParkingSpace
+from .batch_analysis import to_gray
+from .space_labels import layout_key
+
+MODES = ("translation", "affine")
+
+class DriftSample(NamedTuple):
+    """Medición de deriva de un frame"""
+    frame: int
+    dx: float
+    dy: float
+    response: float   # Pico de la correlación de fase (0-1, confiabilidad)
+
+class DriftTracker:
+    """Estima la deriva de la cámara y la aplica al layout"""
+
+    def __init__(self, scale: float = 0.25, update_interval: int = 10, mode: str = "translation",
+                 min_response: float = 0.3, max_jump: float = 32.0, confirm_jumps: int = 3,
+                 max_history: int = 1000):
+        """
+        Args:
+            scale: Factor de reducción del frame para la estimación
+            update_interval: Cada cuántos frames se estima la deriva (K)
+            mode: 'translation' o 'affine'
+            min_response: Respuesta mínima de la correlación para aceptar una medición
+                (una imagen sin relación con la referencia da ~0.1; un desplazamiento real, >0.9)
+            max_jump: Salto máximo (píxeles del frame) respecto a la deriva actual que se acepta
+                de inmediato
+            confirm_jumps: Mediciones seguidas y coincidentes necesarias para aceptar un salto mayor
+            max_history: Mediciones conservadas para el reporte de deriva
+        """
+        if mode not in MODES:
+            raise ValueError(f"Modo desconocido: {mode} (opciones: {', '.join(MODES)})")
+        self.scale = scale
+        self.update_interval = max(1, update_interval)
+        self.mode = mode
+        self.min_response = min_response
+        self.max_jump = max_jump
+        self.confirm_jumps = max(1, confirm_jumps)
+        self.history: Deque[DriftSample] = deque(maxlen=max_history)
+        self.reset()
+
+    def reset(self):
+        """Descarta la referencia (el próximo frame pasa a ser la referencia)"""
+        self.frame_count = 0
+        self.offset = (0.0, 0.0)
+        self.transform = np.float32([[1, 0, 0], [0, 1, 0]])  # Afín 2×3 en píxeles del frame
+        self._reference: Optional[np.ndarray] = None
+        self._window: Optional[np.ndarray] = None
+        self._windowed_reference: Optional[np.ndarray] = None
+        self._layout_key = None
+        self._cache_key = None
+        self._cache: List[ParkingSpace] = []
+        self._pending_jumps: List[Tuple[float, float]] = []  # Saltos grandes aún sin confirmar
+        self.history.clear()
+
+    def has_reference(self) -> bool:
+        return self._reference is not None
+
+    def _prepare(self, frame: np.ndarray) -> np.ndarray:
+        gray = to_gray(frame)
+        if self.scale != 1.0:
+            gray = cv2.resize(gray, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        return gray.astype(np.float32)
+
+    def set_reference(self, frame: np.ndarray):
+        """Usa un frame como referencia (el frame sobre el que se definió el layout)"""
+        self.reset()
+        self._reference = self._prepare(frame)
+        height, width = self._reference.shape
+        self._window = cv2.createHanningWindow((width, height), cv2.CV_32F)
+        # La ventana se aplica por fuera: phaseCorrelate con ventana modifica sus entradas
+        self._windowed_reference = cv2.multiply(self._reference, self._window)
+
+    def estimate(self, frame: np.ndarray) -> Tuple[np.ndarray, float]:
+        """
+        Transformación del frame respecto a la referencia
+
+        Returns:
+            (matriz afín 2×3 en píxeles del frame, respuesta de la correlación de fase)
+        """
+        current = self._prepare(frame)
+        if current.shape != self._reference.shape:
+            raise ValueError("El frame no tiene la resolución de la referencia")
+        (dx, dy), response = cv2.phaseCorrelate(self._windowed_reference.copy(),
+                                                cv2.multiply(current, self._window))
+        warp = np.float32([[1, 0, dx], [0, 1, dy]])
+
+        if self.mode == "affine" and response >= self.min_response:
+            try:
+                criteria = (cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 50, 1e-4)
+                _, warp = cv2.findTransformECC(self._reference, current, warp,
+                                               cv2.MOTION_AFFINE, criteria, None, 5)
+            except cv2.error:
+                pass  # Sin convergencia: se conserva la traslación
+
+        # Llevar la traslación a la escala del frame completo
+        warp = warp.copy()
+        warp[:, 2] /= self.scale
+        return warp, response
+
+    def update(self, frame: np.ndarray) -> bool:
+        """
+        Procesa un frame: el primero fija la referencia y cada K frames se mide la deriva
+
+        Returns:
+            True si el desplazamiento aplicado al layout cambió
+        """
+        if self._reference is None:
+            self.set_reference(frame)
+            return False
+
+        self.frame_count += 1
+        if self.frame_count % self.update_interval:
+            return False
+
+        warp, response = self.estimate(frame)
+        if response < self.min_response:
+            return False  # Medición poco confiable (escena muy cambiada): se conserva la anterior
+        if not self._accept_jump(float(warp[0, 2]), float(warp[1, 2])):
+            return False
+
+        self.history.append(DriftSample(self.frame_count, float(warp[0, 2]), float(warp[1, 2]), float(response)))
+        previous = self._applied_key()
+        self.transform = warp
+        self.offset = (float(warp[0, 2]), float(warp[1, 2]))
+        return self._applied_key() != previous
+
+    def _accept_jump(self, dx: float, dy: float) -> bool:
+        """
+        Filtra saltos bruscos de la deriva
+
+        Un golpe a la cámara produce un salto que se mantiene en las mediciones
+        siguientes; un falso pico de la correlación no. Los saltos mayores que
+        max_jump se aceptan solo tras confirm_jumps mediciones coincidentes.
+        """
+        if np.hypot(dx - self.offset[0], dy - self.offset[1]) <= self.max_jump:
+            self._pending_jumps.clear()
+            return True
+        if self._pending_jumps:
+            last_dx, last_dy = self._pending_jumps[-1]
+            if np.hypot(dx - last_dx, dy - last_dy) > max(2.0, 0.1 * self.max_jump):
+                self._pending_jumps.clear()  # No coincide con el salto anterior: se empieza de nuevo
+        self._pending_jumps.append((dx, dy))
+        if len(self._pending_jumps) < self.confirm_jumps:
+            return False
+        self._pending_jumps.clear()
+        return True
+
+    def _applied_key(self) -> tuple:
+        """Transformación efectiva: traslación en píxeles enteros (y parte lineal en modo afín)"""
+        if self.mode == "affine":
+            return tuple(np.round(self.transform[:, :2], 3).ravel()) + self.rounded_offset
+        return self.rounded_offset
+
+    @property
+    def rounded_offset(self) -> Tuple[int, int]:
+        return int(round(self.offset[0])), int(round(self.offset[1]))
+
+    def is_identity(self) -> bool:
+        return self._applied_key() == self._identity_key()
+
+    def _identity_key(self) -> tuple:
+        return (1.0, 0.0, 0.0, 1.0, 0, 0) if self.mode == "affine" else (0, 0)
+
+    def apply(self, spaces: Sequence[ParkingSpace]) -> List[ParkingSpace]:
+        """
+        Layout desplazado según la deriva actual
+
+        Sin deriva se retorna el mismo layout; las copias desplazadas se
+        reutilizan mientras no cambien la deriva ni el layout.
+        """
+        return self._shifted(spaces, layout_key(spaces, ()))
+
+    def _shifted(self, spaces: Sequence[ParkingSpace], layout: tuple) -> List[ParkingSpace]:
+        if self.is_identity():
+            return list(spaces)
+        key = (self._applied_key(), layout)
+        if key != self._cache_key:
+            self._cache = [self._transform_space(space) for space in spaces]
+            self._cache_key = key
+        return self._cache
+
+    def _transform_space(self, space: ParkingSpace) -> ParkingSpace:
+        moved = space.copy()
+        if self.mode == "translation":
+            moved.translate(*self.rounded_offset)
+            return moved
+        points = space.polygon or ((space.x, space.y), (space.right, space.y),
+                                   (space.right, space.bottom), (space.x, space.bottom))
+        warped = cv2.transform(np.array([points], dtype=np.float32), self.transform)[0]
+        return ParkingSpace.from_polygon(warped.tolist(), space.id, space.confidence)
+
+    def compensate(self, frame: np.ndarray, spaces: Sequence[ParkingSpace]) -> List[ParkingSpace]:
+        """
+        Actualiza la estimación con el frame y retorna el layout alineado
+
+        Si el layout cambió (editado, detectado o cargado de nuevo) el frame
+        actual pasa a ser la referencia.
+        """
+        layout = layout_key(spaces, ())
+        if layout != self._layout_key:
+            self.set_reference(frame)
+            self._layout_key = layout
+            return list(spaces)
+        self.update(frame)
+        return self._shifted(spaces, layout)
+
+    def report(self) -> dict:
+        """Resumen de la deriva medida desde la referencia"""
+        if not self.history:
+            return {'samples': 0, 'offset': self.offset, 'max_drift': 0.0, 'mean_drift': 0.0,
+                    'mean_response': 0.0, 'first_frame': None, 'last_frame': None}
+        shifts = np.array([(s.dx, s.dy) for s in self.history])
+        magnitudes = np.hypot(shifts[:, 0], shifts[:, 1])
+        return {
+            'samples': len(self.history),
+            'offset': self.offset,
+            'max_drift': float(magnitudes.max()),
+            'mean_drift': float(magnitudes.mean()),
+            'mean_response': float(np.mean([s.response for s in self.history])),
+            'first_frame': self.history[0].frame,
+            'last_frame': self.history[-1].frame,
+        }
@@ -0,0 +1,228 @@
+"""
+Historial de edición basado en comandos para el editor de espacios
+Cada edición guarda solo su delta (espacios agregados o eliminados con su
+posición, desplazamientos o cambios de ID), de modo que deshacer y
+rehacer no copian el layout completo. La profundidad está limitada por un
+presupuesto de memoria estimado en lugar de una cantidad fija de acciones.
+"""
+from abc import ABC, abstractmethod
+from typing import List, Optional, Sequence, Tuple
+from .models import ParkingSpace
+
+# Estimaciones de memoria (bytes) usadas para el presupuesto del historial
+COMMAND_BYTES = 64        # Objeto comando y sus listas
+REFERENCE_BYTES = 16      # Referencia a un espacio que sigue en el layout
+SPACE_BYTES = 200         # Espacio retenido solo por el historial (instancia con __slots__ + ID)
+POLYGON_BYTES = 350       # Tupla de vértices adicional de un espacio poligonal
+RENAME_BYTES = 120        # Referencia + ID anterior y nuevo
+
+class EditCommand(ABC):
+    """Edición reversible sobre una lista de espacios"""
+
+    description = "Edición"
+
+    @abstractmethod
+    def apply(self, spaces: List[ParkingSpace], index=None):
+        """Aplica la edición (index: SpaceIndex opcional a mantener sincronizado)"""
+
+    @abstractmethod
+    def revert(self, spaces: List[ParkingSpace], index=None):
+        """Revierte la edición"""
+
+    def size_bytes(self) -> int:
+        """Memoria estimada que retiene el comando"""
+        return COMMAND_BYTES
+
+class AddSpaces(EditCommand):
+    """Inserta espacios en posiciones dadas de la lista"""
+
+    description = "Agregar"
+
+    def __init__(self, entries: Sequence[Tuple[int, ParkingSpace]]):
+        """
+        Args:
+            entries: Pares (posición final en la lista, espacio)
+        """
+        self.entries = sorted(entries, key=lambda entry: entry[0])
+
+    def apply(self, spaces, index=None):
+        # Agregar al final conserva el orden del índice; insertar en medio obliga a reconstruirlo
+        appended = bool(self.entries) and self.entries[0][0] >= len(spaces)
+        if index is not None and not appended:
+            index.invalidate()
+        for position, space in self.entries:
+            spaces.insert(position, space)
+            if index is not None and appended:
+                index.add(space)
+
+    def revert(self, spaces, index=None):
+        for position, space in reversed(self.entries):
+            del spaces[position]
+            if index is not None:
+                index.remove(space)
+
+    def size_bytes(self) -> int:
+        polygons = sum(1 for _, space in self.entries if space.polygon is not None)
+        return COMMAND_BYTES + SPACE_BYTES * len(self.entries) + POLYGON_BYTES * polygons
+
+class RemoveSpaces(AddSpaces):
+    """Elimina espacios de la lista (inverso de AddSpaces)"""
+
+    description = "Eliminar"
+
+    def apply(self, spaces, index=None):
+        AddSpaces.revert(self, spaces, index)
+
+    def revert(self, spaces, index=None):
+        AddSpaces.apply(self, spaces, index)
+
+class MoveSpaces(EditCommand):
+    """Desplaza un grupo de espacios"""
+
+    description = "Mover"
+
+    def __init__(self, spaces: Sequence[ParkingSpace], dx: int, dy: int):
+        self.spaces = list(spaces)
+        self.dx = dx
+        self.dy = dy
+
+    def _shift(self, dx: int, dy: int, index):
+        for space in self.spaces:
+            space.translate(dx, dy)
+            if index is not None:
+                index.move(space)
+
+    def apply(self, spaces, index=None):
+        self._shift(self.dx, self.dy, index)
+
+    def revert(self, spaces, index=None):
+        self._shift(-self.dx, -self.dy, index)
+
+    def size_bytes(self) -> int:
+        return COMMAND_BYTES + REFERENCE_BYTES * len(self.spaces)
+
+class RenameSpaces(EditCommand):
+    """Cambia el ID de los espacios indicados (mapa disperso: solo los que cambian)"""
+
+    description = "Renumerar"
+
+    def __init__(self, entries: Sequence[Tuple[ParkingSpace, Optional[str], Optional[str]]]):
+        """
+        Args:
+            entries: Ternas (espacio, ID anterior, ID nuevo)
+        """
+        self.entries = [entry for entry in entries if entry[1] != entry[2]]
+
+    def apply(self, spaces, index=None):
+        for space, _, new_id in self.entries:
+            space.id = new_id
+
+    def revert(self, spaces, index=None):
+        for space, old_id, _ in self.entries:
+            space.id = old_id
+
+    def size_bytes(self) -> int:
+        return COMMAND_BYTES + RENAME_BYTES * len(self.entries)
+
+class BatchCommand(EditCommand):
+    """Varias ediciones que se deshacen y rehacen juntas"""
+
+    def __init__(self, commands: Sequence[EditCommand], description: str = "Edición"):
+        self.commands = [command for command in commands if command is not None]
+        self.description = description
+
+    def apply(self, spaces, index=None):
+        for command in self.commands:
+            command.apply(spaces, index)
+
+    def revert(self, spaces, index=None):
+        for command in reversed(self.commands):
+            command.revert(spaces, index)
+
+    def size_bytes(self) -> int:
+        return COMMAND_BYTES + sum(command.size_bytes() for command in self.commands)
+
+def renumber_command(spaces: Sequence[ParkingSpace]) -> RenameSpaces:
+    """Comando que renumera los IDs como str(posición), registrando solo los que cambian"""
+    return RenameSpaces([(space, space.id, str(i)) for i, space in enumerate(spaces)
+                         if space.id != str(i)])
+
+class EditHistory:
+    """Pilas de deshacer/rehacer acotadas por un presupuesto de memoria"""
+
+    def __init__(self, memory_budget: int = 8 * 1024 * 1024):
+        """
+        Args:
+            memory_budget: Memoria estimada máxima (bytes) de todo el historial
+        """
+        self.memory_budget = memory_budget
+        self._undo: List[EditCommand] = []
+        self._redo: List[EditCommand] = []
+        self._memory = 0
+        self._target: Optional[List[ParkingSpace]] = None
+
+    def __len__(self) -> int:
+        return len(self._undo)
+
+    @property
+    def memory_used(self) -> int:
+        return self._memory
+
+    def can_undo(self) -> bool:
+        return bool(self._undo)
+
+    def can_redo(self) -> bool:
+        return bool(self._redo)
+
+    def redo_count(self) -> int:
+        return len(self._redo)
+
+    def clear(self):
+        """Descarta todo el historial"""
+        self._undo.clear()
+        self._redo.clear()
+        self._memory = 0
+
+    def _check_target(self, spaces: List[ParkingSpace]) -> bool:
+        """Descarta el historial si la lista de espacios fue reemplazada (p. ej. al cargar)"""
+        if spaces is not self._target:
+            self.clear()
+            self._target = spaces
+            return False
+        return True
+
+    def execute(self, command: EditCommand, spaces: List[ParkingSpace], index=None):
+        """Aplica un comando y lo registra"""
+        command.apply(spaces, index)
+        self.record(command, spaces)
+
+    def record(self, command: EditCommand, spaces: List[ParkingSpace]):
+        """Registra un comando ya aplicado (p. ej. un arrastre terminado)"""
+        self._check_target(spaces)
+        for dropped in self._redo:
+            self._memory -= dropped.size_bytes()
+        self._redo.clear()
+
+        self._undo.append(command)
+        self._memory += command.size_bytes()
+        # Descartar las ediciones más antiguas hasta entrar en el presupuesto
+        while len(self._undo) > 1 and self._memory > self.memory_budget:
+            self._memory -= self._undo.pop(0).size_bytes()
+
+    def undo(self, spaces: List[ParkingSpace], index=None) -> Optional[EditCommand]:
+        """Revierte la última edición; retorna el comando o None"""
+        if not self._check_target(spaces) or not self._undo:
+            return None
+        command = self._undo.pop()
+        command.revert(spaces, index)
+        self._redo.append(command)
+        return command
+
+    def redo(self, spaces: List[ParkingSpace], index=None) -> Optional[EditCommand]:
+        """Vuelve a aplicar la última edición deshecha; retorna el comando o None"""
+        if not self._check_target(spaces) or not self._redo:
+            return None
+        command = self._redo.pop()
+        command.apply(spaces, index)
+        self._undo.append(command)
+        return command
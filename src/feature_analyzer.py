@@ -0,0 +1,169 @@
+"""
+Analizador por características (métodos "fixed", "adaptive" y "ml")
+Port vectorizado de OccupancyAnalyzer de legacy/main_app_monolithic.py: en
+lugar de recortar cada espacio y ejecutar Canny, np.mean y np.std por ROI,
+Canny se aplica una vez sobre la región que cubre todos los espacios y la
+media, la desviación y la densidad de bordes de todos los espacios salen de
+imágenes integrales en una sola pasada, como una matriz N×F de características.
+"""
+import cv2
+import numpy as np
+from typing import List, Optional, Tuple, Union
+from .models import ParkingSpace, OccupancyStatus, FrameOccupancy, BatchOccupancy, AnalysisStats
+from .batch_analysis import Frames, frame_list, map_frames, to_gray, valid_space_ids
+from .roi_stats import (boxes_from_spaces, boxes_in_region, clip_boxes, roi_mean_std,
+                        roi_nonzero_counts, union_box)
+from .space_labels import SpaceLabelMap, get_label_map, has_polygons
+
+# Columnas de la matriz de características (valores normalizados a 0-1)
+FEATURE_NAMES = ("mean", "std", "edges", "darkness", "texture", "variation")
+MEAN, STD, EDGES, DARKNESS, TEXTURE, VARIATION = range(len(FEATURE_NAMES))
+
+METHODS = ("fixed", "adaptive", "ml")
+
+class FeatureOccupancyAnalyzer:
+    """Analizador por intensidad, textura y bordes de cada espacio"""
+
+    def __init__(self, method: str = "adaptive", fixed_threshold: int = 120,
+                 canny_low: int = 50, canny_high: int = 150):
+        """
+        Args:
+            method: 'fixed' (media < umbral), 'adaptive' (oscuro y con textura o
+                    variación respecto a la imagen) o 'ml' (puntaje ponderado)
+            fixed_threshold: Umbral de intensidad (0-255) del método 'fixed'
+            canny_low, canny_high: Umbrales de histéresis de Canny
+        """
+        if method not in METHODS:
+            raise ValueError(f"Método desconocido: {method} (opciones: {', '.join(METHODS)})")
+        self.method = method
+        self.fixed_threshold = fixed_threshold
+        self.canny_low = canny_low
+        self.canny_high = canny_high
+
+        # Criterios del método adaptativo
+        self.adaptive_factor = 0.8
+        self.min_edge_density = 0.02
+        self.min_std = 15 / 255.0
+        # Pesos del método 'ml': oscuridad, textura y bordes
+        self.weights = (0.4, 0.3, 0.3)
+        # Mapa de etiquetas para layouts con espacios poligonales (se reconstruye al cambiar)
+        self._label_map = None
+
+    def layout_labels(self, spaces: List[ParkingSpace], shape: Tuple[int, ...]) -> Optional[SpaceLabelMap]:
+        """Mapa de etiquetas del layout (None si solo tiene rectángulos)"""
+        if not has_polygons(spaces):
+            return None
+        self._label_map = get_label_map(self._label_map, spaces, shape)
+        return self._label_map
+
+    def extract_features(self, frame: np.ndarray,
+                         spaces: List[ParkingSpace]) -> Tuple[np.ndarray, np.ndarray, float]:
+        """
+        Características de todos los espacios en una pasada
+
+        Returns:
+            (matriz N×F con las columnas de FEATURE_NAMES, máscara N de ROI válidas,
+             media global de la imagen en 0-1)
+        """
+        gray = to_gray(frame)
+        global_mean = cv2.mean(gray)[0] / 255.0
+        corners = clip_boxes(boxes_from_spaces(spaces), gray.shape)
+        features = np.zeros((len(corners), len(FEATURE_NAMES)))
+        region = union_box(corners)
+        x0, y0, x1, y1 = region
+        if x1 <= x0 or y1 <= y0:
+            return features, np.zeros(len(corners), dtype=bool), global_mean
+
+        # Canny una sola vez sobre la unión de los espacios
+        crop = gray[y0:y1, x0:x1]
+        edges = cv2.Canny(crop, self.canny_low, self.canny_high)
+        label_map = self.layout_labels(spaces, gray.shape)
+        if label_map is not None:
+            # Polígonos: bincount sobre el mapa de etiquetas (su región es la misma unión)
+            means, stds, valid = label_map.mean_std(crop, cropped=True)
+            edge_counts = label_map.counts(edges, cropped=True)
+            areas = np.maximum(label_map.areas, 1)
+        else:
+            boxes = boxes_in_region(corners, region)
+            means, stds, valid = roi_mean_std(crop, boxes)
+            edge_counts, _ = roi_nonzero_counts(edges, boxes)
+            areas = np.maximum(boxes[:, 2] * boxes[:, 3], 1)
+
+        mean = means / 255.0
+        std = stds / 255.0
+        features[:, MEAN] = mean
+        features[:, STD] = std
+        features[:, EDGES] = edge_counts / areas
+        features[:, DARKNESS] = 1.0 - mean
+        features[:, TEXTURE] = np.minimum(std / (mean + 0.001), 1.0)
+        features[:, VARIATION] = np.minimum(std * 2, 1.0)
+        return features, valid, global_mean
+
+    def classify(self, features: np.ndarray,
+                 global_mean: Union[float, np.ndarray]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Ocupación, confianza y métrica a partir de la matriz de características
+
+        Vectorizado sobre cualquier cantidad de ejes iniciales (N×F o T×N×F; en
+        el segundo caso global_mean es un vector T).
+        """
+        mean = features[..., MEAN]
+        if self.method == "fixed":
+            threshold = self.fixed_threshold / 255.0
+            is_occupied = mean < threshold
+            confidence = np.minimum(np.abs(mean - threshold) / threshold, 1.0)
+            return is_occupied, confidence, mean
+
+        if self.method == "adaptive":
+            # Oscuro respecto a la imagen Y (con textura O con variación)
+            threshold = np.asarray(global_mean, dtype=np.float64)[..., None] * self.adaptive_factor
+            is_dark = mean < threshold
+            has_texture = features[..., EDGES] > self.min_edge_density
+            has_variation = features[..., STD] > self.min_std
+            is_occupied = is_dark & (has_texture | has_variation)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                confidence = np.nan_to_num(np.minimum(np.abs(mean - threshold) / threshold, 1.0))
+            return is_occupied, confidence, mean
+
+        # 'ml': puntaje ponderado de oscuridad, textura y bordes
+        w_dark, w_texture, w_edges = self.weights
+        score = (features[..., DARKNESS] * w_dark + features[..., TEXTURE] * w_texture +
+                 features[..., EDGES] * w_edges)
+        return score > 0.5, np.minimum(np.abs(score - 0.5) * 2, 1.0), score
+
+    def analyze_spaces(self, frame: np.ndarray, spaces: List[ParkingSpace]) -> FrameOccupancy:
+        """
+        Analiza la ocupación de los espacios con el método configurado
+
+        Returns:
+            Estados de ocupación del frame (iterable como OccupancyStatus)
+        """
+        features, valid, global_mean = self.extract_features(frame, spaces)
+        is_occupied, confidence, metric = self.classify(features[valid], global_mean)
+        return FrameOccupancy(valid_space_ids(spaces, valid), is_occupied, confidence, metric)
+
+    def analyze_batch(self, frames: Frames, spaces: List[ParkingSpace],
+                      workers: Optional[int] = None,
+                      is_batch: Optional[bool] = None) -> BatchOccupancy:
+        """
+        Analiza un lote de frames (arreglo apilado T×H×W[×3] o lista)
+
+        La extracción de características de cada frame corre en un pool de
+        hilos; la clasificación se hace sobre el tensor T×N×F.
+        """
+        frames = frame_list(frames, is_batch)
+        if not frames:
+            return BatchOccupancy.empty()
+
+        # El mapa de etiquetas se construye antes de repartir los frames entre hilos
+        self.layout_labels(spaces, frames[0].shape)
+        results = map_frames(lambda frame: self.extract_features(frame, spaces), frames, workers)
+        valid = results[0][1]
+        features = np.stack([result[0][valid] for result in results])
+        global_means = np.array([result[2] for result in results])
+        is_occupied, confidence, metric = self.classify(features, global_means)
+        return BatchOccupancy(valid_space_ids(spaces, valid), is_occupied, confidence, metric)
+
+    def calculate_statistics(self, occupancy_results: Union[FrameOccupancy, List[OccupancyStatus]]) -> AnalysisStats:
+        """Calcula estadísticas generales (desde los arreglos si es un FrameOccupancy)"""
+        return AnalysisStats.from_results(occupancy_results)
@@ -3,11 +3,25 @@ Utilidades para manejo de archivos y persistencia
 """
 import json
 import pickle
-import csv
 import os
-from typing import List, Dict, Any, Optional
+import numpy as np
+from typing import List, Dict, Any, Optional, Iterable
 from datetime import datetime
 from .models import ParkingSpace, OccupancyStatus, AnalysisStats
+from .streaming_export import (
+    StreamingExporter, CSVStreamExporter, JSONLStreamExporter, COMPRESSION_EXTENSIONS,
+    ANALYSIS_CSV_HEADER, OCCUPANCY_CSV_HEADER, analysis_stats_row, occupancy_status_row,
+    iter_statuses
+)
+from .layout_format import (
+    BinaryLayout, LAYOUT_EXTENSION, write_layout, read_layout, is_binary_layout
+)
+from .history_store import HistoryStore
+from .space_labels import has_polygons
+
+# Tamaño fijo de los espacios en el formato CarParkPos original (solo x, y)
+LEGACY_SPACE_WIDTH = 107
+LEGACY_SPACE_HEIGHT = 48
 
 class FileManager:
     """Gestiona la carga y guardado de archivos"""
@@ -70,10 +84,35 @@ class FileManager:
             with open(filepath, 'rb') as f:
                 data = pickle.load(f)
             
+            # Camino rápido: lista homogénea de tuplas (x, y) o (x, y, w, h, ...)
+            try:
+                coords = np.asarray(data, dtype=np.int64)
+            except (ValueError, TypeError):
+                coords = None
+            
+            if coords is not None and coords.ndim == 2 and (coords.shape[1] == 2 or coords.shape[1] >= 4):
+                xs = coords[:, 0].tolist()
+                ys = coords[:, 1].tolist()
+                if coords.shape[1] >= 4:
+                    ws = coords[:, 2].tolist()
+                    hs = coords[:, 3].tolist()
+                else:
+                    ws = [LEGACY_SPACE_WIDTH] * len(xs)
+                    hs = [LEGACY_SPACE_HEIGHT] * len(xs)
+                return [
+                    ParkingSpace(x=x, y=y, width=w, height=h, id=f"LEGACY_{i:03d}")
+                    for i, (x, y, w, h) in enumerate(zip(xs, ys, ws, hs))
+                ]
+            
             spaces = []
             for i, space_data in enumerate(data):
-                if isinstance(space_data, (list, tuple)) and len(space_data) >= 4:
-                    x, y, w, h = space_data[:4]
+                if isinstance(space_data, (list, tuple)) and len(space_data) >= 2:
+                    x, y = space_data[:2]
+                    if len(space_data) >= 4:
+                        w, h = space_data[2:4]
+                    else:
+                        # Formato legacy original: solo (x, y) con tamaño fijo
+                        w, h = LEGACY_SPACE_WIDTH, LEGACY_SPACE_HEIGHT
                     space = ParkingSpace(
                         x=int(x), y=int(y), 
                         width=int(w), height=int(h),
@@ -86,12 +125,74 @@ class FileManager:
             print(f"Error cargando pickle: {e}")
             return []
     
+    @staticmethod
+    def save_spaces_binary(spaces: List[ParkingSpace], filepath: str) -> bool:
+        """
+        Guarda espacios en formato binario compacto (.cpl)
+        El formato solo almacena rectángulos: un layout con espacios
+        poligonales no se guarda (usar JSON) para no perder sus vértices.
+        """
+        if has_polygons(spaces):
+            rotated = sum(1 for space in spaces if space.polygon is not None)
+            print(f"Error guardando layout binario: el formato .cpl no admite polígonos "
+                  f"({rotated} espacios); use JSON")
+            return False
+        try:
+            write_layout(spaces, filepath)
+            return True
+        except Exception as e:
+            print(f"Error guardando layout binario: {e}")
+            return False
+    
+    @staticmethod
+    def load_layout_binary(filepath: str) -> Optional[BinaryLayout]:
+        """Abre un layout binario mapeado en memoria sin crear objetos por espacio"""
+        try:
+            return read_layout(filepath)
+        except Exception as e:
+            print(f"Error cargando layout binario: {e}")
+            return None
+    
+    @staticmethod
+    def load_spaces_binary(filepath: str) -> List[ParkingSpace]:
+        """Carga espacios desde formato binario compacto (.cpl)"""
+        layout = FileManager.load_layout_binary(filepath)
+        return layout.to_spaces() if layout is not None else []
+    
+    @staticmethod
+    def convert_json_to_binary(json_path: str, binary_path: str) -> bool:
+        """Convierte un layout JSON a formato binario"""
+        spaces = FileManager.load_spaces_json(json_path)
+        return FileManager.save_spaces_binary(spaces, binary_path)
+    
+    @staticmethod
+    def convert_binary_to_json(binary_path: str, json_path: str) -> bool:
+        """Convierte un layout binario a JSON"""
+        spaces = FileManager.load_spaces_binary(binary_path)
+        return FileManager.save_spaces_json(spaces, json_path)
+    
+    @staticmethod
+    def convert_pickle_to_binary(pickle_path: str, binary_path: str) -> bool:
+        """Convierte un archivo legacy CarParkPos a formato binario"""
+        spaces = FileManager.load_spaces_pickle(pickle_path)
+        return FileManager.save_spaces_binary(spaces, binary_path)
+    
+    @staticmethod
+    def convert_binary_to_pickle(binary_path: str, pickle_path: str) -> bool:
+        """Convierte un layout binario al formato legacy CarParkPos"""
+        spaces = FileManager.load_spaces_binary(binary_path)
+        return FileManager.save_spaces_pickle(spaces, pickle_path)
+    
     @staticmethod
     def auto_load_spaces(filepath: str) -> List[ParkingSpace]:
         """Carga espacios detectando automáticamente el formato"""
         if not os.path.exists(filepath):
             return []
         
+        # Formato binario compacto
+        if filepath.lower().endswith(LAYOUT_EXTENSION) or is_binary_layout(filepath):
+            return FileManager.load_spaces_binary(filepath)
+        
         # Intentar JSON primero
         if filepath.lower().endswith('.json'):
             return FileManager.load_spaces_json(filepath)
@@ -104,59 +205,64 @@ class FileManager:
             return FileManager.load_spaces_json(filepath)
     
     @staticmethod
-    def export_analysis_csv(stats_history: List[AnalysisStats], filepath: str) -> bool:
-        """Exporta estadísticas a CSV"""
+    def create_analysis_exporter(filepath: str, **kwargs) -> CSVStreamExporter:
+        """Crea un exportador CSV incremental de estadísticas (admite .gz/.xz)"""
+        return CSVStreamExporter(filepath, header=ANALYSIS_CSV_HEADER,
+                                 row_builder=analysis_stats_row, **kwargs)
+    
+    @staticmethod
+    def create_occupancy_exporter(filepath: str, **kwargs) -> StreamingExporter:
+        """Crea un exportador incremental de estados de ocupación (CSV o JSONL)"""
+        base_path = filepath.lower()
+        for ext in COMPRESSION_EXTENSIONS:
+            if base_path.endswith(ext):
+                base_path = base_path[:-len(ext)]
+                break
+        
+        if base_path.endswith('.jsonl'):
+            return JSONLStreamExporter(filepath, **kwargs)
+        return CSVStreamExporter(filepath, header=OCCUPANCY_CSV_HEADER,
+                                 row_builder=occupancy_status_row, **kwargs)
+    
+    @staticmethod
+    def export_analysis_csv(stats_history: Iterable[AnalysisStats], filepath: str) -> bool:
+        """Exporta estadísticas a CSV (acepta listas o generadores)"""
         try:
-            with open(filepath, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f)
-                
-                # Encabezados
-                writer.writerow([
-                    'Timestamp', 'Total_Spaces', 'Occupied_Spaces', 
-                    'Free_Spaces', 'Occupancy_Rate', 'Availability_Rate'
-                ])
-                
-                # Datos
-                for stats in stats_history:
-                    writer.writerow([
-                        stats.timestamp,
-                        stats.total_spaces,
-                        stats.occupied_spaces,
-                        stats.free_spaces,
-                        f"{stats.occupancy_rate:.2f}",
-                        f"{stats.availability_rate:.2f}"
-                    ])
-            
+            with FileManager.create_analysis_exporter(filepath, flush_interval=None) as exporter:
+                exporter.write_all(stats_history)
             return True
         except Exception as e:
             print(f"Error exportando CSV: {e}")
             return False
     
     @staticmethod
-    def export_occupancy_csv(occupancy_history: List[List[OccupancyStatus]], filepath: str) -> bool:
-        """Exporta historial de ocupación detallado a CSV"""
+    def export_occupancy_csv(occupancy_history: Iterable[Iterable[OccupancyStatus]], filepath: str) -> bool:
+        """Exporta historial de ocupación detallado a CSV (acepta listas o generadores)"""
         try:
-            with open(filepath, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f)
-                
-                # Encabezados
-                writer.writerow(['Timestamp', 'Space_ID', 'Is_Occupied', 'Confidence'])
-                
-                # Datos
-                for frame_results in occupancy_history:
-                    for status in frame_results:
-                        writer.writerow([
-                            status.timestamp,
-                            status.space_id,
-                            'Yes' if status.is_occupied else 'No',
-                            f"{status.confidence:.3f}"
-                        ])
-            
+            with FileManager.create_occupancy_exporter(filepath, flush_interval=None) as exporter:
+                exporter.write_all(iter_statuses(occupancy_history))
             return True
         except Exception as e:
             print(f"Error exportando ocupación CSV: {e}")
             return False
     
+    @staticmethod
+    def export_history_stats(store: HistoryStore, filepath: str, start=None, end=None) -> bool:
+        """Exporta las estadísticas del historial recorriendo el cursor de SQLite"""
+        return FileManager.export_analysis_csv(store.iter_stats(start, end), filepath)
+    
+    @staticmethod
+    def export_history_occupancy(store: HistoryStore, filepath: str, start=None, end=None,
+                                 space_id: Optional[str] = None) -> bool:
+        """Exporta los estados de ocupación del historial (CSV o JSONL) en streaming"""
+        try:
+            with FileManager.create_occupancy_exporter(filepath, flush_interval=None) as exporter:
+                exporter.write_all(store.iter_occupancy(start, end, space_id))
+            return True
+        except Exception as e:
+            print(f"Error exportando historial de ocupación: {e}")
+            return False
+
     @staticmethod
     def get_supported_video_formats() -> List[str]:
         """Retorna formatos de video soportados"""
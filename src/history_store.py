@@ -0,0 +1,272 @@
+"""
+Historial persistente de ocupación sobre SQLite
+Inserciones por lotes desde el pipeline de análisis (executemany) y consultas
+indexadas por espacio y rango de tiempo. Usa solo sqlite3 de la librería estándar.
+"""
+import sqlite3
+import threading
+from datetime import datetime
+from itertools import repeat
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+from .models import OccupancyStatus, FrameOccupancy, AnalysisStats
+
+TimeValue = Union[str, datetime, None]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS occupancy (
+    timestamp   TEXT NOT NULL,
+    space_id    TEXT NOT NULL,
+    is_occupied INTEGER NOT NULL,
+    confidence  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_occupancy_space_time ON occupancy (space_id, timestamp);
+CREATE INDEX IF NOT EXISTS idx_occupancy_time ON occupancy (timestamp);
+
+CREATE TABLE IF NOT EXISTS stats (
+    timestamp       TEXT NOT NULL,
+    total_spaces    INTEGER NOT NULL,
+    occupied_spaces INTEGER NOT NULL,
+    free_spaces     INTEGER NOT NULL,
+    occupancy_rate  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_stats_time ON stats (timestamp);
+"""
+
+def _to_iso(value: TimeValue) -> Optional[str]:
+    """Normaliza límites de tiempo a ISO 8601 (comparables como texto)"""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+def _time_filter(column: str, start: TimeValue, end: TimeValue) -> Tuple[str, list]:
+    """Construye la cláusula WHERE para un rango de tiempo [start, end)"""
+    clauses = []
+    params = []
+    if start is not None:
+        clauses.append(f"{column} >= ?")
+        params.append(_to_iso(start))
+    if end is not None:
+        clauses.append(f"{column} < ?")
+        params.append(_to_iso(end))
+    return " AND ".join(clauses), params
+
+class HistoryStore:
+    """Historial de ocupación persistente con inserciones por lotes"""
+
+    def __init__(self, db_path: str, batch_size: int = 500, max_pending: int = 100000):
+        """
+        Args:
+            db_path: Ruta del archivo SQLite
+            batch_size: Filas acumuladas antes de insertar con executemany
+            max_pending: Filas retenidas como máximo si la base no acepta escrituras
+                (al superarlo se descartan las más antiguas)
+        """
+        self.db_path = db_path
+        self.batch_size = max(1, batch_size)
+        self.max_pending = max(self.batch_size, max_pending)
+        self.dropped_rows = 0
+
+        self._lock = threading.RLock()
+        self._pending_occupancy: List[Tuple] = []
+        self._pending_stats: List[Tuple] = []
+        self._closed = False
+
+        self._conn = self._connect()
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+    def _connect(self) -> sqlite3.Connection:
+        # timeout: espera a que otra conexión libere la base antes de fallar con SQLITE_BUSY
+        conn = sqlite3.connect(self.db_path, timeout=5.0, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    # --- Escritura -----------------------------------------------------
+
+    def record_frame(self, statuses: Union[FrameOccupancy, Iterable[OccupancyStatus]], stats: Optional[AnalysisStats] = None):
+        """Registra los resultados de un frame (se insertan por lotes)"""
+        if isinstance(statuses, FrameOccupancy):
+            # Directo desde los arreglos, sin crear un OccupancyStatus por espacio
+            rows = list(zip(repeat(statuses.timestamp), statuses.space_ids,
+                            statuses.is_occupied.astype(int).tolist(), statuses.confidence.tolist()))
+        else:
+            rows = [(s.timestamp, s.space_id, int(bool(s.is_occupied)), float(s.confidence))
+                    for s in statuses]
+        with self._lock:
+            if self._closed:
+                return  # Cierre en curso: el frame llegó tarde
+            self._pending_occupancy.extend(rows)
+            if stats is not None:
+                self._pending_stats.append(self._stats_row(stats))
+            if len(self._pending_occupancy) + len(self._pending_stats) >= self.batch_size:
+                self._flush_locked()
+
+    def record_stats(self, stats: AnalysisStats):
+        """Registra unas estadísticas agregadas"""
+        self.record_frame((), stats)
+
+    @staticmethod
+    def _stats_row(stats: AnalysisStats) -> Tuple:
+        return (stats.timestamp, stats.total_spaces, stats.occupied_spaces,
+                stats.free_spaces, float(stats.occupancy_rate))
+
+    def _flush_locked(self) -> bool:
+        """
+        Inserta las filas pendientes en una transacción
+
+        Si falla (p. ej. SQLITE_BUSY) las filas se conservan para el próximo
+        intento; solo se descartan las más antiguas al superar max_pending.
+        """
+        if not self._pending_occupancy and not self._pending_stats:
+            return True
+        try:
+            with self._conn:
+                if self._pending_occupancy:
+                    self._conn.executemany(
+                        "INSERT INTO occupancy (timestamp, space_id, is_occupied, confidence) "
+                        "VALUES (?, ?, ?, ?)", self._pending_occupancy)
+                if self._pending_stats:
+                    self._conn.executemany(
+                        "INSERT INTO stats (timestamp, total_spaces, occupied_spaces, "
+                        "free_spaces, occupancy_rate) VALUES (?, ?, ?, ?, ?)", self._pending_stats)
+        except sqlite3.Error as e:
+            print(f"Error guardando historial (se reintentará): {e}")
+            self._trim_pending()
+            return False
+        self._pending_occupancy.clear()
+        self._pending_stats.clear()
+        return True
+
+    def _trim_pending(self):
+        """Acota las filas retenidas tras fallos de escritura"""
+        for pending in (self._pending_occupancy, self._pending_stats):
+            excess = len(pending) - self.max_pending
+            if excess > 0:
+                del pending[:excess]
+                self.dropped_rows += excess
+                print(f"⚠️  Historial: se descartaron {excess} filas antiguas sin guardar")
+
+    def pending_rows(self) -> int:
+        """Filas aún no insertadas en la base"""
+        with self._lock:
+            return len(self._pending_occupancy) + len(self._pending_stats)
+
+    def flush(self) -> bool:
+        """Inserta las filas pendientes; retorna False si quedaron filas sin guardar"""
+        with self._lock:
+            return self._flush_locked()
+
+    def clear(self):
+        """Elimina todo el historial"""
+        with self._lock:
+            self._pending_occupancy.clear()
+            self._pending_stats.clear()
+            with self._conn:
+                self._conn.execute("DELETE FROM occupancy")
+                self._conn.execute("DELETE FROM stats")
+
+    def close(self, retries: int = 3):
+        """Inserta lo pendiente (con reintentos) y cierra la base de datos"""
+        with self._lock:
+            if self._closed:
+                return
+            for _ in range(max(1, retries)):
+                if self._flush_locked():
+                    break
+            else:
+                lost = len(self._pending_occupancy) + len(self._pending_stats)
+                print(f"❌ Historial: {lost} filas no se pudieron guardar al cerrar")
+            self._closed = True
+            self._conn.close()
+
+    # --- Consultas -----------------------------------------------------
+
+    def _query(self, sql: str, params: list) -> List[Tuple]:
+        with self._lock:
+            self._flush_locked()
+            return self._conn.execute(sql, params).fetchall()
+
+    def space_occupancy(self, space_id: str, start: TimeValue = None,
+                        end: TimeValue = None) -> List[OccupancyStatus]:
+        """Estados de un espacio dentro de una ventana de tiempo"""
+        where, params = _time_filter("timestamp", start, end)
+        sql = ("SELECT space_id, is_occupied, confidence, timestamp FROM occupancy "
+               "WHERE space_id = ?" + (f" AND {where}" if where else "") + " ORDER BY timestamp")
+        rows = self._query(sql, [space_id] + params)
+        return [OccupancyStatus(sid, bool(occ), conf, ts) for sid, occ, conf, ts in rows]
+
+    def space_occupancy_rate(self, space_id: str, start: TimeValue = None,
+                             end: TimeValue = None) -> Optional[float]:
+        """Porcentaje de muestras ocupadas de un espacio en una ventana (None sin datos)"""
+        where, params = _time_filter("timestamp", start, end)
+        sql = ("SELECT AVG(is_occupied) * 100.0 FROM occupancy WHERE space_id = ?"
+               + (f" AND {where}" if where else ""))
+        rows = self._query(sql, [space_id] + params)
+        return rows[0][0] if rows else None
+
+    def hourly_occupancy_rates(self, start: TimeValue = None, end: TimeValue = None,
+                               space_id: Optional[str] = None) -> List[Tuple[str, float, int]]:
+        """
+        Tasa de ocupación por hora
+
+        Returns:
+            Lista de (hora 'YYYY-MM-DDTHH', porcentaje ocupado, muestras)
+        """
+        where, params = _time_filter("timestamp", start, end)
+        clauses = [where] if where else []
+        if space_id is not None:
+            clauses.append("space_id = ?")
+            params.append(space_id)
+        sql = ("SELECT substr(timestamp, 1, 13) AS hour, AVG(is_occupied) * 100.0, COUNT(*) "
+               "FROM occupancy" + (" WHERE " + " AND ".join(clauses) if clauses else "")
+               + " GROUP BY hour ORDER BY hour")
+        return [(hour, rate, count) for hour, rate, count in self._query(sql, params)]
+
+    def recent_stats(self, limit: int = 50) -> List[AnalysisStats]:
+        """Últimas estadísticas registradas (más reciente primero)"""
+        rows = self._query(
+            "SELECT total_spaces, occupied_spaces, free_spaces, occupancy_rate, timestamp "
+            "FROM stats ORDER BY timestamp DESC LIMIT ?", [limit])
+        return [AnalysisStats(*row) for row in rows]
+
+    def count_stats(self) -> int:
+        """Cantidad de registros de estadísticas"""
+        return self._query("SELECT COUNT(*) FROM stats", [])[0][0]
+
+    def _iter_rows(self, sql: str, params: list) -> Iterator[Tuple]:
+        """Recorre un cursor con una conexión de lectura propia (sin bloquear escrituras)"""
+        self.flush()
+        conn = self._connect()
+        try:
+            cursor = conn.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(1000)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            conn.close()
+
+    def iter_stats(self, start: TimeValue = None, end: TimeValue = None) -> Iterator[AnalysisStats]:
+        """Recorre las estadísticas en orden cronológico sin cargarlas en memoria"""
+        where, params = _time_filter("timestamp", start, end)
+        sql = ("SELECT total_spaces, occupied_spaces, free_spaces, occupancy_rate, timestamp "
+               "FROM stats" + (f" WHERE {where}" if where else "") + " ORDER BY timestamp")
+        for row in self._iter_rows(sql, params):
+            yield AnalysisStats(*row)
+
+    def iter_occupancy(self, start: TimeValue = None, end: TimeValue = None,
+                       space_id: Optional[str] = None) -> Iterator[OccupancyStatus]:
+        """Recorre los estados de ocupación en orden cronológico sin cargarlos en memoria"""
+        where, params = _time_filter("timestamp", start, end)
+        clauses = [where] if where else []
+        if space_id is not None:
+            clauses.append("space_id = ?")
+            params.append(space_id)
+        sql = ("SELECT space_id, is_occupied, confidence, timestamp FROM occupancy"
+               + (" WHERE " + " AND ".join(clauses) if clauses else "") + " ORDER BY timestamp")
+        for space_id_, occupied, confidence, timestamp in self._iter_rows(sql, params):
+            yield OccupancyStatus(space_id_, bool(occupied), confidence, timestamp)
@@ -0,0 +1,284 @@
+"""
+Escritura a disco en segundo plano
+Un único hilo de E/S con cola acotada para codificación de imágenes,
+guardado de layouts y escritura de logs, de modo que ni el hilo de Tk
+ni el bucle de análisis se bloqueen esperando al disco.
+"""
+import os
+import pickle
+import queue
+import logging
+import tempfile
+import threading
+import itertools
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Callback de finalización: (éxito, ruta, error)
+DoneCallback = Callable[[bool, str, Optional[Exception]], None]
+
+def atomic_write_bytes(filepath: str, data: bytes):
+    """Escribe un archivo de forma atómica (archivo temporal + rename)"""
+    directory = os.path.dirname(os.path.abspath(filepath))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(filepath)}.",
+                                    suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+class _WriteTask:
+    """Tarea pendiente de escritura"""
+    __slots__ = ('filepath', 'producer', 'append', 'callbacks')
+
+    def __init__(self, filepath: str, producer: Callable[[], bytes], append: bool,
+                 on_done: Optional[DoneCallback]):
+        self.filepath = filepath
+        self.producer = producer
+        self.append = append
+        # Incluye los callbacks de las tareas fusionadas en esta
+        self.callbacks: List[DoneCallback] = [on_done] if on_done else []
+
+class BackgroundWriter:
+    """Hilo único de escritura con cola acotada y fusión de guardados redundantes"""
+
+    def __init__(self, max_queue: int = 64):
+        """
+        Args:
+            max_queue: Máximo de tareas en cola (con la cola llena submit retorna False sin esperar)
+        """
+        self.completed = 0
+        self.coalesced = 0
+        self.failed = 0
+
+        self._queue: "queue.Queue[Optional[Tuple]]" = queue.Queue(maxsize=max_queue)
+        self._pending: Dict[Tuple, _WriteTask] = {}
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._in_flight = 0
+        self._sequence = itertools.count()
+        self._stopped = False
+
+        self._thread = threading.Thread(target=self._worker_loop, name="BackgroundWriter", daemon=True)
+        self._thread.start()
+
+    def submit(self, filepath: str, producer: Callable[[], bytes], coalesce: bool = True,
+               append: bool = False, on_done: Optional[DoneCallback] = None) -> bool:
+        """
+        Encola una escritura. El productor se ejecuta en el hilo de E/S.
+
+        Args:
+            filepath: Archivo destino
+            producer: Función que genera los bytes a escribir
+            coalesce: Si ya hay un guardado pendiente del mismo archivo, lo reemplaza
+                (los callbacks de la tarea reemplazada se llaman con el resultado de la nueva)
+            append: Agrega al final del archivo en lugar de reemplazarlo (sin fusión)
+            on_done: Callback (éxito, ruta, error) llamado desde el hilo de E/S
+
+        Returns:
+            False si la cola está llena o el escritor está detenido
+        """
+        task = _WriteTask(filepath, producer, append, on_done)
+        if append or not coalesce:
+            key = (filepath, next(self._sequence))
+        else:
+            key = (os.path.abspath(filepath),)
+
+        with self._lock:
+            if self._stopped:
+                return False
+            if key in self._pending:
+                # Guardado redundante: solo importa la versión más reciente
+                task.callbacks[:0] = self._pending[key].callbacks
+                self._pending[key] = task
+                self.coalesced += 1
+                return True
+            # Encolar sin esperar y bajo el lock: quien llama (a menudo el hilo
+            # de Tk) nunca se bloquea, y una tarea solo queda registrada si su
+            # clave está en la cola, de modo que otra llamada no puede fusionarse
+            # con una tarea que luego se descarta
+            try:
+                self._queue.put_nowait(key)
+            except queue.Full:
+                print(f"⚠️  Cola de escritura llena, se descartó: {filepath}")
+                return False
+            self._pending[key] = task
+        return True
+
+    def save_bytes(self, filepath: str, data: bytes, **kwargs) -> bool:
+        """Guarda bytes ya generados"""
+        return self.submit(filepath, lambda: data, **kwargs)
+
+    def save_text(self, filepath: str, text: str, encoding: str = 'utf-8', **kwargs) -> bool:
+        """Guarda texto"""
+        return self.submit(filepath, lambda: text.encode(encoding), **kwargs)
+
+    def save_pickle(self, filepath: str, obj: Any, **kwargs) -> bool:
+        """Guarda un objeto con pickle (la serialización ocurre en el hilo de E/S)"""
+        return self.submit(filepath, lambda: pickle.dumps(obj), **kwargs)
+
+    def save_image(self, filepath: str, image: Any, params: Optional[list] = None,
+                   **kwargs) -> bool:
+        """Codifica y guarda una imagen BGR (la codificación ocurre en el hilo de E/S)"""
+        # Importación diferida: este módulo también configura el log antes de
+        # verificar dependencias en main.py
+        import cv2
+
+        def encode() -> bytes:
+            ext = os.path.splitext(filepath)[1] or ".png"
+            ok, buffer = cv2.imencode(ext, image, params or [])
+            if not ok:
+                raise IOError(f"No se pudo codificar la imagen {filepath}")
+            return buffer.tobytes()
+
+        return self.submit(filepath, encode, **kwargs)
+
+    def append_text(self, filepath: str, text: str, encoding: str = 'utf-8', **kwargs) -> bool:
+        """Agrega texto al final de un archivo (logs)"""
+        return self.submit(filepath, lambda: text.encode(encoding), append=True, **kwargs)
+
+    def queue_depth(self) -> int:
+        """Cantidad de escrituras pendientes o en curso"""
+        with self._lock:
+            return len(self._pending) + self._in_flight
+
+    def _worker_loop(self):
+        """Bucle del hilo de E/S"""
+        while True:
+            key = self._queue.get()
+            if key is None:
+                break
+
+            with self._lock:
+                task = self._pending.pop(key, None)
+                if task is not None:
+                    self._in_flight += 1
+            if task is None:
+                continue
+
+            error = None
+            try:
+                data = task.producer()
+                if task.append:
+                    with open(task.filepath, 'ab') as f:
+                        f.write(data)
+                else:
+                    atomic_write_bytes(task.filepath, data)
+            except Exception as e:
+                error = e
+                print(f"❌ Error escribiendo {task.filepath}: {e}")
+
+            for callback in task.callbacks:
+                try:
+                    callback(error is None, task.filepath, error)
+                except Exception as e:
+                    print(f"Error en callback de escritura: {e}")
+
+            with self._lock:
+                self._in_flight -= 1
+                if error is None:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+                self._idle.notify_all()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Espera a que se completen todas las escrituras pendientes"""
+        with self._lock:
+            return self._idle.wait_for(lambda: not self._pending and self._in_flight == 0,
+                                       timeout=timeout)
+
+    def stop(self, timeout: Optional[float] = 5.0):
+        """Completa las escrituras pendientes y detiene el hilo"""
+        self.flush(timeout)
+        with self._lock:
+            self._stopped = True
+        self._queue.put(None)
+        self._thread.join(timeout=timeout)
+
+    def get_stats(self) -> Dict[str, int]:
+        """Estadísticas del escritor"""
+        return {
+            'queue_depth': self.queue_depth(),
+            'completed': self.completed,
+            'coalesced': self.coalesced,
+            'failed': self.failed
+        }
+
+class BackgroundLogHandler(logging.Handler):
+    """
+    Handler de logging que escribe el archivo de log a través del hilo de E/S
+
+    Las líneas se acumulan en un buffer y se escriben juntas: como mucho hay
+    una tarea de escritura del log en cola, de modo que una ráfaga de mensajes
+    no llena la cola ni bloquea a quien registra.
+    """
+
+    def __init__(self, filepath: str, writer: Optional[BackgroundWriter] = None,
+                 max_buffered: int = 10000, encoding: str = 'utf-8'):
+        """
+        Args:
+            filepath: Archivo de log
+            writer: Escritor a usar (por defecto el compartido)
+            max_buffered: Líneas máximas en espera; si el disco no da abasto se descartan las más antiguas
+            encoding: Codificación del archivo
+        """
+        super().__init__()
+        self.filepath = filepath
+        self.writer = writer or get_background_writer()
+        self.max_buffered = max_buffered
+        self.encoding = encoding
+        self.dropped = 0
+        self._buffer: List[str] = []
+        self._buffer_lock = threading.Lock()
+        self._scheduled = False
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            line = self.format(record) + "\n"
+        except Exception:
+            self.handleError(record)
+            return
+
+        with self._buffer_lock:
+            self._buffer.append(line)
+            if len(self._buffer) > self.max_buffered:
+                excess = len(self._buffer) - self.max_buffered
+                del self._buffer[:excess]
+                self.dropped += excess
+            if self._scheduled:
+                return  # La escritura ya encolada se llevará esta línea
+            self._scheduled = True
+
+        if not self.writer.submit(self.filepath, self._drain, append=True):
+            with self._buffer_lock:
+                self._scheduled = False  # Se reintenta con el próximo mensaje
+
+    def _drain(self) -> bytes:
+        """Toma todas las líneas acumuladas (se ejecuta en el hilo de E/S)"""
+        with self._buffer_lock:
+            lines, self._buffer = self._buffer, []
+            self._scheduled = False
+        return "".join(lines).encode(self.encoding)
+
+    def flush(self):
+        """Espera a que el log pendiente llegue al disco"""
+        self.writer.flush(timeout=2.0)
+
+_default_writer: Optional[BackgroundWriter] = None
+_default_writer_lock = threading.Lock()
+
+def get_background_writer() -> BackgroundWriter:
+    """Retorna el escritor compartido por toda la aplicación"""
+    global _default_writer
+    with _default_writer_lock:
+        if _default_writer is None:
+            _default_writer = BackgroundWriter()
+        return _default_writer
@@ -0,0 +1,166 @@
+"""
+Caché de etiquetas prerrasterizadas (sprites) para dibujar texto sobre frames
+Cada texto se rasteriza una sola vez por estilo y color (cv2.putText o un
+dibujante alternativo como cvzone) y luego se copia sobre una vista de NumPy,
+mezclando los bordes suavizados con su cobertura en una sola llamada. Las
+etiquetas poco usadas se descartan en orden LRU.
+"""
+from collections import OrderedDict
+from typing import Callable, Optional, Tuple
+import cv2
+import numpy as np
+
+Color = Tuple[int, int, int]
+
+# Dibujante de texto: (imagen, texto, origen, color) -> None
+TextDrawer = Callable[[np.ndarray, str, Tuple[int, int], Color], None]
+
+class LabelSprite:
+    """Texto rasterizado: color, cobertura y su complemento, relativo al origen"""
+    __slots__ = ('dx', 'dy', 'color', 'alpha', 'inverse', 'white')
+
+    def __init__(self, dx: int, dy: int, color: np.ndarray, alpha: np.ndarray):
+        self.dx = dx              # Desplazamiento de la esquina del sprite respecto al origen del texto
+        self.dy = dy
+        self.color = color        # H×W×3 uint8 (sin premultiplicar)
+        self.alpha = alpha        # H×W float32 en [0, 1]
+        self.inverse = 1.0 - alpha
+        self.white = np.full(alpha.shape, 255, dtype=np.uint8)  # Fuente para la máscara
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.alpha.shape
+
+    @property
+    def nbytes(self) -> int:
+        return self.color.nbytes + self.alpha.nbytes * 2 + self.white.nbytes
+
+class LabelCache:
+    """Sprites de texto con expulsión LRU"""
+
+    def __init__(self, font_scale: float = 0.5, font_thickness: int = 1,
+                 font_face: int = cv2.FONT_HERSHEY_SIMPLEX,
+                 text_drawer: Optional[TextDrawer] = None, text_padding: int = 0,
+                 max_entries: int = 4096):
+        """
+        Args:
+            font_scale: Escala de la fuente de cv2.putText
+            font_thickness: Grosor de la fuente
+            font_face: Fuente Hershey
+            text_drawer: Dibujante alternativo (p. ej. cvzone.putTextRect)
+            text_padding: Margen extra que puede ocupar text_drawer alrededor del texto
+            max_entries: Cantidad máxima de sprites en caché
+        """
+        self.font_scale = font_scale
+        self.font_thickness = font_thickness
+        self.font_face = font_face
+        self.text_drawer = text_drawer
+        self.text_padding = text_padding
+        self.max_entries = max(1, max_entries)
+
+        self.hits = 0
+        self.misses = 0
+        self._sprites: "OrderedDict[Tuple[str, Color], LabelSprite]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._sprites)
+
+    def clear(self):
+        self._sprites.clear()
+
+    def text_size(self, text: str) -> Tuple[Tuple[int, int], int]:
+        """Tamaño del texto y baseline (igual que cv2.getTextSize)"""
+        return cv2.getTextSize(text, self.font_face, self.font_scale, self.font_thickness)
+
+    def prewarm(self, texts, color: Color):
+        """Rasteriza por adelantado un conjunto de etiquetas (p. ej. los números de espacio)"""
+        for text in texts:
+            self.get(str(text), color)
+
+    def get(self, text: str, color: Color) -> LabelSprite:
+        """Sprite de un texto en un color (lo rasteriza si no está en caché)"""
+        key = (text, color if type(color) is tuple else tuple(int(c) for c in color))
+        sprite = self._sprites.get(key)
+        if sprite is not None:
+            self._sprites.move_to_end(key)
+            self.hits += 1
+            return sprite
+
+        self.misses += 1
+        sprite = self._rasterize(text, key[1])
+        self._sprites[key] = sprite
+        if len(self._sprites) > self.max_entries:
+            self._sprites.popitem(last=False)
+        return sprite
+
+    def _rasterize(self, text: str, color: Color) -> LabelSprite:
+        (text_w, text_h), baseline = self.text_size(text)
+        margin = self.font_thickness + self.text_padding + 2
+        width = text_w + 2 * margin
+        height = text_h + baseline + 2 * margin
+        org = (margin, margin + text_h)
+
+        if self.text_drawer is None:
+            coverage = np.zeros((height, width), dtype=np.uint8)
+            cv2.putText(coverage, text, org, self.font_face, self.font_scale, 255, self.font_thickness)
+            colors = np.empty((height, width, 3), dtype=np.uint8)
+            colors[:] = color
+        else:
+            # Dibujante arbitrario: dibujar el color sobre negro y la cobertura en blanco
+            canvas = np.zeros((height, width, 3), dtype=np.uint8)
+            coverage_bgr = np.zeros((height, width, 3), dtype=np.uint8)
+            self.text_drawer(canvas, text, org, color)
+            self.text_drawer(coverage_bgr, text, org, (255, 255, 255))
+            coverage = np.ascontiguousarray(coverage_bgr[:, :, 0])
+            # Quitar la premultiplicación sobre negro de los bordes suavizados
+            scale = np.where(coverage > 0, 255.0 / np.maximum(coverage, 1), 0.0)[:, :, None]
+            colors = np.clip(canvas * scale + 0.5, 0, 255).astype(np.uint8)
+
+        # Recortar al área realmente dibujada
+        rows = np.flatnonzero(coverage.any(axis=1))
+        cols = np.flatnonzero(coverage.any(axis=0))
+        if len(rows) == 0:
+            return LabelSprite(0, 0, np.zeros((0, 0, 3), dtype=np.uint8),
+                               np.zeros((0, 0), dtype=np.float32))
+        y0, y1, x0, x1 = rows[0], rows[-1] + 1, cols[0], cols[-1] + 1
+        alpha = coverage[y0:y1, x0:x1].astype(np.float32) / 255.0
+        return LabelSprite(int(x0) - org[0], int(y0) - org[1],
+                           np.ascontiguousarray(colors[y0:y1, x0:x1]), alpha)
+
+    def draw(self, image: np.ndarray, text: str, org: Tuple[int, int], color: Color,
+             mask: Optional[np.ndarray] = None):
+        """
+        Dibuja un texto (equivalente a cv2.putText con el estilo de la caché)
+
+        Args:
+            image: Imagen BGR destino (se modifica en el lugar)
+            text: Texto a dibujar
+            org: Origen del texto (esquina inferior izquierda, como cv2.putText)
+            color: Color BGR
+            mask: Máscara de cobertura opcional que se actualiza igual que la imagen
+        """
+        sprite = self.get(text, color)
+        height, width = image.shape[:2]
+        x0, y0 = org[0] + sprite.dx, org[1] + sprite.dy
+        sprite_h, sprite_w = sprite.shape
+
+        # Recortar contra los bordes de la imagen
+        cx0, cy0 = max(0, x0), max(0, y0)
+        cx1, cy1 = min(width, x0 + sprite_w), min(height, y0 + sprite_h)
+        if cx1 <= cx0 or cy1 <= cy0:
+            return
+        if (cx0, cy0, cx1, cy1) == (x0, y0, x0 + sprite_w, y0 + sprite_h):
+            colors, alpha, inverse, white = sprite.color, sprite.alpha, sprite.inverse, sprite.white
+        else:
+            sy, sx = slice(cy0 - y0, cy1 - y0), slice(cx0 - x0, cx1 - x0)
+            colors = np.ascontiguousarray(sprite.color[sy, sx])
+            alpha = np.ascontiguousarray(sprite.alpha[sy, sx])
+            inverse = np.ascontiguousarray(sprite.inverse[sy, sx])
+            white = sprite.white[sy, sx]
+
+        # Mezcla por cobertura directamente sobre la vista: roi·(1-a) + color·a
+        roi = image[cy0:cy1, cx0:cx1]
+        cv2.blendLinear(roi, colors, inverse, alpha, dst=roi)
+        if mask is not None:
+            mask_roi = mask[cy0:cy1, cx0:cx1]
+            cv2.blendLinear(mask_roi, np.ascontiguousarray(white), inverse, alpha, dst=mask_roi)
@@ -0,0 +1,185 @@
+"""
+Formato binario compacto para layouts de espacios (.cpl)
+Pensado para despliegues con decenas de miles de espacios: las coordenadas
+se cargan con np.load(mmap_mode='r') sin construir objetos por espacio.
+
+Estructura del archivo:
+    [bloque .npy]   Arreglo estructurado de ancho fijo (x, y, width, height, confidence)
+    [tabla de ids]  Offsets uint32 (N + 1) seguidos de los ids en UTF-8
+    [cabecera]      32 bytes: magic, versión, flags, cantidad, offset y tamaño de la tabla
+
+La cabecera versionada va al final del archivo para que el bloque de
+coordenadas siga siendo un .npy válido desde el byte 0 (requisito de
+np.load con mmap_mode); numpy ignora los bytes posteriores al arreglo.
+"""
+import os
+import struct
+import time
+import numpy as np
+from typing import List, Optional, Iterable
+from .models import ParkingSpace
+
+LAYOUT_EXTENSION = ".cpl"
+LAYOUT_MAGIC = b"CPLAYOUT"
+LAYOUT_VERSION = 1
+
+LAYOUT_DTYPE = np.dtype([
+    ('x', '<i4'),
+    ('y', '<i4'),
+    ('width', '<i4'),
+    ('height', '<i4'),
+    ('confidence', '<f4'),
+])
+
+# magic, versión, flags, cantidad de espacios, offset de la tabla de ids, tamaño de la tabla
+_HEADER_STRUCT = struct.Struct('<8sHHIQQ')
+
+def write_layout(spaces: Iterable[ParkingSpace], filepath: str):
+    """
+    Escribe un layout en formato binario
+
+    Los polígonos de espacios rotados no se guardan (solo su rectángulo
+    envolvente); esos layouts deben guardarse en JSON.
+    """
+    spaces = list(spaces)
+    count = len(spaces)
+
+    coords = np.empty(count, dtype=LAYOUT_DTYPE)
+    if count:
+        coords['x'] = [space.x for space in spaces]
+        coords['y'] = [space.y for space in spaces]
+        coords['width'] = [space.width for space in spaces]
+        coords['height'] = [space.height for space in spaces]
+        coords['confidence'] = [space.confidence for space in spaces]
+
+    # Tabla de ids: offsets acumulados + blob UTF-8 (None se guarda como cadena vacía)
+    encoded_ids = [(space.id or "").encode('utf-8') for space in spaces]
+    offsets = np.zeros(count + 1, dtype='<u4')
+    if count:
+        np.cumsum([len(b) for b in encoded_ids], out=offsets[1:])
+    blob = b"".join(encoded_ids)
+
+    tmp_path = filepath + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        np.save(f, coords, allow_pickle=False)
+        table_offset = f.tell()
+        f.write(offsets.tobytes())
+        f.write(blob)
+        table_size = f.tell() - table_offset
+        f.write(_HEADER_STRUCT.pack(LAYOUT_MAGIC, LAYOUT_VERSION, 0, count,
+                                    table_offset, table_size))
+    os.replace(tmp_path, filepath)
+
+def is_binary_layout(filepath: str) -> bool:
+    """Verifica si un archivo tiene la cabecera del formato binario"""
+    try:
+        with open(filepath, 'rb') as f:
+            f.seek(-_HEADER_STRUCT.size, os.SEEK_END)
+            magic = f.read(len(LAYOUT_MAGIC))
+        return magic == LAYOUT_MAGIC
+    except OSError:
+        return False
+
+class BinaryLayout:
+    """Layout binario cargado por mapeo de memoria"""
+
+    def __init__(self, filepath: str):
+        self.filepath = filepath
+
+        with open(filepath, 'rb') as f:
+            f.seek(-_HEADER_STRUCT.size, os.SEEK_END)
+            header = f.read(_HEADER_STRUCT.size)
+
+        magic, version, self.flags, count, self._table_offset, self._table_size = \
+            _HEADER_STRUCT.unpack(header)
+        if magic != LAYOUT_MAGIC:
+            raise ValueError(f"{filepath} no es un layout binario")
+        if version > LAYOUT_VERSION:
+            raise ValueError(f"Versión de layout no soportada: {version}")
+        self.version = version
+
+        self.coords = np.load(filepath, mmap_mode='r', allow_pickle=False)
+        if self.coords.dtype != LAYOUT_DTYPE or len(self.coords) != count:
+            raise ValueError(f"Bloque de coordenadas inválido en {filepath}")
+
+        self._ids: Optional[List[Optional[str]]] = None
+
+    def __len__(self) -> int:
+        return len(self.coords)
+
+    @property
+    def boxes(self) -> np.ndarray:
+        """Coordenadas como matriz N×4 (x, y, w, h)"""
+        result = np.empty((len(self.coords), 4), dtype=np.int32)
+        for i, field in enumerate(('x', 'y', 'width', 'height')):
+            result[:, i] = self.coords[field]
+        return result
+
+    @property
+    def ids(self) -> List[Optional[str]]:
+        """Ids de los espacios (se decodifican al primer acceso)"""
+        if self._ids is None:
+            count = len(self.coords)
+            table = np.memmap(self.filepath, dtype=np.uint8, mode='r',
+                              offset=self._table_offset, shape=(self._table_size,))
+            offsets = np.frombuffer(table[:(count + 1) * 4], dtype='<u4')
+            blob = table[(count + 1) * 4:].tobytes()
+            bounds = offsets.tolist()
+            self._ids = [blob[bounds[i]:bounds[i + 1]].decode('utf-8') or None
+                         for i in range(count)]
+        return self._ids
+
+    def to_spaces(self) -> List[ParkingSpace]:
+        """Construye los objetos ParkingSpace (solo cuando se necesitan)"""
+        xs = self.coords['x'].tolist()
+        ys = self.coords['y'].tolist()
+        ws = self.coords['width'].tolist()
+        hs = self.coords['height'].tolist()
+        confidences = self.coords['confidence'].tolist()
+        return [ParkingSpace(x, y, w, h, id=space_id, confidence=confidence)
+                for x, y, w, h, space_id, confidence
+                in zip(xs, ys, ws, hs, self.ids, confidences)]
+
+def read_layout(filepath: str) -> BinaryLayout:
+    """Abre un layout binario mapeado en memoria"""
+    return BinaryLayout(filepath)
+
+def benchmark_layout_loading(num_spaces: int = 50000, workdir: Optional[str] = None) -> dict:
+    """Compara tiempos de carga entre JSON, pickle legacy y formato binario"""
+    import tempfile
+    from .file_manager import FileManager
+
+    rng = np.random.default_rng(0)
+    spaces = [
+        ParkingSpace(int(x), int(y), 107, 48, id=f"S{i:06d}", confidence=1.0)
+        for i, (x, y) in enumerate(rng.integers(0, 10000, size=(num_spaces, 2)))
+    ]
+
+    workdir = workdir or tempfile.mkdtemp(prefix="carpark_bench_")
+    paths = {
+        'json': os.path.join(workdir, "layout.json"),
+        'pickle': os.path.join(workdir, "layout.pkl"),
+        'binary': os.path.join(workdir, "layout" + LAYOUT_EXTENSION),
+    }
+    FileManager.save_spaces_json(spaces, paths['json'])
+    FileManager.save_spaces_pickle(spaces, paths['pickle'])
+    write_layout(spaces, paths['binary'])
+
+    def timed(func):
+        start = time.perf_counter()
+        func()
+        return time.perf_counter() - start
+
+    results = {
+        'num_spaces': num_spaces,
+        'json_s': timed(lambda: FileManager.load_spaces_json(paths['json'])),
+        'pickle_s': timed(lambda: FileManager.load_spaces_pickle(paths['pickle'])),
+        'binary_mmap_s': timed(lambda: read_layout(paths['binary']).coords['x'].sum()),
+        'binary_spaces_s': timed(lambda: read_layout(paths['binary']).to_spaces()),
+    }
+    results.update({f"{name}_bytes": os.path.getsize(path) for name, path in paths.items()})
+    return results
+
+if __name__ == "__main__":
+    for key, value in benchmark_layout_loading().items():
+        print(f"{key}: {value}")
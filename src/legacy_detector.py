@@ -6,8 +6,15 @@ import cv2
 import pickle
 import numpy as np
 from typing import List, Tuple, Optional, Callable
+from dataclasses import dataclass
 import os
-from .models import ParkingSpace, OccupancyStatus
+from .models import ParkingSpace, FrameOccupancy, BatchOccupancy
+from .io_worker import get_background_writer
+from .overlay import SpaceOverlay, HIDDEN
+from .spatial_index import SpatialIndex, suggest_cell_size
+from .video_pipeline import FramePipeline
+from .roi_stats import boxes_from_spaces, clip_boxes, roi_areas, roi_nonzero_counts
+from .batch_analysis import Frames, frame_list, map_frames, to_gray
 from datetime import datetime
 
 try:
@@ -20,6 +27,9 @@ except ImportError:
 class LegacySpaceEditor:
     """Editor de espacios basado en el código original mejorado"""
     
+    WINDOW_NAME = "Editor de Espacios"
+    IDLE_WAIT_MS = 30  # Espera de waitKey sin cambios (bloquea en lugar de girar)
+    
     def __init__(self, image_path: str, positions_file: str = "CarParkPos"):
         self.image_path = image_path
         self.positions_file = positions_file
@@ -27,9 +37,16 @@ class LegacySpaceEditor:
         self.height = 48  # Alto por defecto del espacio
         self.pos_list = []
         self.image = None
+        self.base_image = None  # Imagen decodificada una sola vez por sesión
+        self.needs_redraw = True
         self.is_editing = False
         self.callback: Optional[Callable] = None
         
+        # Índice espacial de pos_list: claves paralelas porque pop() corre los índices
+        self._pos_index = SpatialIndex()
+        self._pos_keys: List[int] = []
+        self._next_key = 0
+        
         # Cargar posiciones existentes
         self.load_positions()
         
@@ -46,13 +63,34 @@ class LegacySpaceEditor:
         except Exception as e:
             print(f"❌ Error cargando posiciones: {e}")
             self.pos_list = []
+        self._rebuild_index()
+    
+    def _rebuild_index(self):
+        """Reconstruye el índice espacial (tras cargar o cambiar el tamaño)"""
+        self._pos_index = SpatialIndex(suggest_cell_size([(self.width, self.height)]))
+        self._pos_keys = list(range(len(self.pos_list)))
+        self._next_key = len(self.pos_list)
+        for key, (x, y) in zip(self._pos_keys, self.pos_list):
+            self._pos_index.insert(key, x, y, self.width, self.height)
+    
+    def _find_position(self, x: int, y: int) -> Optional[int]:
+        """Índice en pos_list del primer espacio que contiene estrictamente el punto"""
+        hits = []
+        for key in self._pos_index.query_point(x, y):
+            x1, y1, w, h = self._pos_index.bounds(key)
+            if x1 < x < x1 + w and y1 < y < y1 + h:
+                hits.append(key)
+        if not hits:
+            return None
+        # Las claves crecen en orden de inserción, igual que pos_list
+        return self._pos_keys.index(min(hits))
     
     def save_positions(self):
-        """Guarda las posiciones en archivo"""
+        """Guarda las posiciones en archivo (en segundo plano, fusionando guardados seguidos)"""
         try:
-            with open(self.positions_file, 'wb') as f:
-                pickle.dump(self.pos_list, f)
-            print(f"💾 Guardadas {len(self.pos_list)} posiciones en {self.positions_file}")
+            # Copia de la lista: el hilo de E/S serializa el estado de este momento
+            if get_background_writer().save_pickle(self.positions_file, list(self.pos_list)):
+                print(f"💾 Guardando {len(self.pos_list)} posiciones en {self.positions_file}")
             
             # Notificar al callback si existe
             if self.callback:
@@ -66,18 +104,22 @@ class LegacySpaceEditor:
         if event == cv2.EVENT_LBUTTONDOWN:
             # Clic izquierdo: agregar espacio
             self.pos_list.append((x, y))
+            self._pos_keys.append(self._next_key)
+            self._pos_index.insert(self._next_key, x, y, self.width, self.height)
+            self._next_key += 1
+            self.needs_redraw = True
             print(f"➕ Agregado espacio en ({x}, {y})")
             self.save_positions()
             
         elif event == cv2.EVENT_RBUTTONDOWN:
             # Clic derecho: eliminar espacio
-            for i, pos in enumerate(self.pos_list):
-                x1, y1 = pos
-                if x1 < x < x1 + self.width and y1 < y < y1 + self.height:
-                    removed_pos = self.pos_list.pop(i)
-                    print(f"➖ Eliminado espacio en {removed_pos}")
-                    self.save_positions()
-                    break
+            i = self._find_position(x, y)
+            if i is not None:
+                removed_pos = self.pos_list.pop(i)
+                self._pos_index.remove(self._pos_keys.pop(i))
+                self.needs_redraw = True
+                print(f"➖ Eliminado espacio en {removed_pos}")
+                self.save_positions()
     
     def start_editing(self, callback: Optional[Callable] = None):
         """Inicia el editor visual de espacios"""
@@ -94,34 +136,25 @@ class LegacySpaceEditor:
         print("   • Tecla 'q': Salir")
         print("   • Tecla 's': Cambiar tamaño de espacios")
         
+        # Decodificar la imagen una sola vez; cada redibujado parte de una copia
+        self.base_image = cv2.imread(self.image_path)
+        if self.base_image is None:
+            print(f"❌ No se pudo cargar la imagen: {self.image_path}")
+            self.is_editing = False
+            return
+        
+        cv2.namedWindow(self.WINDOW_NAME)
+        cv2.setMouseCallback(self.WINDOW_NAME, self.mouse_click)
+        self.needs_redraw = True
+        
         while self.is_editing:
-            self.image = cv2.imread(self.image_path)
-            
-            if self.image is None:
-                print(f"❌ No se pudo cargar la imagen: {self.image_path}")
-                break
-            
-            # Dibujar espacios existentes
-            for pos in self.pos_list:
-                cv2.rectangle(self.image, pos, 
-                            (pos[0] + self.width, pos[1] + self.height), 
-                            (255, 0, 255), 2)
-                
-                # Mostrar número del espacio
-                space_num = self.pos_list.index(pos) + 1
-                cv2.putText(self.image, str(space_num), 
-                          (pos[0] + 5, pos[1] + 20),
-                          cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
-            
-            # Mostrar información
-            info_text = f"Espacios: {len(self.pos_list)} | Tamaño: {self.width}x{self.height}"
-            cv2.putText(self.image, info_text, (10, 30),
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+            # Redibujar solo cuando cambiaron las posiciones o el tamaño
+            if self.needs_redraw:
+                self.render()
+                cv2.imshow(self.WINDOW_NAME, self.image)
+                self.needs_redraw = False
             
-            cv2.imshow("Editor de Espacios", self.image)
-            cv2.setMouseCallback("Editor de Espacios", self.mouse_click)
-            
-            key = cv2.waitKey(1) & 0xFF
+            key = cv2.waitKey(self.IDLE_WAIT_MS) & 0xFF
             if key == ord('q'):
                 self.is_editing = False
             elif key == ord('s'):
@@ -130,6 +163,27 @@ class LegacySpaceEditor:
         cv2.destroyAllWindows()
         print("✅ Editor cerrado")
     
+    def render(self):
+        """Dibuja los espacios sobre una copia de la imagen base"""
+        self.image = self.base_image.copy()
+        
+        # Dibujar espacios existentes
+        for space_num, (x, y) in enumerate(self.pos_list, start=1):
+            cv2.rectangle(self.image, (x, y),
+                        (x + self.width, y + self.height),
+                        (255, 0, 255), 2)
+            
+            # Mostrar número del espacio
+            cv2.putText(self.image, str(space_num),
+                      (x + 5, y + 20),
+                      cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+        
+        # Mostrar información
+        info_text = f"Espacios: {len(self.pos_list)} | Tamaño: {self.width}x{self.height}"
+        cv2.putText(self.image, info_text, (10, 30),
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+        return self.image
+    
     def _change_space_size(self):
         """Permite cambiar el tamaño de los espacios"""
         print(f"Tamaño actual: {self.width}x{self.height}")
@@ -138,6 +192,8 @@ class LegacySpaceEditor:
             new_height = int(input("Nueva altura (Enter para mantener actual): ") or self.height)
             self.width = max(20, new_width)  # Mínimo 20 píxeles
             self.height = max(20, new_height)
+            self._rebuild_index()
+            self.needs_redraw = True
             print(f"✅ Nuevo tamaño: {self.width}x{self.height}")
         except ValueError:
             print("❌ Valor inválido. Manteniendo tamaño actual.")
@@ -155,6 +211,25 @@ class LegacySpaceEditor:
             spaces.append(space)
         return spaces
 
+@dataclass
+class LegacyAnalysis:
+    """Resultado puro del análisis de un frame (sin dibujo)"""
+    counts: np.ndarray    # Píxeles activos por espacio
+    occupied: np.ndarray  # bool por espacio
+    valid: np.ndarray     # False si el recorte quedó vacío (fuera del frame)
+    free_count: int
+    timestamp: str
+    
+    @property
+    def states(self) -> List[int]:
+        """Estados para SpaceOverlay: 1 ocupado, 0 libre, HIDDEN sin recorte"""
+        return np.where(self.valid, self.occupied.astype(np.int32), HIDDEN).tolist()
+    
+    @property
+    def labels(self) -> List[str]:
+        """Conteo de píxeles como etiqueta (vacía sin recorte)"""
+        return [str(count) if valid else "" for count, valid in zip(self.counts.tolist(), self.valid.tolist())]
+
 class LegacyOccupancyDetector:
     """Detector de ocupación basado en el código original mejorado"""
     
@@ -162,11 +237,27 @@ class LegacyOccupancyDetector:
         self.threshold = 900  # Umbral para determinar ocupación
         self.width = 107
         self.height = 48
+        self.overlay = self.create_overlay()
+    
+    @staticmethod
+    def create_overlay() -> SpaceOverlay:
+        """Overlay con el estilo original: libre verde grueso, ocupado rojo fino"""
+        styles = {0: ((0, 255, 0), 5), 1: ((0, 0, 255), 2)}
+        # Los conteos de píxeles cambian en cada frame: etiquetas volátiles
+        if CVZONE_AVAILABLE:
+            def draw_text(img, text, org, color):
+                cvzone.putTextRect(img, text, org, scale=1, thickness=2, offset=0, colorR=color)
+            return SpaceOverlay(styles, label_anchor="bottom", label_offset=(0, -3),
+                                font_scale=1.0, font_thickness=2, text_drawer=draw_text,
+                                text_padding=4, volatile_labels=True)
+        # Fallback sin cvzone
+        return SpaceOverlay(styles, label_anchor="bottom", label_offset=(0, -3),
+                            font_scale=0.5, font_thickness=1, volatile_labels=True)
         
     def preprocess_frame(self, frame: np.ndarray) -> np.ndarray:
         """Preprocesa el frame usando las técnicas del código original"""
         # Convertir a escala de grises
-        img_gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        img_gray = to_gray(frame)
         
         # Aplicar desenfoque gaussiano
         img_blur = cv2.GaussianBlur(img_gray, (3, 3), 1)
@@ -186,62 +277,66 @@ class LegacyOccupancyDetector:
         
         return img_dilate
     
-    def check_parking_spaces(self, frame: np.ndarray, spaces: List[ParkingSpace]) -> Tuple[List[OccupancyStatus], int]:
-        """Verifica la ocupación de los espacios usando el algoritmo original"""
+    def analyze(self, frame: np.ndarray, spaces: List[ParkingSpace]) -> LegacyAnalysis:
+        """
+        Análisis puro y vectorizado: no modifica el frame ni dibuja
+        
+        Los píxeles activos de todos los espacios se cuentan con una única
+        imagen integral del frame preprocesado.
+        """
         processed_frame = self.preprocess_frame(frame)
-        results = []
-        free_count = 0
+        counts, valid = roi_nonzero_counts(processed_frame, boxes_from_spaces(spaces))
+        occupied = counts >= self.threshold
+        free_count = int(np.count_nonzero(valid & ~occupied))
+        return LegacyAnalysis(counts, occupied, valid, free_count, datetime.now().isoformat())
+    
+    def analyze_batch(self, frames: Frames, spaces: List[ParkingSpace],
+                      workers: Optional[int] = None,
+                      is_batch: Optional[bool] = None) -> BatchOccupancy:
+        """
+        Analiza un lote de frames (arreglo apilado T×H×W[×3] o lista) sin dibujar
         
-        for space in spaces:
-            # Extraer región de interés
-            img_crop = processed_frame[space.y:space.y + space.height, 
-                                     space.x:space.x + space.width]
-            
-            if img_crop.size == 0:
-                continue
-            
-            # Contar píxeles no-cero
-            count = cv2.countNonZero(img_crop)
-            
-            # Determinar ocupación
-            is_occupied = count >= self.threshold
-            confidence = min(count / 1500, 1.0)  # Normalizar confianza
-            
-            if not is_occupied:
-                free_count += 1
-                color = (0, 255, 0)  # Verde para libre
-                thickness = 5
-            else:
-                color = (0, 0, 255)  # Rojo para ocupado
-                thickness = 2
-            
-            # Dibujar rectángulo en el frame original
-            cv2.rectangle(frame, (space.x, space.y), 
-                         (space.x + space.width, space.y + space.height), 
-                         color, thickness)
-            
-            # Mostrar conteo de píxeles con cvzone si está disponible
-            if CVZONE_AVAILABLE:
-                cvzone.putTextRect(frame, str(count), 
-                                 (space.x, space.y + space.height - 3), 
-                                 scale=1, thickness=2, offset=0, colorR=color)
-            else:
-                # Fallback sin cvzone
-                cv2.putText(frame, str(count), 
-                          (space.x, space.y + space.height - 3),
-                          cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1)
-            
-            # Crear estado de ocupación
-            status = OccupancyStatus(
-                space_id=space.id or f"space_{id(space)}",
-                is_occupied=is_occupied,
-                confidence=confidence,
-                timestamp=datetime.now().isoformat()
-            )
-            results.append(status)
+        Preprocesamiento y conteo de cada frame corren en un pool de hilos;
+        umbral y confianza se calculan sobre la matriz T×N.
+        """
+        frames = frame_list(frames, is_batch)
+        boxes = boxes_from_spaces(spaces)
+        if not frames:
+            return BatchOccupancy.empty()
+        valid = roi_areas(clip_boxes(boxes, frames[0].shape)) > 0
+        
+        def count_pixels(frame: np.ndarray) -> np.ndarray:
+            return roi_nonzero_counts(self.preprocess_frame(frame), boxes)[0]
+        
+        counts = np.stack(map_frames(count_pixels, frames, workers)).reshape(len(frames), -1)[:, valid]
+        space_ids = [space.id or f"space_{id(space)}"
+                     for space, keep in zip(spaces, valid.tolist()) if keep]
+        return BatchOccupancy(space_ids, counts >= self.threshold,
+                              np.minimum(counts / 1500, 1.0), counts)
+    
+    @staticmethod
+    def build_statuses(spaces: List[ParkingSpace], analysis: LegacyAnalysis) -> FrameOccupancy:
+        """Estados de ocupación de los espacios con recorte válido"""
+        valid = analysis.valid
+        space_ids = [space.id or f"space_{id(space)}"
+                     for space, keep in zip(spaces, valid.tolist()) if keep]
+        counts = analysis.counts[valid]
+        return FrameOccupancy(
+            space_ids,
+            analysis.occupied[valid],
+            np.minimum(counts / 1500, 1.0),  # Normalizar confianza
+            counts,
+            timestamp=analysis.timestamp
+        )
+    
+    def render(self, frame: np.ndarray, spaces: List[ParkingSpace], analysis: LegacyAnalysis) -> np.ndarray:
+        """Dibuja el resultado de analyze() sobre el frame (en el lugar)"""
+        # Solo se redibujan los espacios que cambiaron
+        self.overlay.render(frame, spaces, analysis.states, analysis.labels)
         
         # Mostrar resumen
         total_spaces = len(spaces)
+        free_count = analysis.free_count
         if CVZONE_AVAILABLE:
             cvzone.putTextRect(frame, f'Libres: {free_count}/{total_spaces}', 
                              (100, 50), scale=3, thickness=5, offset=20, 
@@ -250,8 +345,15 @@ class LegacyOccupancyDetector:
             cv2.putText(frame, f'Libres: {free_count}/{total_spaces}', 
                        (100, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, 
                        (0, 200, 0), 3)
-        
-        return results, free_count
+        return frame
+    
+    def check_parking_spaces(self, frame: np.ndarray, spaces: List[ParkingSpace],
+                             draw: bool = True) -> Tuple[FrameOccupancy, int]:
+        """Verifica la ocupación de los espacios usando el algoritmo original"""
+        analysis = self.analyze(frame, spaces)
+        if draw:
+            self.render(frame, spaces, analysis)
+        return self.build_statuses(spaces, analysis), analysis.free_count
 
 class LegacyVideoProcessor:
     """Procesador de video basado en el código original mejorado"""
@@ -312,35 +414,37 @@ class LegacyVideoProcessor:
         print("   • Tecla ESPACIO: Pausar/Reanudar")
         print("   • Tecla 'r': Reiniciar video")
         
-        paused = False
+        # Decodificación y análisis en hilos propios; este bucle solo muestra
+        # el frame listo más reciente y atiende el teclado
+        pipeline = FramePipeline(
+            self.cap, lambda frame: self.detector.check_parking_spaces(frame, self.spaces))
+        pipeline.start()
         
-        while self.is_playing:
-            if not paused:
-                # Verificar si llegamos al final del video
-                if self.cap.get(cv2.CAP_PROP_POS_FRAMES) == self.cap.get(cv2.CAP_PROP_FRAME_COUNT):
-                    self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)  # Reiniciar
-                
-                success, frame = self.cap.read()
-                if not success:
+        try:
+            while self.is_playing:
+                item = pipeline.latest(timeout=0.02)
+                if item is not None:
+                    _, frame, _ = item
+                    cv2.imshow("CarPark - Detección en Video", frame)
+                elif pipeline.is_done():
                     print("❌ Error leyendo frame del video")
                     break
                 
-                # Analizar ocupación
-                results, free_count = self.detector.check_parking_spaces(frame, self.spaces)
-                
-                # Mostrar frame
-                cv2.imshow("CarPark - Detección en Video", frame)
-            
-            # Manejar teclas
-            key = cv2.waitKey(30 if not paused else 1) & 0xFF
-            if key == ord('q'):
-                self.is_playing = False
-            elif key == ord(' '):  # Espacio para pausar/reanudar
-                paused = not paused
-                print(f"⏸️  Video {'pausado' if paused else 'reanudado'}")
-            elif key == ord('r'):  # Reiniciar video
-                self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
-                print("🔄 Video reiniciado")
+                # Manejar teclas
+                key = cv2.waitKey(1) & 0xFF
+                if key == ord('q'):
+                    self.is_playing = False
+                elif key == ord(' '):  # Espacio para pausar/reanudar
+                    if pipeline.paused:
+                        pipeline.resume()
+                    else:
+                        pipeline.pause()
+                    print(f"⏸️  Video {'pausado' if pipeline.paused else 'reanudado'}")
+                elif key == ord('r'):  # Reiniciar video
+                    pipeline.restart()
+                    print("🔄 Video reiniciado")
+        finally:
+            pipeline.stop()
         
         # Limpiar
         if self.cap:
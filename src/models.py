@@ -1,31 +1,112 @@
 """
 Modelos de datos para el sistema de estacionamiento
 """
-from dataclasses import dataclass
-from typing import List, Tuple, Optional, Dict, Any
+from dataclasses import dataclass, field
+from datetime import datetime
+from itertools import count
+from typing import List, Tuple, Optional, Dict, Any, Iterator, NamedTuple, Sequence, Union
 import json
+import numpy as np
 
-@dataclass
 class ParkingSpace:
-    """Representa un espacio de estacionamiento"""
-    x: int
-    y: int
-    width: int
-    height: int
-    id: Optional[str] = None
-    confidence: float = 0.0
+    """
+    Representa un espacio de estacionamiento
+    Clase con __slots__ (sin __dict__ por instancia). Los bordes y el área se
+    calculan directamente desde los campos sin crear tuplas intermedias.
+    
+    Los espacios en ángulo o rotados llevan además un polígono (tupla de
+    vértices (x, y)); x, y, width y height son entonces su rectángulo envolvente,
+    de modo que los analizadores por rectángulo siguen funcionando.
+    """
+    __slots__ = ('x', 'y', 'width', 'height', 'id', 'confidence', 'polygon')
+    
+    def __init__(self, x: int, y: int, width: int, height: int,
+                 id: Optional[str] = None, confidence: float = 0.0,
+                 polygon: Optional[Sequence[Tuple[int, int]]] = None):
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.id = id
+        self.confidence = confidence
+        self.polygon = tuple((int(px), int(py)) for px, py in polygon) if polygon is not None else None
+    
+    @classmethod
+    def from_polygon(cls, points: Sequence[Tuple[int, int]], id: Optional[str] = None,
+                     confidence: float = 0.0) -> 'ParkingSpace':
+        """Crea un espacio desde los vértices de un polígono (bbox calculado)"""
+        xs = [int(round(px)) for px, _ in points]
+        ys = [int(round(py)) for _, py in points]
+        x, y = min(xs), min(ys)
+        return cls(x, y, max(xs) - x, max(ys) - y, id, confidence, list(zip(xs, ys)))
+    
+    @classmethod
+    def from_rotated_rect(cls, center: Tuple[float, float], size: Tuple[float, float],
+                          angle: float, id: Optional[str] = None, confidence: float = 0.0) -> 'ParkingSpace':
+        """Crea un espacio rectangular rotado (ángulo en grados, como cv2.RotatedRect)"""
+        cx, cy = center
+        half_w, half_h = size[0] / 2, size[1] / 2
+        theta = np.deg2rad(angle)
+        cos, sin = np.cos(theta), np.sin(theta)
+        points = [(cx + dx * cos - dy * sin, cy + dx * sin + dy * cos)
+                  for dx, dy in ((-half_w, -half_h), (half_w, -half_h), (half_w, half_h), (-half_w, half_h))]
+        return cls.from_polygon(points, id, confidence)
+    
+    def __repr__(self) -> str:
+        polygon = f", polygon={self.polygon!r}" if self.polygon is not None else ""
+        return (f"ParkingSpace(x={self.x!r}, y={self.y!r}, width={self.width!r}, "
+                f"height={self.height!r}, id={self.id!r}, confidence={self.confidence!r}{polygon})")
+    
+    def __eq__(self, other: Any) -> bool:
+        # Igualdad por valor, como la dataclass original
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return (self.x == other.x and self.y == other.y and self.width == other.width and
+                self.height == other.height and self.id == other.id and
+                self.confidence == other.confidence and self.polygon == other.polygon)
+    
+    __hash__ = None  # Mutable: no hashable (igual que la dataclass original)
+    
+    def __reduce__(self):
+        return (ParkingSpace, (self.x, self.y, self.width, self.height, self.id, self.confidence, self.polygon))
     
     @property
-    def center(self) -> Tuple[int, int]:
-        return (self.x + self.width // 2, self.y + self.height // 2)
+    def right(self) -> int:
+        return self.x + self.width
+    
+    @property
+    def bottom(self) -> int:
+        return self.y + self.height
     
     @property
     def area(self) -> int:
         return self.width * self.height
     
+    @property
+    def center(self) -> Tuple[int, int]:
+        return (self.x + self.width // 2, self.y + self.height // 2)
+    
     def contains_point(self, x: int, y: int) -> bool:
         """Verifica si un punto está dentro del espacio"""
-        return self.x <= x <= self.x + self.width and self.y <= y <= self.y + self.height
+        if not (self.x <= x <= self.x + self.width and self.y <= y <= self.y + self.height):
+            return False
+        if self.polygon is None:
+            return True
+        # Regla par-impar sobre los lados del polígono
+        inside = False
+        previous_x, previous_y = self.polygon[-1]
+        for px, py in self.polygon:
+            if (py > y) != (previous_y > y) and x < (previous_x - px) * (y - py) / (previous_y - py) + px:
+                inside = not inside
+            previous_x, previous_y = px, py
+        return inside
+    
+    def translate(self, dx: int, dy: int):
+        """Desplaza el espacio (y su polígono, si tiene)"""
+        self.x += dx
+        self.y += dy
+        if self.polygon is not None:
+            self.polygon = tuple((px + dx, py + dy) for px, py in self.polygon)
     
     def to_tuple(self) -> Tuple[int, int, int, int]:
         """Convierte a tupla (x, y, w, h)"""
@@ -33,7 +114,7 @@ class ParkingSpace:
     
     def to_dict(self) -> Dict[str, Any]:
         """Convierte a diccionario para serialización"""
-        return {
+        data = {
             'x': self.x,
             'y': self.y,
             'width': self.width,
@@ -41,33 +122,22 @@ class ParkingSpace:
             'id': self.id,
             'confidence': self.confidence
         }
+        if self.polygon is not None:
+            data['polygon'] = [list(point) for point in self.polygon]
+        return data
     
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> 'ParkingSpace':
         """Crea instancia desde diccionario"""
-        return cls(
-            x=data['x'],
-            y=data['y'],
-            width=data['width'],
-            height=data['height'],
-            id=data.get('id'),
-            confidence=data.get('confidence', 0.0)
-        )
+        return cls(data['x'], data['y'], data['width'], data['height'],
+                   data.get('id'), data.get('confidence', 0.0), data.get('polygon'))
     
     def copy(self) -> 'ParkingSpace':
         """Crea una copia del espacio"""
-        return ParkingSpace(
-            x=self.x,
-            y=self.y,
-            width=self.width,
-            height=self.height,
-            id=self.id,
-            confidence=self.confidence
-        )
+        return ParkingSpace(self.x, self.y, self.width, self.height, self.id, self.confidence, self.polygon)
 
-@dataclass
-class OccupancyStatus:
-    """Estado de ocupación de un espacio"""
+class OccupancyStatus(NamedTuple):
+    """Estado de ocupación de un espacio (inmutable, sin __dict__)"""
     space_id: str
     is_occupied: bool
     confidence: float
@@ -81,9 +151,141 @@ class OccupancyStatus:
             'timestamp': self.timestamp
         }
 
-@dataclass
-class AnalysisStats:
-    """Estadísticas del análisis"""
+# Número de secuencia global de los frames analizados
+_frame_sequence = count()
+
+@dataclass(eq=False)
+class FrameOccupancy:
+    """
+    Resultado de ocupación de un frame completo
+    Un único timestamp y número de secuencia para todo el frame y arreglos por
+    espacio; se recorre como una lista de OccupancyStatus (creados bajo demanda)
+    para mantener compatibilidad con el código existente.
+    """
+    space_ids: Sequence[str]
+    is_occupied: np.ndarray   # N bool
+    confidence: np.ndarray    # N float
+    metric: np.ndarray        # N valor crudo del analizador (píxeles, intensidad, ...)
+    timestamp: str = field(default_factory=lambda: datetime.now().isoformat())
+    sequence: int = field(default_factory=lambda: next(_frame_sequence))
+    
+    def __post_init__(self):
+        self.is_occupied = np.asarray(self.is_occupied, dtype=bool)
+        self.confidence = np.asarray(self.confidence, dtype=np.float64)
+        self.metric = np.asarray(self.metric)
+    
+    @classmethod
+    def empty(cls) -> 'FrameOccupancy':
+        """Resultado sin espacios"""
+        return cls([], np.zeros(0, dtype=bool), np.zeros(0), np.zeros(0))
+    
+    def __len__(self) -> int:
+        return len(self.space_ids)
+    
+    def __eq__(self, other) -> bool:
+        """Igualdad por contenido (la secuencia no cuenta); también contra una lista de OccupancyStatus"""
+        if isinstance(other, FrameOccupancy):
+            return (list(self.space_ids) == list(other.space_ids) and self.timestamp == other.timestamp
+                    and np.array_equal(self.is_occupied, other.is_occupied)
+                    and np.array_equal(self.confidence, other.confidence)
+                    and np.array_equal(self.metric, other.metric))
+        if isinstance(other, list):
+            return self.to_statuses() == other
+        return NotImplemented
+    
+    __hash__ = None  # Mutable, como la lista a la que reemplaza
+    
+    def _status(self, index: int) -> OccupancyStatus:
+        return OccupancyStatus(self.space_ids[index], bool(self.is_occupied[index]),
+                               float(self.confidence[index]), self.timestamp)
+    
+    def __iter__(self) -> Iterator[OccupancyStatus]:
+        for index in range(len(self.space_ids)):
+            yield self._status(index)
+    
+    def __getitem__(self, index: Union[int, slice]) -> Union[OccupancyStatus, List[OccupancyStatus]]:
+        if isinstance(index, slice):
+            return [self._status(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("índice de espacio fuera de rango")
+        return self._status(index)
+    
+    @property
+    def occupied_count(self) -> int:
+        return int(np.count_nonzero(self.is_occupied))
+    
+    @property
+    def free_count(self) -> int:
+        return len(self) - self.occupied_count
+    
+    def to_statuses(self) -> List[OccupancyStatus]:
+        """Lista materializada de OccupancyStatus"""
+        return list(self)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'timestamp': self.timestamp,
+            'sequence': self.sequence,
+            'space_ids': list(self.space_ids),
+            'is_occupied': self.is_occupied.tolist(),
+            'confidence': self.confidence.tolist(),
+            'metric': self.metric.tolist()
+        }
+
+@dataclass(eq=False)
+class BatchOccupancy:
+    """
+    Resultado de ocupación de un lote de T frames sobre los mismos N espacios
+    Matrices T×N; cada fila se puede obtener como FrameOccupancy.
+    """
+    space_ids: Sequence[str]
+    is_occupied: np.ndarray   # T×N bool
+    confidence: np.ndarray    # T×N float
+    metric: np.ndarray        # T×N valor crudo del analizador
+    timestamp: str = field(default_factory=lambda: datetime.now().isoformat())
+    
+    @classmethod
+    def empty(cls) -> 'BatchOccupancy':
+        """Resultado de un lote sin frames"""
+        return cls([], np.zeros((0, 0), dtype=bool), np.zeros((0, 0)), np.zeros((0, 0)))
+    
+    def __len__(self) -> int:
+        return len(self.is_occupied)
+    
+    def __eq__(self, other) -> bool:
+        """Igualdad por contenido (los campos numpy se comparan con np.array_equal)"""
+        if not isinstance(other, BatchOccupancy):
+            return NotImplemented
+        return (list(self.space_ids) == list(other.space_ids) and self.timestamp == other.timestamp
+                and np.array_equal(self.is_occupied, other.is_occupied)
+                and np.array_equal(self.confidence, other.confidence)
+                and np.array_equal(self.metric, other.metric))
+    
+    __hash__ = None
+    
+    def __getitem__(self, index: int) -> FrameOccupancy:
+        """Resultado del frame index del lote"""
+        return FrameOccupancy(self.space_ids, self.is_occupied[index], self.confidence[index],
+                              self.metric[index], self.timestamp)
+    
+    def __iter__(self) -> Iterator[FrameOccupancy]:
+        for index in range(len(self)):
+            yield self[index]
+    
+    @property
+    def occupied_counts(self) -> np.ndarray:
+        """Espacios ocupados por frame (T)"""
+        return np.count_nonzero(self.is_occupied, axis=1)
+    
+    @property
+    def free_counts(self) -> np.ndarray:
+        """Espacios libres por frame (T)"""
+        return len(self.space_ids) - self.occupied_counts
+
+class AnalysisStats(NamedTuple):
+    """Estadísticas del análisis (inmutables, sin __dict__)"""
     total_spaces: int
     occupied_spaces: int
     free_spaces: int
@@ -103,3 +305,23 @@ class AnalysisStats:
             'availability_rate': self.availability_rate,
             'timestamp': self.timestamp
         }
+    
+    @classmethod
+    def from_results(cls, results: Union[FrameOccupancy, Sequence[OccupancyStatus]]) -> 'AnalysisStats':
+        """Estadísticas de un frame (desde los arreglos si es un FrameOccupancy)"""
+        if isinstance(results, FrameOccupancy):
+            total_spaces = len(results)
+            occupied_spaces = results.occupied_count
+            timestamp = results.timestamp
+        else:
+            total_spaces = len(results)
+            occupied_spaces = sum(1 for result in results if result.is_occupied)
+            timestamp = datetime.now().isoformat()
+        
+        return cls(
+            total_spaces=total_spaces,
+            occupied_spaces=occupied_spaces,
+            free_spaces=total_spaces - occupied_spaces,
+            occupancy_rate=(occupied_spaces / total_spaces * 100) if total_spaces > 0 else 0,
+            timestamp=timestamp
+        )
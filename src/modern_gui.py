@@ -10,16 +10,28 @@ import numpy as np
 import threading
 import time
 import os
-from datetime import datetime
-from typing import List, Optional, Dict, Any
+from datetime import datetime, timedelta
+from typing import List, Optional, Dict, Any, Tuple, Union
 
 # Importaciones locales
-from .models import ParkingSpace, OccupancyStatus, AnalysisStats
+from .models import ParkingSpace, OccupancyStatus, FrameOccupancy, AnalysisStats
 from .video_manager import VideoManager
 from .detector import SmartDetector
+from .detection_cache import DetectionCache
 from .working_analyzer import WorkingOccupancyAnalyzer  # Analizador que REALMENTE funciona
 from .simple_analyzer import SimpleOccupancyAnalyzer  # Analizador simple por threshold
+from .background_analyzer import BackgroundOccupancyAnalyzer  # Sustracción de fondo incremental
+from .feature_analyzer import FeatureOccupancyAnalyzer  # Intensidad, textura y bordes (adaptive/ml)
+from .occupancy_classifier import ClassifierOccupancyAnalyzer  # Regresión logística entrenada
+from .drift_tracker import DriftTracker  # Compensación de movimiento de cámara
 from .file_manager import FileManager
+from .history_store import HistoryStore
+from .render_pipeline import CanvasRenderer
+from .overlay import SpaceOverlay
+from .spatial_index import SpaceIndex
+from .space_labels import has_polygons
+from .edit_history import EditHistory, AddSpaces, RemoveSpaces, MoveSpaces, BatchCommand, renumber_command
+from .io_worker import get_background_writer
 from .space_editor import SpaceEditor
 from .legacy_detector import LegacySpaceEditor, LegacyOccupancyDetector, LegacyVideoProcessor
 from .modern_theme import ModernDarkTheme, ModernWidgets, ModernTooltip
@@ -37,10 +49,22 @@ class ModernCarParkGUI:
         self.setup_modern_window()
         
         # Componentes del sistema
-        self.video_manager = VideoManager()
-        self.detector = SmartDetector()
+        self.video_manager = VideoManager(
+            frame_cache_mb=config.DEFAULT_CONFIG.get("video_frame_cache_mb", 128)
+        )
+        self.detector = SmartDetector(cache=self.create_detection_cache())
         self.analyzer = WorkingOccupancyAnalyzer()  # Analizador principal (working)
         self.simple_analyzer = SimpleOccupancyAnalyzer()  # Analizador simple
+        self.background_analyzer = BackgroundOccupancyAnalyzer(
+            learning_rate=config.DEFAULT_CONFIG.get("background_learning_rate", 0.05),
+            update_interval=config.DEFAULT_CONFIG.get("background_update_interval", 10),
+            relearn_after=config.DEFAULT_CONFIG.get("background_relearn_after", 100)
+        )
+        self.background_notice_shown = False
+        self.feature_analyzer = FeatureOccupancyAnalyzer()
+        self.classifier_analyzer = ClassifierOccupancyAnalyzer.from_file(config.CLASSIFIER_WEIGHTS_PATH)
+        self.classifier_notice_shown = False
+        self.drift_tracker = self.create_drift_tracker()
         self.space_editor = None
         
         # Componentes legacy mejorados
@@ -48,17 +72,27 @@ class ModernCarParkGUI:
         self.legacy_detector = LegacyOccupancyDetector()
         self.legacy_video_processor = None
         
+        # Escritor en segundo plano para toda la salida a disco
+        self.io_writer = get_background_writer()
+        
+        # Historial persistente de ocupación (SQLite, opcional)
+        self.history_store = self.create_history_store()
+        
         # Estado de la aplicación
         self.spaces: List[ParkingSpace] = []
+        self.analysis_spaces: List[ParkingSpace] = []  # Layout alineado con la deriva de cámara
+        self.last_drift = (0, 0)
         self.current_frame = None
-        self.analysis_results: List[OccupancyStatus] = []
+        self.analysis_results: Union[FrameOccupancy, List[OccupancyStatus]] = []
         self.stats_history: List[AnalysisStats] = []
         self.is_analyzing = False
+        self.analysis_thread: Optional[threading.Thread] = None
         
         # Variables de UI modernas
         self.main_notebook = None
         self.video_canvas = None
         self.stats_tree = None
+        self.space_labels: List[str] = []
         self.status_labels = {}
         self.progress_vars = {}
         
@@ -68,11 +102,17 @@ class ModernCarParkGUI:
         self.drawing_start = None
         self.temp_rectangle = None
         self.selected_space = None
+        self.selected_spaces: List[ParkingSpace] = []  # Selección múltiple (rubber-band)
+        self.rubber_band_start = None
+        self.rubber_band_item = None
+        self.space_index = SpaceIndex()  # Hit-testing del editor
         self.dragging_space = False
         self.drag_offset = (0, 0)
+        self.drag_origin = None  # Posición del espacio arrastrado al iniciar el drag
         self.clipboard_spaces = []  # Para copy/paste
-        self.undo_stack = []  # Para deshacer
-        self.max_undo = 20  # Máximo de acciones para deshacer
+        # Historial de deshacer/rehacer (solo deltas, acotado por memoria)
+        undo_budget_mb = config.DEFAULT_CONFIG.get("undo_memory_budget_mb", 8)
+        self.edit_history = EditHistory(memory_budget=undo_budget_mb * 1024 * 1024)
         
         # Variables para manejo de escalado en el editor
         self.current_scale = 1.0
@@ -81,10 +121,61 @@ class ModernCarParkGUI:
         self.original_image_size = None
         self.current_display_size = None
         
+        # Ítems persistentes del canvas del editor: id(espacio) -> (rectángulo, texto)
+        self.editor_items: Dict[int, Tuple[int, int]] = {}
+        self.editor_item_state: Dict[int, Tuple] = {}
+        self.editor_items_view = None  # (escala, offset_x, offset_y) de las coordenadas actuales
+        
         self.setup_modern_ui()
         self.setup_bindings()
         self.start_status_updates()
     
+    def create_detection_cache(self) -> Optional[DetectionCache]:
+        """Crea la caché persistente de detección (opcional)"""
+        try:
+            max_mb = config.DEFAULT_CONFIG.get("detection_cache_max_mb", 256)
+            return DetectionCache(config.DETECTION_CACHE_DIR, max_bytes=max_mb * 1024 * 1024)
+        except Exception as e:
+            print(f"⚠️  Caché de detección deshabilitada: {e}")
+            return None
+    
+    def create_history_store(self) -> Optional[HistoryStore]:
+        """Abre el historial persistente de ocupación (opcional)"""
+        if not config.DEFAULT_CONFIG.get("history_enabled", True):
+            return None
+        try:
+            os.makedirs(config.DATA_DIR, exist_ok=True)
+            batch_size = config.DEFAULT_CONFIG.get("history_batch_size", 500)
+            return HistoryStore(config.HISTORY_DB_PATH, batch_size=batch_size)
+        except Exception as e:
+            print(f"⚠️  Historial persistente deshabilitado: {e}")
+            return None
+    
+    def create_drift_tracker(self) -> Optional[DriftTracker]:
+        """Crea el compensador de movimiento de cámara (opcional)"""
+        if not config.DEFAULT_CONFIG.get("drift_compensation", False):
+            return None
+        return DriftTracker(
+            scale=config.DEFAULT_CONFIG.get("drift_scale", 0.25),
+            update_interval=config.DEFAULT_CONFIG.get("drift_update_interval", 10)
+        )
+    
+    def aligned_spaces(self, frame) -> List[ParkingSpace]:
+        """Layout desplazado según la deriva de la cámara (sin re-detectar espacios)"""
+        if self.drift_tracker is None:
+            self.analysis_spaces = self.spaces
+            return self.spaces
+        
+        self.analysis_spaces = self.drift_tracker.compensate(frame, self.spaces)
+        drift = self.drift_tracker.rounded_offset
+        if drift != self.last_drift:
+            self.last_drift = drift
+            max_drift = self.drift_tracker.report()['max_drift']
+            message = f"📐 Deriva de cámara compensada: ({drift[0]:+d}, {drift[1]:+d}) px (máx. {max_drift:.1f} px)"
+            print(message)
+            self.root.after(0, lambda: self.status_var.set(message))
+        return self.analysis_spaces
+    
     def setup_modern_window(self):
         """Configura la ventana principal con estilo moderno"""
         self.root.title("🚗 CarPark Professional v3.0")
@@ -201,6 +292,12 @@ class ModernCarParkGUI:
             highlightbackground=ModernDarkTheme.COLORS['border_medium']
         )
         self.video_canvas.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        self.video_renderer = CanvasRenderer(self.video_canvas)
+        # Contornos y números de espacio: libre, ocupado, sin analizar
+        self.space_overlay = SpaceOverlay(
+            styles={0: ((0, 255, 0), 3), 1: ((0, 0, 255), 3), 2: ((255, 255, 0), 2)},
+            label_color=(255, 255, 255)
+        )
         
         # Controles de video modernos
         self.create_video_controls(left_panel)
@@ -254,6 +351,22 @@ class ModernCarParkGUI:
         )
         snapshot_btn.pack(side=tk.LEFT)
         ModernTooltip(snapshot_btn, "Tomar captura de pantalla")
+        
+        # Tercera fila: navegación frame a frame
+        row3 = ttk.Frame(buttons_frame)
+        row3.pack(fill=tk.X)
+        
+        prev_btn = ModernWidgets.create_action_button(
+            row3, "Anterior", lambda: self.step_video(-1), "Action.TButton", "⏮️"
+        )
+        prev_btn.pack(side=tk.LEFT, padx=(0, 10))
+        ModernTooltip(prev_btn, "Retroceder un frame (desde la caché de frames decodificados)")
+        
+        next_btn = ModernWidgets.create_action_button(
+            row3, "Siguiente", lambda: self.step_video(1), "Action.TButton", "⏭️"
+        )
+        next_btn.pack(side=tk.LEFT)
+        ModernTooltip(next_btn, "Avanzar un frame")
     
     def create_info_panel(self, parent):
         """Crea el panel de información lateral"""
@@ -285,11 +398,21 @@ class ModernCarParkGUI:
         method_combo = ttk.Combobox(
             config_frame, 
             textvariable=self.analysis_method,
-            values=["simple", "working"],
+            values=["simple", "working", "background", "adaptive", "ml", "classifier"],
             state="readonly"
         )
         method_combo.pack(fill=tk.X, pady=(0, 10))
-        ModernTooltip(method_combo, "Selecciona el algoritmo de análisis: 'simple' usa threshold básico, 'working' replica el código exitoso")
+        method_combo.bind('<<ComboboxSelected>>', self.on_analysis_method_changed)
+        ModernTooltip(method_combo, "Selecciona el algoritmo de análisis: 'simple' usa threshold básico, 'working' replica el código exitoso, "
+                     "'background' compara con un fondo del estacionamiento vacío aprendido del video, "
+                     "'adaptive' y 'ml' combinan intensidad, textura y bordes, "
+                     "'classifier' usa pesos entrenados (python -m src.occupancy_classifier train)")
+        
+        background_btn = ModernWidgets.create_action_button(
+            config_frame, "Fijar Fondo", self.set_background_frame, "TButton", "🅿️"
+        )
+        background_btn.pack(fill=tk.X, pady=(0, 10))
+        ModernTooltip(background_btn, "Usar el frame actual (estacionamiento vacío) como fondo del método 'background'")
         
         # Controles de espacios
         spaces_card = ModernWidgets.create_info_card(
@@ -631,7 +754,15 @@ class ModernCarParkGUI:
         clear_history_btn = ModernWidgets.create_action_button(
             buttons_frame, "Limpiar Historial", self.clear_analytics_history, "Warning.TButton", "🗑️"
         )
-        clear_history_btn.pack(side=tk.LEFT)
+        clear_history_btn.pack(side=tk.LEFT, padx=(0, 10))
+        
+        hourly_btn = ModernWidgets.create_action_button(
+            buttons_frame, "Ocupación por Hora", self.show_hourly_occupancy, "TButton", "🕒"
+        )
+        hourly_btn.pack(side=tk.LEFT)
+        
+        # Cargar los últimos registros del historial persistente
+        self.load_history_table()
     
     def create_metric_display(self, parent, title, var_name, icon):
         """Crea un display de métrica"""
@@ -664,33 +795,30 @@ class ModernCarParkGUI:
         try:
             # Usar el analizador seleccionado para análisis manual
             method = self.analysis_method.get()
+            spaces = self.aligned_spaces(self.current_frame)
             
             if method == "simple":
-                self.analysis_results = self.simple_analyzer.analyze_spaces(self.current_frame, self.spaces)
+                self.analysis_results = self.simple_analyzer.analyze_spaces(self.current_frame, spaces)
             elif method == "working":
                 # Usar el analizador que replica el main.py exitoso
-                self.analysis_results = self.analyzer.analyze_spaces(self.current_frame, self.spaces)
+                self.analysis_results = self.analyzer.analyze_spaces(self.current_frame, spaces)
+            elif method == "background":
+                self.analysis_results = self.background_analyzer.analyze_spaces(self.current_frame, spaces)
+                self.notify_background_seed()
+            elif method in ("adaptive", "ml"):
+                self.feature_analyzer.method = method
+                self.analysis_results = self.feature_analyzer.analyze_spaces(self.current_frame, spaces)
+            elif method == "classifier" and self.classifier_ready():
+                self.analysis_results = self.classifier_analyzer.analyze_spaces(self.current_frame, spaces)
             else:
-                # Por defecto usar working
-                self.analysis_results = self.analyzer.analyze_spaces(self.current_frame, self.spaces)
+                # Por defecto (o sin pesos entrenados) usar working
+                self.analysis_results = self.analyzer.analyze_spaces(self.current_frame, spaces)
             
             # Agregar a historial
-            timestamp = datetime.now().strftime("%H:%M:%S")
-            total_spaces = len(self.spaces)
-            free_spaces = len([r for r in self.analysis_results if not r.is_occupied])
-            occupied_spaces = total_spaces - free_spaces
-            occupancy_percent = (occupied_spaces / total_spaces * 100) if total_spaces > 0 else 0
-            
-            # Insertar en tabla
-            self.stats_tree.insert('', 0, values=(
-                timestamp, total_spaces, free_spaces, occupied_spaces, f"{occupancy_percent:.1f}%"
-            ))
-            
-            # Mantener solo los últimos 50 registros
-            children = self.stats_tree.get_children()
-            if len(children) > 50:
-                for child in children[50:]:
-                    self.stats_tree.delete(child)
+            stats = self.record_analysis(self.analysis_results)
+            total_spaces = stats.total_spaces
+            occupied_spaces = stats.occupied_spaces
+            self.insert_stats_row(stats)
             
             # Actualizar métricas
             self.update_analytics_metrics()
@@ -704,6 +832,57 @@ class ModernCarParkGUI:
         except Exception as e:
             messagebox.showerror("Error", f"Error en análisis: {e}")
     
+    def record_analysis(self, results: FrameOccupancy) -> AnalysisStats:
+        """Registra un análisis en el historial persistente y retorna sus estadísticas"""
+        stats = self.analyzer.calculate_statistics(results)
+        if self.history_store is not None:
+            self.history_store.record_frame(results, stats)
+        return stats
+    
+    def insert_stats_row(self, stats: AnalysisStats, max_rows: int = 50):
+        """Inserta unas estadísticas al inicio de la tabla (vista de los últimos registros)"""
+        try:
+            timestamp = datetime.fromisoformat(stats.timestamp).strftime("%H:%M:%S")
+        except ValueError:
+            timestamp = stats.timestamp
+        
+        self.stats_tree.insert('', 0, values=(
+            timestamp, stats.total_spaces, stats.free_spaces, stats.occupied_spaces,
+            f"{stats.occupancy_rate:.1f}%"
+        ))
+        
+        # La tabla solo muestra los últimos registros; el historial completo está en SQLite
+        children = self.stats_tree.get_children()
+        if len(children) > max_rows:
+            for child in children[max_rows:]:
+                self.stats_tree.delete(child)
+    
+    def load_history_table(self, max_rows: int = 50):
+        """Llena la tabla con los últimos registros del historial persistente"""
+        if self.history_store is None:
+            return
+        for child in self.stats_tree.get_children():
+            self.stats_tree.delete(child)
+        # recent_stats retorna el más reciente primero; insertar desde el más antiguo
+        for stats in reversed(self.history_store.recent_stats(max_rows)):
+            self.insert_stats_row(stats, max_rows)
+    
+    def show_hourly_occupancy(self):
+        """Muestra la tasa de ocupación por hora de las últimas 24 horas"""
+        if self.history_store is None:
+            messagebox.showwarning("Advertencia", "El historial persistente no está disponible")
+            return
+        
+        since = datetime.now() - timedelta(hours=24)
+        rates = self.history_store.hourly_occupancy_rates(start=since)
+        if not rates:
+            messagebox.showinfo("Ocupación por Hora", "No hay datos en las últimas 24 horas")
+            return
+        
+        lines = [f"{hour.replace('T', ' ')}:00  →  {rate:5.1f}%  ({samples} muestras)"
+                 for hour, rate, samples in rates]
+        messagebox.showinfo("Ocupación por Hora", "\n".join(lines))
+    
     def update_analytics_metrics(self):
         """Actualiza las métricas de análisis"""
         total_spaces = len(self.spaces)
@@ -735,6 +914,10 @@ class ModernCarParkGUI:
     
     def export_analytics_data(self):
         """Exporta los datos de análisis"""
+        if self.history_store is not None:
+            self.export_history_data()
+            return
+        
         if not self.stats_tree.get_children():
             messagebox.showwarning("Advertencia", "No hay datos para exportar")
             return
@@ -747,27 +930,73 @@ class ModernCarParkGUI:
         )
         
         if filepath:
-            try:
+            # Leer la tabla en el hilo de Tk; el CSV se genera y escribe en segundo plano
+            rows = [self.stats_tree.item(child)['values'] for child in self.stats_tree.get_children()]
+            
+            def build_csv() -> bytes:
                 import csv
-                with open(filepath, 'w', newline='', encoding='utf-8') as file:
-                    writer = csv.writer(file)
-                    # Escribir cabeceras
-                    writer.writerow(['Tiempo', 'Total', 'Libres', 'Ocupados', 'Porcentaje'])
-                    
-                    # Escribir datos
-                    for child in self.stats_tree.get_children():
-                        values = self.stats_tree.item(child)['values']
-                        writer.writerow(values)
-                
-                self.status_var.set(f"📤 Datos exportados a {os.path.basename(filepath)}")
-                messagebox.showinfo("Éxito", "Datos exportados correctamente")
-                
-            except Exception as e:
-                messagebox.showerror("Error", f"Error al exportar: {e}")
+                import io
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                # Escribir cabeceras
+                writer.writerow(['Tiempo', 'Total', 'Libres', 'Ocupados', 'Porcentaje'])
+                # Escribir datos
+                writer.writerows(rows)
+                return buffer.getvalue().encode('utf-8')
+            
+            def on_exported(success, path, error):
+                def notify():
+                    if success:
+                        self.status_var.set(f"📤 Datos exportados a {os.path.basename(path)}")
+                        messagebox.showinfo("Éxito", "Datos exportados correctamente")
+                    else:
+                        messagebox.showerror("Error", f"Error al exportar: {error}")
+                self.root.after(0, notify)
+            
+            if self.io_writer.submit(filepath, build_csv, on_done=on_exported):
+                self.status_var.set(f"📤 Exportando datos a {os.path.basename(filepath)}...")
+            else:
+                messagebox.showerror("Error", "No se pudo encolar la exportación")
+    
+    def export_history_data(self):
+        """Exporta el historial persistente completo recorriendo el cursor de SQLite"""
+        if self.history_store.count_stats() == 0:
+            messagebox.showwarning("Advertencia", "No hay datos para exportar")
+            return
+        
+        filetypes = [("CSV files", "*.csv"), ("CSV comprimido", "*.csv.gz"),
+                     ("Ocupación por espacio (JSONL)", "*.jsonl")]
+        filepath = filedialog.asksaveasfilename(
+            title="Exportar Historial de Análisis",
+            filetypes=filetypes,
+            defaultextension=".csv"
+        )
+        if not filepath:
+            return
+        
+        def export():
+            # .jsonl exporta el estado de cada espacio; el resto, las estadísticas agregadas
+            if filepath.lower().endswith(('.jsonl', '.jsonl.gz')):
+                success = FileManager.export_history_occupancy(self.history_store, filepath)
+            else:
+                success = FileManager.export_history_stats(self.history_store, filepath)
+            
+            def notify():
+                if success:
+                    self.status_var.set(f"📤 Historial exportado a {os.path.basename(filepath)}")
+                    messagebox.showinfo("Éxito", "Datos exportados correctamente")
+                else:
+                    messagebox.showerror("Error", "Error al exportar el historial")
+            self.root.after(0, notify)
+        
+        self.status_var.set(f"📤 Exportando historial a {os.path.basename(filepath)}...")
+        threading.Thread(target=export, daemon=True).start()
     
     def clear_analytics_history(self):
         """Limpia el historial de análisis"""
         if messagebox.askyesno("Confirmar", "¿Eliminar todo el historial de datos?"):
+            if self.history_store is not None:
+                self.history_store.clear()
             for child in self.stats_tree.get_children():
                 self.stats_tree.delete(child)
             self.status_var.set("🗑️ Historial de análisis limpiado")
@@ -917,6 +1146,10 @@ class ModernCarParkGUI:
         # FPS del video
         self.fps_label = ttk.Label(info_frame, text="FPS: 0", style='Info.TLabel')
         self.fps_label.pack(side=tk.RIGHT, padx=(20, 0))
+        
+        # Escrituras pendientes en disco
+        self.io_label = ttk.Label(info_frame, text="E/S: 0", style='Info.TLabel')
+        self.io_label.pack(side=tk.RIGHT, padx=(20, 0))
     
     def start_status_updates(self):
         """Inicia las actualizaciones periódicas de estado"""
@@ -946,6 +1179,9 @@ class ModernCarParkGUI:
         # Actualizar barra de progreso
         self.progress_vars['occupancy'].set(occupancy_percent)
         
+        # Profundidad de la cola de escritura
+        self.io_label.configure(text=f"E/S: {self.io_writer.queue_depth()}")
+        
         # Programar siguiente actualización
         self.root.after(2000, self.update_stats)
     
@@ -960,6 +1196,8 @@ class ModernCarParkGUI:
         self.root.bind('<Control-c>', self.copy_selected_space)
         self.root.bind('<Control-v>', self.paste_spaces)
         self.root.bind('<Control-z>', self.undo_action)
+        self.root.bind('<Control-y>', self.redo_action)
+        self.root.bind('<Control-Z>', self.redo_action)  # Ctrl+Shift+Z
         self.root.bind('<Delete>', self.delete_selected_space)
         self.root.bind('<Escape>', self.exit_all_modes)
         
@@ -1142,6 +1380,7 @@ class ModernCarParkGUI:
 
     def on_canvas_resize(self, event):
         """Maneja el redimensionamiento del canvas de video"""
+        self.video_renderer.on_configure(event)
         if self.current_frame is not None:
             self.update_video_display()
     
@@ -1164,6 +1403,9 @@ class ModernCarParkGUI:
         
         if filepath:
             if self.video_manager.load_video(filepath):
+                # El fondo aprendido y la referencia de deriva pertenecen al video anterior
+                self.reset_source_models()
+                
                 # Obtener primer frame
                 frame = self.video_manager.get_frame()
                 if frame is not None:
@@ -1182,9 +1424,76 @@ class ModernCarParkGUI:
             else:
                 messagebox.showerror("Error", "No se pudo cargar el video")
     
+    def on_analysis_method_changed(self, event=None):
+        """Al elegir 'classifier' se recargan los pesos (pueden haberse entrenado con la GUI abierta)"""
+        if self.analysis_method.get() != "classifier":
+            return
+        
+        self.classifier_analyzer = ClassifierOccupancyAnalyzer.from_file(config.CLASSIFIER_WEIGHTS_PATH)
+        self.classifier_notice_shown = False
+        if self.classifier_ready():
+            self.status_var.set(f"🧠 Pesos del clasificador cargados: {config.CLASSIFIER_WEIGHTS_PATH}")
+    
+    def classifier_ready(self) -> bool:
+        """Verifica que el clasificador tenga pesos; si no, avisa una vez que se usa 'working'"""
+        if self.classifier_analyzer.model is not None:
+            return True
+        if not self.classifier_notice_shown:
+            self.classifier_notice_shown = True
+            message = (f"⚠️ Sin pesos del clasificador en {config.CLASSIFIER_WEIGHTS_PATH}: "
+                       "se usa 'working' (entrenar con python -m src.occupancy_classifier train)")
+            print(message)
+            self.root.after(0, lambda: self.status_var.set(message))
+        return False
+    
+    def reset_source_models(self):
+        """Descarta el fondo aprendido y la referencia de deriva (pertenecen a la fuente anterior)"""
+        self.background_analyzer.reset()
+        self.background_notice_shown = False
+        if self.drift_tracker is not None:
+            self.drift_tracker.reset()
+            self.last_drift = (0, 0)
+    
+    def set_background_frame(self):
+        """Usa el frame actual como fondo del estacionamiento vacío"""
+        if self.current_frame is None:
+            messagebox.showwarning("Advertencia", "No hay imagen cargada")
+            return
+        
+        self.background_analyzer.set_background(self.current_frame)
+        self.background_notice_shown = False
+        self.status_var.set("🅿️ Fondo fijado: el frame actual se usa como estacionamiento vacío")
+    
+    def notify_background_seed(self):
+        """Avisa una vez que el fondo se tomó del primer frame analizado"""
+        if self.background_analyzer.seeded_from_frame and not self.background_notice_shown:
+            self.background_notice_shown = True
+            message = ("⚠️ Fondo tomado del primer frame: si había autos, use 'Fijar Fondo' "
+                       "con el estacionamiento vacío")
+            print(message)
+            self.root.after(0, lambda: self.status_var.set(message))
+    
+    def step_video(self, delta: int):
+        """Navega el video grabado frame a frame"""
+        if not self.video_manager.cap or not self.video_manager.is_file:
+            self.status_var.set("⚠️ La navegación por frames requiere un video cargado")
+            return
+        
+        frame = self.video_manager.step_frame(delta)
+        if frame is None:
+            return
+        self.current_frame = frame
+        self.update_video_display()
+        self.refresh_editor_display()
+        
+        total = self.video_manager.frame_count()
+        self.status_var.set(f"🎞️ Frame {self.video_manager.frame_number + 1}/{total}")
+    
     def load_camera(self):
         """Carga una cámara"""
         if self.video_manager.load_camera():
+            self.reset_source_models()
+            
             # Obtener el primer frame de la cámara
             frame = self.video_manager.get_frame()
             if frame is not None:
@@ -1246,7 +1555,8 @@ class ModernCarParkGUI:
                 )
             
             # Iniciar hilo de análisis
-            threading.Thread(target=self.analysis_loop, daemon=True).start()
+            self.analysis_thread = threading.Thread(target=self.analysis_loop, daemon=True)
+            self.analysis_thread.start()
             
         else:
             # Detener análisis
@@ -1278,16 +1588,33 @@ class ModernCarParkGUI:
                     if self.spaces:
                         # Usar el método seleccionado
                         method = self.analysis_method.get()
+                        spaces = self.aligned_spaces(frame)
                         
                         if method == "simple":
                             # Usar analizador simple por threshold
-                            self.analysis_results = self.simple_analyzer.analyze_spaces(frame, self.spaces)
+                            self.analysis_results = self.simple_analyzer.analyze_spaces(frame, spaces)
                         elif method == "working":
                             # Usar analizador que replica el código exitoso original main.py
-                            self.analysis_results = self.analyzer.analyze_spaces(frame, self.spaces)
+                            self.analysis_results = self.analyzer.analyze_spaces(frame, spaces)
+                        elif method == "background":
+                            # Sustracción de fondo: el modelo se actualiza con cada frame analizado
+                            self.analysis_results = self.background_analyzer.analyze_spaces(frame, spaces)
+                            self.notify_background_seed()
+                        elif method in ("adaptive", "ml"):
+                            # Características por espacio calculadas en una pasada
+                            self.feature_analyzer.method = method
+                            self.analysis_results = self.feature_analyzer.analyze_spaces(frame, spaces)
+                        elif method == "classifier" and self.classifier_ready():
+                            # Clasificador logístico: una inferencia matricial por frame
+                            self.analysis_results = self.classifier_analyzer.analyze_spaces(frame, spaces)
                         else:
                             # Por defecto usar el working analyzer que sabemos que funciona
-                            self.analysis_results = self.analyzer.analyze_spaces(frame, self.spaces)
+                            self.analysis_results = self.analyzer.analyze_spaces(frame, spaces)
+                        
+                        # Registrar en el historial persistente
+                        if self.analysis_results and self.history_store is not None:
+                            stats = self.record_analysis(self.analysis_results)
+                            self.root.after(0, lambda s=stats: self.insert_stats_row(s))
                         
                         # Actualizar estadísticas en tiempo real
                         self.root.after(0, self.update_real_time_stats)
@@ -1340,52 +1667,14 @@ class ModernCarParkGUI:
             return
         
         try:
-            # Obtener dimensiones del canvas de forma segura
-            self.video_canvas.update_idletasks()
-            canvas_width = self.video_canvas.winfo_width()
-            canvas_height = self.video_canvas.winfo_height()
-            
-            # Si el canvas aún no está listo, usar valores por defecto
-            if canvas_width <= 1 or canvas_height <= 1:
-                canvas_width = 800
-                canvas_height = 600
-            
-            # Crear una copia del frame para modificar
-            display_frame = self.current_frame.copy()
-            
-            # Dibujar espacios si existen
+            # Dibujar espacios sobre una copia solo si hay espacios
             if self.spaces:
-                display_frame = self.draw_spaces_on_frame(display_frame)
-            
-            # Redimensionar frame manteniendo proporción
-            height, width = display_frame.shape[:2]
-            scale = min(canvas_width / width, canvas_height / height)
-            new_width = int(width * scale)
-            new_height = int(height * scale)
+                display_frame = self.draw_spaces_on_frame(self.current_frame.copy())
+            else:
+                display_frame = self.current_frame
             
-            # Validar dimensiones antes de redimensionar
-            if new_width > 0 and new_height > 0:
-                frame_resized = cv2.resize(display_frame, (new_width, new_height))
-                
-                # Convertir a RGB para Tkinter
-                if len(frame_resized.shape) == 3:
-                    frame_rgb = cv2.cvtColor(frame_resized, cv2.COLOR_BGR2RGB)
-                else:
-                    frame_rgb = frame_resized
-                
-                # Crear imagen Tkinter
-                image = Image.fromarray(frame_rgb)
-                photo = ImageTk.PhotoImage(image)
-                
-                # Centrar imagen en canvas
-                self.video_canvas.delete("all")
-                x_center = canvas_width // 2
-                y_center = canvas_height // 2
-                
-                self.video_canvas.create_image(x_center, y_center, image=photo, anchor="center")
-                
-                # Mantener referencia para evitar garbage collection
-                self.current_video_photo = photo
+            # Escala, buffers y PhotoImage se reutilizan entre frames
+            self.video_renderer.render(display_frame)
             
         except Exception as e:
             print(f"Error actualizando video display: {e}")
@@ -1394,65 +1683,55 @@ class ModernCarParkGUI:
             
             # Mostrar mensaje de error en el canvas de forma segura
             try:
-                if hasattr(self, 'video_canvas') and self.video_canvas is not None:
-                    self.video_canvas.delete("all")
-                    canvas_w = self.video_canvas.winfo_width()
-                    canvas_h = self.video_canvas.winfo_height()
-                    
-                    if canvas_w > 1 and canvas_h > 1:
-                        self.video_canvas.create_text(
-                            canvas_w // 2,
-                            canvas_h // 2,
-                            text="Error al mostrar video\nRevise la consola para detalles",
-                            fill="white",
-                            font=("Arial", 12),
-                            justify="center"
-                        )
+                self.video_renderer.show_message(
+                    "Error al mostrar video\nRevise la consola para detalles"
+                )
             except Exception as canvas_error:
                 print(f"Error adicional en canvas: {canvas_error}")
     
     def draw_spaces_on_frame(self, frame):
         """Dibuja los espacios en el frame y retorna el frame modificado"""
         try:
-            for i, space in enumerate(self.spaces):
-                # Determinar color según estado
+            states = []
+            for i in range(len(self.spaces)):
+                # Determinar estado: 0 libre, 1 ocupado, 2 sin analizar
                 if i < len(self.analysis_results):
-                    if hasattr(self.analysis_results[i], 'is_occupied'):
-                        # Resultado moderno (OccupancyStatus)
-                        status = self.analysis_results[i]
-                        color = (0, 255, 0) if not status.is_occupied else (0, 0, 255)
-                    else:
-                        # Resultado legacy (boolean)
-                        is_occupied = self.analysis_results[i]
-                        color = (0, 255, 0) if not is_occupied else (0, 0, 255)
-                    thickness = 3
+                    result = self.analysis_results[i]
+                    # Resultado moderno (OccupancyStatus) o legacy (boolean)
+                    is_occupied = result.is_occupied if hasattr(result, 'is_occupied') else result
+                    states.append(1 if is_occupied else 0)
                 else:
-                    color = (255, 255, 0)  # Amarillo para espacios sin analizar
-                    thickness = 2
-                
-                # Dibujar rectángulo
-                cv2.rectangle(frame, (space.x, space.y), 
-                             (space.x + space.width, space.y + space.height), 
-                             color, thickness)
-                
-                # Dibujar número del espacio
-                cv2.putText(frame, str(i + 1), 
-                           (space.x + 5, space.y + 20),
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+                    states.append(2)
+            
+            if len(self.space_labels) != len(self.spaces):
+                self.space_labels = [str(i + 1) for i in range(len(self.spaces))]
             
-            return frame
+            # Layout alineado con la deriva de la cámara (si corresponde al actual)
+            spaces = self.analysis_spaces if len(self.analysis_spaces) == len(self.spaces) else self.spaces
+            
+            # Solo se redibujan los espacios cuyo estado cambió
+            return self.space_overlay.render(frame, spaces, states, self.space_labels)
             
         except Exception as e:
             print(f"Error dibujando espacios en frame: {e}")
             return frame  # Retornar frame original si hay error
     
     def take_snapshot(self):
-        """Toma una captura de pantalla"""
+        """Toma una captura de pantalla (se codifica y guarda en segundo plano)"""
         if self.current_frame is not None:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            # Milisegundos: dos capturas en el mismo segundo no deben pisarse
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")[:-3]
             filename = f"snapshot_{timestamp}.jpg"
-            cv2.imwrite(filename, self.current_frame)
-            self.status_var.set(f"📸 Captura guardada: {filename}")
+            
+            def on_saved(success, path, error):
+                message = f"📸 Captura guardada: {path}" if success else f"❌ Error guardando captura: {error}"
+                self.root.after(0, lambda: self.status_var.set(message))
+            
+            if self.io_writer.save_image(filename, self.current_frame.copy(), coalesce=False,
+                                         on_done=on_saved):
+                self.status_var.set(f"📸 Guardando captura: {filename}")
+            else:
+                messagebox.showerror("Error", "No se pudo encolar la captura")
         else:
             messagebox.showwarning("Advertencia", "No hay video cargado")
     
@@ -1468,7 +1747,8 @@ class ModernCarParkGUI:
     def open_space_editor(self):
         """Abre el editor de espacios moderno"""
         if self.current_frame is not None:
-            self.space_editor = SpaceEditor(self.root, self.current_frame, self.spaces)
+            self.space_editor = SpaceEditor(self.root, self.current_frame, self.spaces,
+                                            detector=self.detector)
             self.space_editor.show(self.on_spaces_updated)
         else:
             messagebox.showwarning("Advertencia", "Carga un video o imagen primero")
@@ -1482,6 +1762,7 @@ class ModernCarParkGUI:
         """Carga espacios desde archivo"""
         filetypes = [
             ("Archivos JSON", "*.json"),
+            ("Layout Binario", "*.cpl"),
             ("Archivo Legacy CarParkPos", "CarParkPos"),
             ("Archivos Legacy (Sin extensión)", "*"),
             ("Todos los archivos", "*.*")
@@ -1503,6 +1784,14 @@ class ModernCarParkGUI:
                     self.force_update_all_displays()
                 else:
                     messagebox.showerror("Error", "No se pudieron cargar los espacios JSON")
+            elif filepath.endswith('.cpl'):
+                spaces = FileManager.load_spaces_binary(filepath)
+                if spaces:
+                    self.spaces = spaces
+                    self.status_var.set(f"📂 Cargados {len(spaces)} espacios desde layout binario")
+                    self.force_update_all_displays()
+                else:
+                    messagebox.showerror("Error", "No se pudo cargar el layout binario")
             else:
                 # Intentar cargar como archivo legacy (pickle)
                 try:
@@ -1554,7 +1843,7 @@ class ModernCarParkGUI:
             messagebox.showwarning("Advertencia", "No hay espacios para guardar")
             return
         
-        filetypes = [("Archivos JSON", "*.json")]
+        filetypes = [("Archivos JSON", "*.json"), ("Layout Binario", "*.cpl")]
         filepath = filedialog.asksaveasfilename(
             title="Guardar Espacios",
             filetypes=filetypes,
@@ -1563,7 +1852,19 @@ class ModernCarParkGUI:
         )
         
         if filepath:
-            if FileManager.save_spaces_json(self.spaces, filepath):
+            if filepath.endswith('.cpl'):
+                if has_polygons(self.spaces):
+                    # El .cpl solo guarda rectángulos; no perder los vértices en silencio
+                    messagebox.showwarning(
+                        "Advertencia",
+                        "El formato binario (.cpl) no admite espacios poligonales.\n"
+                        "Guarde el layout como JSON para conservar los polígonos."
+                    )
+                    return
+                saved = FileManager.save_spaces_binary(self.spaces, filepath)
+            else:
+                saved = FileManager.save_spaces_json(self.spaces, filepath)
+            if saved:
                 self.status_var.set("💾 Espacios guardados")
             else:
                 messagebox.showerror("Error", "No se pudieron guardar los espacios")
@@ -1701,6 +2002,8 @@ class ModernCarParkGUI:
                         anchor="nw",
                         tags="image"
                     )
+                    # Los espacios persisten entre redibujados: la imagen siempre debajo
+                    self.editor_canvas.tag_lower("image")
                     
                     # Mantener referencia para evitar garbage collection
                     self.current_editor_photo = photo
@@ -1723,73 +2026,110 @@ class ModernCarParkGUI:
                 traceback.print_exc()
     
     def redraw_spaces_in_editor(self):
-        """Redibuja los espacios en el canvas del editor"""
+        """Sincroniza los ítems del canvas del editor con los espacios (solo aplica diferencias)"""
         if not hasattr(self, 'editor_canvas') or self.editor_canvas is None:
             return
-            
-        self.editor_canvas.delete("space")
-        self.editor_canvas.delete("selected")
         
         # Verificar que tenemos información de escala
         if not hasattr(self, 'editor_scale'):
             return
         
+        canvas = self.editor_canvas
+        font = ("Arial", max(8, int(10 * self.editor_scale)), "bold")
+        
+        # Cambio de escala u offset: transformar todos los ítems con una sola llamada
+        view = (self.editor_scale, self.editor_offset_x, self.editor_offset_y)
+        if self.editor_items and self.editor_items_view is not None and view != self.editor_items_view:
+            old_scale, old_x, old_y = self.editor_items_view
+            factor = self.editor_scale / old_scale
+            canvas.scale("space_item", old_x, old_y, factor, factor)
+            canvas.move("space_item", self.editor_offset_x - old_x, self.editor_offset_y - old_y)
+            if max(8, int(10 * old_scale)) != font[1]:
+                canvas.itemconfigure("space_label", font=font)
+        self.editor_items_view = view
+        
+        seen = set()
+        selected_ids = {id(space) for space in self.get_selection()}
         for i, space in enumerate(self.spaces):
-            # Aplicar escala y offset a las coordenadas originales del espacio
-            x1_scaled = int(space.x * self.editor_scale) + self.editor_offset_x
-            y1_scaled = int(space.y * self.editor_scale) + self.editor_offset_y
-            x2_scaled = int((space.x + space.width) * self.editor_scale) + self.editor_offset_x
-            y2_scaled = int((space.y + space.height) * self.editor_scale) + self.editor_offset_y
+            key = id(space)
+            seen.add(key)
+            geometry = (space.x, space.y, space.width, space.height)
+            color, width, tag = self.get_editor_space_style(i, space, selected_ids)
             
-            # Color según estado
-            if space == self.selected_space:
-                # Espacio seleccionado
-                color = ModernDarkTheme.COLORS['accent_yellow']
-                width = 3
-                tags = "selected"
-            else:
-                # Color según análisis si está disponible
-                color = ModernDarkTheme.COLORS['accent_green']
-                if i < len(self.analysis_results):
-                    if hasattr(self.analysis_results[i], 'is_occupied'):
-                        if self.analysis_results[i].is_occupied:
-                            color = ModernDarkTheme.COLORS['accent_red']
-                    else:
-                        # Resultado legacy (boolean)
-                        if self.analysis_results[i]:
-                            color = ModernDarkTheme.COLORS['accent_red']
-                width = 2
-                tags = "space"
+            items = self.editor_items.get(key)
+            if items is None:
+                # Espacio nuevo: crear sus ítems una única vez
+                x1, y1 = self.image_to_canvas_coords(space.x, space.y)
+                x2, y2 = self.image_to_canvas_coords(space.x + space.width, space.y + space.height)
+                rect_id = canvas.create_rectangle(
+                    x1, y1, x2, y2, outline=color, width=width, fill='',
+                    tags=(tag, "space_item")
+                )
+                text_id = canvas.create_text(
+                    x1 + 5, y1 + 5,
+                    text=str(i + 1),  # Usar i+1 para que empiece en 1
+                    fill=color, font=font, anchor="nw",
+                    tags=(tag, "space_item", "space_label")
+                )
+                self.editor_items[key] = (rect_id, text_id)
+                self.editor_item_state[key] = (geometry, i, color, tag)
+                continue
             
-            # Dibujar rectángulo escalado
-            rect_id = self.editor_canvas.create_rectangle(
-                x1_scaled, y1_scaled, x2_scaled, y2_scaled,
-                outline=color,
-                width=width,
-                fill='',
-                tags=tags
-            )
+            rect_id, text_id = items
+            old_geometry, old_index, old_color, old_tag = self.editor_item_state[key]
             
-            # Agregar número del espacio escalado
-            text_id = self.editor_canvas.create_text(
-                x1_scaled + 5, y1_scaled + 5,
-                text=str(i + 1),  # Usar i+1 para que empiece en 1
-                fill=color,
-                font=("Arial", max(8, int(10 * self.editor_scale)), "bold"),
-                anchor="nw",
-                tags=tags
-            )
+            if geometry != old_geometry:
+                x1, y1 = self.image_to_canvas_coords(space.x, space.y)
+                x2, y2 = self.image_to_canvas_coords(space.x + space.width, space.y + space.height)
+                canvas.coords(rect_id, x1, y1, x2, y2)
+                canvas.coords(text_id, x1 + 5, y1 + 5)
+            
+            if color != old_color or tag != old_tag:
+                canvas.itemconfigure(rect_id, outline=color, width=width, tags=(tag, "space_item"))
+                canvas.itemconfigure(text_id, fill=color, tags=(tag, "space_item", "space_label"))
+            
+            if i != old_index:
+                canvas.itemconfigure(text_id, text=str(i + 1))
+            
+            self.editor_item_state[key] = (geometry, i, color, tag)
+        
+        # Eliminar ítems de espacios que ya no existen
+        for key in [key for key in self.editor_items if key not in seen]:
+            canvas.delete(*self.editor_items.pop(key))
+            del self.editor_item_state[key]
+    
+    def get_editor_space_style(self, index: int, space: ParkingSpace,
+                               selected_ids: set) -> Tuple[str, int, str]:
+        """Color, grosor y tag de un espacio en el editor"""
+        if id(space) in selected_ids:
+            # Espacio seleccionado
+            return ModernDarkTheme.COLORS['accent_yellow'], 3, "selected"
+        
+        # Color según análisis si está disponible
+        color = ModernDarkTheme.COLORS['accent_green']
+        if index < len(self.analysis_results):
+            result = self.analysis_results[index]
+            # Resultado moderno (OccupancyStatus) o legacy (boolean)
+            is_occupied = result.is_occupied if hasattr(result, 'is_occupied') else result
+            if is_occupied:
+                color = ModernDarkTheme.COLORS['accent_red']
+        return color, 2, "space"
+    
+    def clear_editor_items(self):
+        """Elimina todos los ítems de espacios del canvas del editor"""
+        if hasattr(self, 'editor_canvas') and self.editor_canvas is not None:
+            self.editor_canvas.delete("space_item")
+        self.editor_items.clear()
+        self.editor_item_state.clear()
     
     def clear_all_spaces(self):
         """Elimina todos los espacios"""
         if messagebox.askyesno("Confirmar", "¿Eliminar todos los espacios definidos?"):
-            # Guardar estado para undo
-            self.save_state_for_undo()
-            
-            self.spaces.clear()
-            self.selected_space = None
-            self.editor_canvas.delete("space")
-            self.editor_canvas.delete("selected")
+            # Registrar la eliminación de todos los espacios para poder deshacerla
+            self.edit_history.execute(
+                RemoveSpaces(list(enumerate(self.spaces))), self.spaces, self.space_index)
+            self.clear_selection()
+            self.clear_editor_items()
             self.status_var.set("🗑️ Todos los espacios eliminados")
             
             # Actualizar información
@@ -1814,6 +2154,7 @@ class ModernCarParkGUI:
                 image = cv2.imread(filepath)
                 if image is not None:
                     self.current_frame = image
+                    self.reset_source_models()
                     self.display_image_in_editor()
                     # También actualizar el monitor principal
                     self.update_video_display()
@@ -1827,7 +2168,7 @@ class ModernCarParkGUI:
         """Inicia el modo de dibujo"""
         self.drawing_mode = True
         self.selection_mode = False
-        self.selected_space = None
+        self.clear_selection()
         self.editor_canvas.configure(cursor="crosshair")
         self.status_var.set("✏️ Modo dibujo activado")
         self.redraw_spaces_in_editor()
@@ -1864,28 +2205,29 @@ class ModernCarParkGUI:
         """Encuentra el espacio en las coordenadas dadas del canvas"""
         # Convertir coordenadas del canvas a coordenadas de imagen
         image_x, image_y = self.canvas_to_image_coords(canvas_x, canvas_y)
-        
-        for space in self.spaces:
-            if (space.x <= image_x <= space.x + space.width and
-                space.y <= image_y <= space.y + space.height):
-                return space
-        return None
+        return self.get_space_index().space_at(image_x, image_y)
     
-    def save_state_for_undo(self):
-        """Guarda el estado actual para poder deshacerlo"""
-        # Copiar espacios actuales
-        current_state = [space.copy() for space in self.spaces]
-        self.undo_stack.append(current_state)
-        
-        # Limitar el tamaño del stack
-        if len(self.undo_stack) > self.max_undo:
-            self.undo_stack.pop(0)
+    def get_space_index(self) -> SpaceIndex:
+        """Índice espacial de los espacios (se reconstruye si la lista fue reemplazada)"""
+        self.space_index.ensure(self.spaces)
+        return self.space_index
+    
+    def clear_selection(self):
+        """Quita la selección simple y múltiple"""
+        self.selected_space = None
+        self.selected_spaces = []
+    
+    def get_selection(self) -> List[ParkingSpace]:
+        """Espacios seleccionados (múltiples o el seleccionado individualmente)"""
+        if self.selected_spaces:
+            return list(self.selected_spaces)
+        return [self.selected_space] if self.selected_space is not None else []
     
     def start_selection_mode(self):
         """Inicia el modo de selección"""
         self.selection_mode = True
         self.drawing_mode = False
-        self.selected_space = None
+        self.clear_selection()
         self.editor_canvas.configure(cursor="hand2")
         self.status_var.set("👆 Modo selección activado")
         self.redraw_spaces_in_editor()
@@ -1898,9 +2240,13 @@ class ModernCarParkGUI:
     
     def copy_selected_space(self, event=None):
         """Copia el espacio seleccionado al clipboard"""
-        if self.selected_space is not None:
-            self.clipboard_spaces = [self.selected_space.copy()]
-            self.status_var.set(f"📋 Espacio {self.selected_space.id} copiado")
+        selection = self.get_selection()
+        if len(selection) > 1:
+            self.clipboard_spaces = [space.copy() for space in selection]
+            self.status_var.set(f"📋 {len(selection)} espacios seleccionados copiados")
+        elif selection:
+            self.clipboard_spaces = [selection[0].copy()]
+            self.status_var.set(f"📋 Espacio {selection[0].id} copiado")
         elif self.spaces:
             # Si no hay selección, copiar todos los espacios
             self.clipboard_spaces = [space.copy() for space in self.spaces]
@@ -1914,23 +2260,22 @@ class ModernCarParkGUI:
             self.status_var.set("⚠️ Clipboard vacío")
             return
         
-        # Guardar estado para undo
-        self.save_state_for_undo()
-        
         # Calcular offset para evitar solapamiento
         offset_x, offset_y = 20, 20
         
-        pasted_count = 0
-        for space in self.clipboard_spaces:
+        start = len(self.spaces)
+        entries = []
+        for i, space in enumerate(self.clipboard_spaces):
             new_space = ParkingSpace(
-                id=str(len(self.spaces)),
+                id=str(start + i),
                 x=space.x + offset_x,
                 y=space.y + offset_y,
                 width=space.width,
                 height=space.height
             )
-            self.spaces.append(new_space)
-            pasted_count += 1
+            entries.append((start + i, new_space))
+        self.edit_history.execute(AddSpaces(entries), self.spaces, self.space_index)
+        pasted_count = len(entries)
         
         self.redraw_spaces_in_editor()
         self.status_var.set(f"📋 {pasted_count} espacios pegados")
@@ -1943,22 +2288,28 @@ class ModernCarParkGUI:
             )
     
     def delete_selected_space(self, event=None):
-        """Elimina el espacio seleccionado"""
-        if self.selected_space is not None:
-            # Guardar estado para undo
-            self.save_state_for_undo()
-            
-            # Eliminar espacio
-            if self.selected_space in self.spaces:
-                self.spaces.remove(self.selected_space)
+        """Elimina el espacio (o los espacios) seleccionados"""
+        selection = self.get_selection()
+        if selection:
+            # Eliminar espacios (por identidad, no por igualdad de campos)
+            removed_ids = {id(space) for space in selection}
+            removed = [(i, space) for i, space in enumerate(self.spaces) if id(space) in removed_ids]
+            if removed:
+                remove_command = RemoveSpaces(removed)
+                remove_command.apply(self.spaces, self.space_index)
                 
-                # Renumerar IDs
-                for i, space in enumerate(self.spaces):
-                    space.id = str(i)
+                # Renumerar IDs (solo se registran los que cambian)
+                rename_command = renumber_command(self.spaces)
+                rename_command.apply(self.spaces)
+                self.edit_history.record(
+                    BatchCommand([remove_command, rename_command], "Eliminar"), self.spaces)
                 
-                self.selected_space = None
+                self.clear_selection()
                 self.redraw_spaces_in_editor()
-                self.status_var.set("🗑️ Espacio eliminado")
+                if len(selection) > 1:
+                    self.status_var.set(f"🗑️ {len(selection)} espacios eliminados")
+                else:
+                    self.status_var.set("🗑️ Espacio eliminado")
                 
                 # Actualizar información
                 if hasattr(self, 'editor_info_label'):
@@ -1971,29 +2322,39 @@ class ModernCarParkGUI:
     
     def undo_action(self, event=None):
         """Deshace la última acción"""
-        if self.undo_stack:
-
-            # Restaurar estado anterior
-            previous_state = self.undo_stack.pop()
-            self.spaces = [space.copy() for space in previous_state]
-            self.selected_space = None
-            self.redraw_spaces_in_editor()
-            self.status_var.set(f"↶ Acción deshecha ({len(self.undo_stack)} en historial)")
-            
-            # Actualizar información
-            if hasattr(self, 'editor_info_label'):
-                mode_text = "SELECCIÓN" if self.selection_mode else ("Dibujo ACTIVO" if self.drawing_mode else "Visualización")
-                self.editor_info_label.configure(
-                    text=f"Espacios definidos: {len(self.spaces)} | Modo: {mode_text}"
-                )
+        command = self.edit_history.undo(self.spaces, self.space_index)
+        if command is not None:
+            self.after_history_change()
+            self.status_var.set(f"↶ {command.description} deshecho ({len(self.edit_history)} en historial)")
         else:
             self.status_var.set("⚠️ No hay acciones para deshacer")
     
+    def redo_action(self, event=None):
+        """Rehace la última acción deshecha"""
+        command = self.edit_history.redo(self.spaces, self.space_index)
+        if command is not None:
+            self.after_history_change()
+            self.status_var.set(f"↷ {command.description} rehecho ({self.edit_history.redo_count()} para rehacer)")
+        else:
+            self.status_var.set("⚠️ No hay acciones para rehacer")
+    
+    def after_history_change(self):
+        """Refresca el editor tras deshacer o rehacer"""
+        self.clear_selection()
+        self.redraw_spaces_in_editor()
+        
+        # Actualizar información
+        if hasattr(self, 'editor_info_label'):
+            mode_text = "SELECCIÓN" if self.selection_mode else ("Dibujo ACTIVO" if self.drawing_mode else "Visualización")
+            self.editor_info_label.configure(
+                text=f"Espacios definidos: {len(self.spaces)} | Modo: {mode_text}"
+            )
+    
     def exit_all_modes(self, event=None):
         """Sale de todos los modos de edición"""
         self.drawing_mode = False
         self.selection_mode = False
-        self.selected_space = None
+        self.clear_selection()
         self.dragging_space = False
         if hasattr(self, 'editor_canvas') and self.editor_canvas:
             self.editor_canvas.configure(cursor="arrow")
@@ -2009,14 +2370,15 @@ class ModernCarParkGUI:
     def on_canvas_click(self, event):
         """Maneja el clic en el canvas del editor con coordenadas escaladas correctas"""
         if self.selection_mode:
-            # Convertir coordenadas de canvas a coordenadas de imagen
-            img_x, img_y = self.canvas_to_image_coords(event.x, event.y)
-            
-            # Buscar espacio en la posición del clic (coordenadas de imagen)
-            clicked_space = self.find_space_at_point(img_x, img_y)
+            # Buscar espacio en la posición del clic (coordenadas de canvas)
+            clicked_space = self.find_space_at_point(event.x, event.y)
             if clicked_space:
+                # Clic sobre un espacio de la selección múltiple: arrastrar todo el grupo
+                if not any(space is clicked_space for space in self.selected_spaces):
+                    self.selected_spaces = []
                 self.selected_space = clicked_space
                 self.dragging_space = True
+                self.drag_origin = (clicked_space.x, clicked_space.y)
                 
                 # Calcular offset en coordenadas de canvas para el drag
                 canvas_x, canvas_y = self.image_to_canvas_coords(clicked_space.x, clicked_space.y)
@@ -2025,13 +2387,12 @@ class ModernCarParkGUI:
                 self.redraw_spaces_in_editor()
                 self.status_var.set(f"👆 Espacio {clicked_space.id or len(self.spaces)} seleccionado")
             else:
-                self.selected_space = None
+                # Clic en zona vacía: iniciar selección rectangular
+                self.clear_selection()
+                self.rubber_band_start = (event.x, event.y)
                 self.redraw_spaces_in_editor()
                 self.status_var.set("👆 Modo selección activo")
         elif self.drawing_mode:
-            # Guardar estado para undo antes de crear nuevo espacio
-            self.save_state_for_undo()
-            
             # Convertir coordenadas a imagen para el inicio del dibujo
             img_x, img_y = self.canvas_to_image_coords(event.x, event.y)
             self.drawing_start = (img_x, img_y)
@@ -2054,9 +2415,13 @@ class ModernCarParkGUI:
                 img_x = max(0, img_x)
                 img_y = max(0, img_y)
             
-            # Actualizar posición en coordenadas de imagen
-            self.selected_space.x = int(img_x)
-            self.selected_space.y = int(img_y)
+            # Actualizar posición en coordenadas de imagen (todo el grupo si hay selección múltiple)
+            dx = int(img_x) - self.selected_space.x
+            dy = int(img_y) - self.selected_space.y
+            space_index = self.get_space_index()
+            for space in (self.selected_spaces or [self.selected_space]):
+                space.translate(dx, dy)
+                space_index.move(space)
             
             # Redibujar inmediatamente para feedback visual
             self.redraw_spaces_in_editor()
@@ -2064,10 +2429,21 @@ class ModernCarParkGUI:
             # Forzar actualización del canvas
             self.editor_canvas.update_idletasks()
             
-        elif self.drawing_mode and self.drawing_start:
-            # Limpiar rectángulo temporal previo
-            self.editor_canvas.delete("temp")
+        elif self.selection_mode and self.rubber_band_start:
+            # Actualizar el rectángulo de selección
+            x0, y0 = self.rubber_band_start
+            if self.rubber_band_item is None:
+                self.rubber_band_item = self.editor_canvas.create_rectangle(
+                    x0, y0, event.x, event.y,
+                    outline=ModernDarkTheme.COLORS['accent_blue'],
+                    width=1,
+                    dash=(4, 2),
+                    tags="rubber_band"
+                )
+            else:
+                self.editor_canvas.coords(self.rubber_band_item, x0, y0, event.x, event.y)
             
+        elif self.drawing_mode and self.drawing_start:
             # Convertir coordenadas actuales a imagen
             img_x2, img_y2 = self.canvas_to_image_coords(event.x, event.y)
             
@@ -2075,20 +2451,47 @@ class ModernCarParkGUI:
             canvas_x1, canvas_y1 = self.image_to_canvas_coords(self.drawing_start[0], self.drawing_start[1])
             canvas_x2, canvas_y2 = self.image_to_canvas_coords(img_x2, img_y2)
             
-            self.temp_rectangle = self.editor_canvas.create_rectangle(
-                canvas_x1, canvas_y1, canvas_x2, canvas_y2,
-                outline=ModernDarkTheme.COLORS['accent_blue'],
-                width=2,
-                fill='',
-                tags="temp"
-            )
+            # Reutilizar el rectángulo temporal durante el arrastre
+            if self.temp_rectangle is not None and self.editor_canvas.find_withtag("temp"):
+                self.editor_canvas.coords(self.temp_rectangle, canvas_x1, canvas_y1, canvas_x2, canvas_y2)
+            else:
+                self.temp_rectangle = self.editor_canvas.create_rectangle(
+                    canvas_x1, canvas_y1, canvas_x2, canvas_y2,
+                    outline=ModernDarkTheme.COLORS['accent_blue'],
+                    width=2,
+                    fill='',
+                    tags="temp"
+                )
     
     def on_canvas_release(self, event):
         """Maneja la liberación del clic en el canvas del editor con coordenadas escaladas"""
         if self.selection_mode and self.dragging_space:
             self.dragging_space = False
             if self.selected_space:
+                # Registrar el desplazamiento total del arrastre como un solo comando
+                if self.drag_origin is not None:
+                    dx = self.selected_space.x - self.drag_origin[0]
+                    dy = self.selected_space.y - self.drag_origin[1]
+                    if dx or dy:
+                        group = self.selected_spaces or [self.selected_space]
+                        self.edit_history.record(MoveSpaces(group, dx, dy), self.spaces)
                 self.status_var.set(f"👆 Espacio {self.selected_space.id or len(self.spaces)} movido")
+            self.drag_origin = None
+            
+        elif self.selection_mode and self.rubber_band_start:
+            # Seleccionar los espacios contenidos en el rectángulo
+            x0, y0 = self.canvas_to_image_coords(*self.rubber_band_start)
+            x1, y1 = self.canvas_to_image_coords(event.x, event.y)
+            self.rubber_band_start = None
+            if self.rubber_band_item is not None:
+                self.editor_canvas.delete(self.rubber_band_item)
+                self.rubber_band_item = None
+            
+            self.selected_spaces = self.get_space_index().spaces_in_rect(x0, y0, x1, y1, contained=True)
+            self.selected_space = self.selected_spaces[0] if self.selected_spaces else None
+            self.redraw_spaces_in_editor()
+            if self.selected_spaces:
+                self.status_var.set(f"👆 {len(self.selected_spaces)} espacios seleccionados")
             
         elif self.drawing_mode and self.drawing_start:
             # Convertir coordenadas finales a imagen
@@ -2113,7 +2516,8 @@ class ModernCarParkGUI:
                     width=int(width),
                     height=int(height)
                 )
-                self.spaces.append(new_space)
+                self.edit_history.execute(
+                    AddSpaces([(len(self.spaces), new_space)]), self.spaces, self.space_index)
                 
                 # Actualizar interfaz
                 if hasattr(self, 'editor_info_label'):
@@ -2143,11 +2547,27 @@ class ModernCarParkGUI:
         self.redraw_spaces_in_editor()
         self.status_var.set(f"✅ Espacios actualizados desde editor legacy: {len(spaces)}")
     
+    def stop_analysis_thread(self, timeout: float = 5.0):
+        """Detiene el hilo de análisis y espera a que termine su frame en curso"""
+        self.is_analyzing = False
+        thread = self.analysis_thread
+        deadline = time.time() + timeout
+        while thread is not None and thread.is_alive() and time.time() < deadline:
+            # El hilo puede estar esperando una llamada a Tk: procesar eventos mientras tanto
+            self.root.update()
+            thread.join(0.05)
+        self.analysis_thread = None
+    
     def on_closing(self):
         """Limpia recursos al cerrar"""
-        self.is_analyzing = False
+        # El hilo de análisis escribe en el historial: debe terminar antes de cerrarlo
+        self.stop_analysis_thread()
         self.video_manager.stop_capture()
         self.video_manager.release()
+        # Completar escrituras pendientes antes de salir
+        self.io_writer.flush(timeout=5.0)
+        if self.history_store is not None:
+            self.history_store.close()
         self.root.destroy()
 
 # Función para inicializar la GUI moderna
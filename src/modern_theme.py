@@ -22,6 +22,7 @@ class ModernDarkTheme:
         'accent_orange': '#ff8c00',   # Naranja advertencia
         'accent_red': '#d83b01',      # Rojo error
         'accent_purple': '#8b5cf6',   # Púrpura moderno
+        'accent_yellow': '#ffb900',   # Amarillo selección
         
         # Colores de texto
         'text_primary': '#ffffff',    # Texto principal
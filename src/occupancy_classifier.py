@@ -0,0 +1,265 @@
+"""
+Clasificador liviano de ocupación (regresión logística en NumPy)
+Reemplaza los umbrales ajustados a mano por pesos aprendidos de frames
+etiquetados: la ocupación de todos los espacios sale de un único producto de
+la matriz N×F de características por el vector de pesos. El entrenamiento es
+offline, con NumPy puro, y los pesos se guardan en un JSON de pocos bytes.
+
+Entrenamiento:
+    python -m src.occupancy_classifier train manifiesto.json pesos.json
+
+El manifiesto indica el layout y, por frame, la ocupación de cada espacio en
+el orden del layout:
+    {"layout": "espacios.json",
+     "frames": [{"image": "frame_001.png", "occupied": [0, 1, 1, 0, ...]}, ...]}
+Las rutas relativas se resuelven desde la carpeta del manifiesto.
+"""
+import json
+import os
+import cv2
+import numpy as np
+from typing import List, Optional, Sequence, Tuple, Union
+from .models import ParkingSpace, OccupancyStatus, FrameOccupancy, BatchOccupancy, AnalysisStats
+from .batch_analysis import Frames, frame_list, map_frames, valid_space_ids
+from .feature_analyzer import FeatureOccupancyAnalyzer, FEATURE_NAMES as BASE_FEATURES
+from .roi_stats import boxes_from_spaces, clip_boxes, roi_areas, roi_nonzero_counts
+from .working_analyzer import WorkingOccupancyAnalyzer
+
+# Características del clasificador: las del analizador por características más
+# la fracción de píxeles activos del preprocesamiento de main.py
+FEATURE_NAMES = BASE_FEATURES + ("foreground",)
+
+def sigmoid(logits: np.ndarray) -> np.ndarray:
+    """Función logística sin desbordes de np.exp con logits grandes"""
+    return 1.0 / (1.0 + np.exp(-np.clip(logits, -500.0, 500.0)))
+
+class LogisticModel:
+    """Pesos de una regresión logística con la estandarización ya incorporada"""
+
+    def __init__(self, weights: Sequence[float], bias: float, threshold: float = 0.5,
+                 feature_names: Sequence[str] = FEATURE_NAMES):
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.bias = float(bias)
+        self.threshold = threshold
+        self.feature_names = tuple(feature_names)
+
+    def decision(self, features: np.ndarray) -> np.ndarray:
+        """Logit de cada fila (N×F → N, T×N×F → T×N) con un solo producto matricial"""
+        return features @ self.weights + self.bias
+
+    def predict_proba(self, features: np.ndarray) -> np.ndarray:
+        """Probabilidad de ocupación"""
+        return sigmoid(self.decision(features))
+
+    def predict(self, features: np.ndarray) -> np.ndarray:
+        return self.predict_proba(features) >= self.threshold
+
+    def to_dict(self) -> dict:
+        return {
+            'feature_names': list(self.feature_names),
+            'weights': [round(float(w), 6) for w in self.weights],
+            'bias': round(self.bias, 6),
+            'threshold': self.threshold,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'LogisticModel':
+        return cls(data['weights'], data['bias'], data.get('threshold', 0.5),
+                   data.get('feature_names', FEATURE_NAMES))
+
+    def save(self, filepath: str) -> bool:
+        """Guarda los pesos en JSON"""
+        try:
+            with open(filepath, 'w', encoding='utf-8') as f:
+                json.dump(self.to_dict(), f, separators=(',', ':'))
+            return True
+        except Exception as e:
+            print(f"Error guardando pesos del clasificador: {e}")
+            return False
+
+    @classmethod
+    def load(cls, filepath: str) -> Optional['LogisticModel']:
+        """Carga pesos desde JSON; None si no existen o no son válidos"""
+        try:
+            with open(filepath, 'r', encoding='utf-8') as f:
+                model = cls.from_dict(json.load(f))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Error cargando pesos del clasificador: {e}")
+            return None
+        if model.feature_names != FEATURE_NAMES or len(model.weights) != len(FEATURE_NAMES):
+            print(f"Pesos incompatibles en {filepath}: características {model.feature_names}")
+            return None
+        return model
+
+def train_logistic(features: np.ndarray, labels: np.ndarray, l2: float = 1e-3,
+                   iterations: int = 2000, learning_rate: float = 0.5) -> LogisticModel:
+    """
+    Entrena una regresión logística por descenso de gradiente (lote completo)
+
+    Args:
+        features: Matriz M×F de ejemplos
+        labels: Vector M de 0/1 (1 = ocupado)
+        l2: Regularización L2 sobre los pesos
+        iterations: Pasos de descenso
+        learning_rate: Tamaño de paso sobre las características estandarizadas
+    """
+    features = np.asarray(features, dtype=np.float64)
+    labels = np.asarray(labels, dtype=np.float64)
+    mean = features.mean(axis=0)
+    scale = features.std(axis=0)
+    scale[scale < 1e-9] = 1.0
+    standardized = (features - mean) / scale
+
+    count = len(labels)
+    weights = np.zeros(features.shape[1])
+    bias = 0.0
+    for _ in range(iterations):
+        probabilities = sigmoid(standardized @ weights + bias)
+        error = probabilities - labels
+        weights -= learning_rate * (standardized.T @ error / count + l2 * weights)
+        bias -= learning_rate * error.mean()
+
+    # Incorporar la estandarización para que la inferencia sea un único producto
+    folded = weights / scale
+    return LogisticModel(folded, bias - float(mean @ folded))
+
+class ClassifierOccupancyAnalyzer:
+    """Analizador que clasifica todos los espacios con un modelo logístico entrenado"""
+
+    def __init__(self, model: Optional[LogisticModel] = None):
+        self.model = model
+        self.feature_analyzer = FeatureOccupancyAnalyzer()
+        self.preprocessor = WorkingOccupancyAnalyzer()
+
+    @classmethod
+    def from_file(cls, filepath: str) -> 'ClassifierOccupancyAnalyzer':
+        """Analizador con los pesos de un archivo (sin modelo si el archivo no existe)"""
+        return cls(LogisticModel.load(filepath))
+
+    def extract_features(self, frame: np.ndarray, spaces: List[ParkingSpace]) -> Tuple[np.ndarray, np.ndarray]:
+        """Matriz N×F con las columnas de FEATURE_NAMES y máscara N de ROI válidas"""
+        base, valid, _ = self.feature_analyzer.extract_features(frame, spaces)
+        processed = self.preprocessor.get_processed_frame(frame)
+        label_map = self.feature_analyzer.layout_labels(spaces, processed.shape)
+        if label_map is not None:
+            # Mismo mapa de etiquetas que las demás características
+            counts, areas = label_map.counts(processed), label_map.areas
+        else:
+            boxes = boxes_from_spaces(spaces)
+            counts, _ = roi_nonzero_counts(processed, boxes)
+            areas = roi_areas(clip_boxes(boxes, processed.shape))  # Como las demás características
+        foreground = counts / np.maximum(areas, 1)
+        return np.column_stack([base, foreground]), valid
+
+    def _require_model(self) -> LogisticModel:
+        if self.model is None:
+            raise RuntimeError("El clasificador no tiene pesos cargados (entrenar con 'train')")
+        return self.model
+
+    def analyze_spaces(self, frame: np.ndarray, spaces: List[ParkingSpace]) -> FrameOccupancy:
+        """
+        Clasifica todos los espacios del frame con un producto matricial
+
+        Returns:
+            Estados de ocupación del frame (confianza = probabilidad de la clase elegida)
+        """
+        model = self._require_model()
+        features, valid = self.extract_features(frame, spaces)
+        probability = model.predict_proba(features[valid])
+        is_occupied = probability >= model.threshold
+        confidence = np.where(is_occupied, probability, 1.0 - probability)
+        return FrameOccupancy(valid_space_ids(spaces, valid), is_occupied, confidence, probability)
+
+    def analyze_batch(self, frames: Frames, spaces: List[ParkingSpace],
+                      workers: Optional[int] = None,
+                      is_batch: Optional[bool] = None) -> BatchOccupancy:
+        """Analiza un lote de frames: características en hilos, una inferencia T×N×F"""
+        model = self._require_model()
+        frames = frame_list(frames, is_batch)
+        if not frames:
+            return BatchOccupancy.empty()
+        # El mapa de etiquetas se construye antes de repartir los frames entre hilos
+        self.feature_analyzer.layout_labels(spaces, frames[0].shape)
+        results = map_frames(lambda frame: self.extract_features(frame, spaces), frames, workers)
+        valid = results[0][1]
+        probability = model.predict_proba(np.stack([features[valid] for features, _ in results]))
+        is_occupied = probability >= model.threshold
+        confidence = np.where(is_occupied, probability, 1.0 - probability)
+        return BatchOccupancy(valid_space_ids(spaces, valid), is_occupied, confidence, probability)
+
+    def calculate_statistics(self, occupancy_results: Union[FrameOccupancy, List[OccupancyStatus]]) -> AnalysisStats:
+        """Calcula estadísticas generales (desde los arreglos si es un FrameOccupancy)"""
+        return AnalysisStats.from_results(occupancy_results)
+
+def load_training_set(manifest_path: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Características y etiquetas de todos los frames de un manifiesto
+
+    Returns:
+        (matriz M×F, vector M de 0/1); solo se incluyen espacios con ROI válida
+    """
+    from .file_manager import FileManager
+
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+
+    spaces = FileManager.auto_load_spaces(os.path.join(base_dir, manifest['layout']))
+    if not spaces:
+        raise ValueError(f"Layout vacío o no encontrado: {manifest['layout']}")
+
+    analyzer = ClassifierOccupancyAnalyzer()
+    all_features, all_labels = [], []
+    for entry in manifest['frames']:
+        frame = cv2.imread(os.path.join(base_dir, entry['image']))
+        if frame is None:
+            print(f"⚠️  No se pudo leer {entry['image']}, se omite")
+            continue
+        labels = np.asarray(entry['occupied'], dtype=np.float64)
+        if len(labels) != len(spaces):
+            print(f"⚠️  {entry['image']}: {len(labels)} etiquetas para {len(spaces)} espacios, se omite")
+            continue
+        features, valid = analyzer.extract_features(frame, spaces)
+        all_features.append(features[valid])
+        all_labels.append(labels[valid])
+
+    if not all_features:
+        raise ValueError("El manifiesto no tiene frames utilizables")
+    return np.concatenate(all_features), np.concatenate(all_labels)
+
+def train_command(manifest_path: str, output_path: str, l2: float = 1e-3, iterations: int = 2000) -> bool:
+    """Entrena desde un manifiesto y guarda los pesos; retorna True si tuvo éxito"""
+    try:
+        features, labels = load_training_set(manifest_path)
+    except Exception as e:
+        print(f"❌ Error cargando datos de entrenamiento: {e}")
+        return False
+
+    model = train_logistic(features, labels, l2=l2, iterations=iterations)
+    accuracy = float(np.mean(model.predict(features) == (labels > 0.5)))
+    print(f"📊 {len(labels)} ejemplos ({int(labels.sum())} ocupados) - exactitud de entrenamiento: {accuracy:.1%}")
+    for name, weight in zip(FEATURE_NAMES, model.weights):
+        print(f"   {name:<10} {weight:+.4f}")
+    print(f"   {'bias':<10} {model.bias:+.4f}")
+
+    if not model.save(output_path):
+        return False
+    print(f"✅ Pesos guardados en {output_path}")
+    return True
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Clasificador de ocupación por regresión logística")
+    commands = parser.add_subparsers(dest="command", required=True)
+    train_parser = commands.add_parser("train", help="Entrena a partir de frames etiquetados")
+    train_parser.add_argument("manifest", help="Manifiesto JSON con el layout y los frames etiquetados")
+    train_parser.add_argument("output", help="Archivo JSON de pesos a generar")
+    train_parser.add_argument("--l2", type=float, default=1e-3, help="Regularización L2")
+    train_parser.add_argument("--iterations", type=int, default=2000, help="Pasos de descenso de gradiente")
+    args = parser.parse_args()
+
+    if args.command == "train":
+        raise SystemExit(0 if train_command(args.manifest, args.output, args.l2, args.iterations) else 1)
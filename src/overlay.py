@@ -0,0 +1,312 @@
+"""
+Capa de overlay precalculada para dibujar espacios sobre los frames
+Los contornos y etiquetas se dibujan una vez por layout y resolución; en cada
+frame solo se redibujan los espacios cuyo estado (o texto) cambió, y la capa
+se compone sobre el frame con una única copia enmascarada. Los bordes
+suavizados del texto (OpenCV 5 siempre usa antialiasing) se mezclan aparte
+usando la cobertura guardada en la máscara.
+
+Las etiquetas que cambian en cada frame (p. ej. el conteo de píxeles) se
+declaran volátiles: no entran en la capa, se copian como sprites de la caché
+directamente sobre el frame tras componer, y la capa solo se redibuja cuando
+cambia el estado de algún espacio.
+"""
+import cv2
+import numpy as np
+from typing import Dict, List, Optional, Sequence, Tuple
+from .models import ParkingSpace
+from .roi_stats import boxes_from_spaces
+from .label_cache import LabelCache, TextDrawer
+
+Color = Tuple[int, int, int]
+
+# Estado especial: el espacio no se dibuja
+HIDDEN = -1
+
+class SpaceOverlay:
+    """Overlay de espacios con recoloreo incremental"""
+
+    def __init__(self, styles: Dict[int, Tuple[Color, int]],
+                 label_color: Optional[Color] = None, label_anchor: str = "top",
+                 label_offset: Tuple[int, int] = (5, 20), font_scale: float = 0.6,
+                 font_thickness: int = 2, text_drawer: Optional[TextDrawer] = None,
+                 text_padding: int = 0, volatile_labels: bool = False):
+        """
+        Args:
+            styles: Estado -> (color BGR, grosor del contorno)
+            label_color: Color de las etiquetas (None usa el color del estado)
+            label_anchor: 'top' mide el offset desde la esquina superior,
+                          'bottom' desde la esquina inferior izquierda
+            label_offset: Desplazamiento (dx, dy) del origen del texto
+            font_scale: Escala de la fuente de cv2.putText
+            font_thickness: Grosor de la fuente
+            text_drawer: Función alternativa para dibujar el texto (p. ej. cvzone)
+            text_padding: Margen extra alrededor del texto para text_drawer
+            volatile_labels: Las etiquetas cambian casi en cada frame: se dibujan sobre
+                             el frame en lugar de guardarse en la capa
+        """
+        self.styles = styles
+        self.label_color = label_color
+        self.label_anchor = label_anchor
+        self.label_offset = label_offset
+        self.font_scale = font_scale
+        self.font_thickness = font_thickness
+        self.text_drawer = text_drawer
+        self.text_padding = text_padding
+        self.volatile_labels = volatile_labels
+        self.redrawn_last = 0
+        # Sprites de etiquetas: cada texto se rasteriza una vez por color
+        self.labels = LabelCache(font_scale, font_thickness, text_drawer=text_drawer,
+                                 text_padding=text_padding)
+
+        self._shape: Optional[Tuple[int, int]] = None
+        self._boxes = np.empty((0, 4), dtype=np.int32)
+        self._polygons: List[Optional[Tuple[Tuple[int, int], ...]]] = []
+        self._states = np.empty(0, dtype=np.int32)
+        self._texts: List[str] = []
+        self._volatile_texts: List[str] = []
+        self._extents = np.empty((0, 4), dtype=np.int32)
+        self._layer: Optional[np.ndarray] = None
+        self._mask: Optional[np.ndarray] = None
+        self._solid: Optional[np.ndarray] = None
+        self._partial_index: Optional[np.ndarray] = None
+        self._partial_alpha: Optional[np.ndarray] = None
+        self._partial_color: Optional[np.ndarray] = None
+        self._inverse: Optional[np.ndarray] = None
+
+    @staticmethod
+    def boxes_from_spaces(spaces: Sequence[ParkingSpace]) -> np.ndarray:
+        """Matriz N×4 (x, y, w, h) de un layout"""
+        return boxes_from_spaces(spaces)
+
+    def set_layout(self, spaces: Sequence[ParkingSpace], frame_shape: Tuple[int, ...]) -> bool:
+        """
+        Define el layout y la resolución; reconstruye la capa solo si cambiaron
+
+        Returns:
+            True si la capa se reconstruyó
+        """
+        boxes = self.boxes_from_spaces(spaces)
+        polygons = [space.polygon for space in spaces]
+        shape = tuple(frame_shape[:2])
+        if shape == self._shape and np.array_equal(boxes, self._boxes) and polygons == self._polygons:
+            return False
+
+        self._shape = shape
+        self._boxes = boxes
+        self._polygons = polygons
+        count = len(boxes)
+        self._states = np.full(count, HIDDEN, dtype=np.int32)
+        self._texts = [""] * count
+        self._volatile_texts = [""] * count
+        self._extents = np.zeros((count, 4), dtype=np.int32)
+        self._layer = np.zeros(shape + (3,), dtype=np.uint8)
+        self._mask = np.zeros(shape, dtype=np.uint8)
+        self._solid = np.zeros(shape, dtype=np.uint8)
+        self._inverse = np.full(shape + (3,), 255, dtype=np.uint8)
+        self._partial_count = 0
+        self._partial_index = None
+        return True
+
+    def _label_origin(self, index: int) -> Tuple[int, int]:
+        x, y, w, h = self._boxes[index].tolist()
+        dx, dy = self.label_offset
+        if self.label_anchor == "bottom":
+            return x + dx, y + h + dy
+        return x + dx, y + dy
+
+    def _compute_extent(self, index: int) -> np.ndarray:
+        """Rectángulo (x0, y0, x1, y1) que cubre todo lo que dibuja un espacio"""
+        state = int(self._states[index])
+        if state == HIDDEN:
+            return np.zeros(4, dtype=np.int32)
+
+        x, y, w, h = self._boxes[index].tolist()
+        pad = self.styles[state][1] + 1
+        x0, y0, x1, y1 = x - pad, y - pad, x + w + pad + 1, y + h + pad + 1
+
+        text = self._texts[index]
+        if text:
+            (text_w, text_h), baseline = cv2.getTextSize(
+                text, cv2.FONT_HERSHEY_SIMPLEX, self.font_scale, self.font_thickness)
+            tx, ty = self._label_origin(index)
+            margin = self.font_thickness + self.text_padding
+            x0 = min(x0, tx - margin)
+            y0 = min(y0, ty - text_h - margin)
+            x1 = max(x1, tx + text_w + margin + 1)
+            y1 = max(y1, ty + baseline + margin + 1)
+
+        height, width = self._shape
+        return np.array([max(0, x0), max(0, y0), min(width, x1), min(height, y1)], dtype=np.int32)
+
+    def _draw_space(self, index: int, layer: np.ndarray, mask: np.ndarray, origin: Tuple[int, int]):
+        """Dibuja un espacio sobre una vista de la capa desplazada por origin"""
+        state = int(self._states[index])
+        if state == HIDDEN:
+            return
+
+        color, thickness = self.styles[state]
+        ox, oy = origin
+        x, y, w, h = self._boxes[index].tolist()
+        polygon = self._polygons[index]
+        if polygon is not None:
+            # Espacio rotado: contorno del polígono (contenido en su rectángulo envolvente)
+            points = [np.array(polygon, dtype=np.int32) - (ox, oy)]
+            cv2.polylines(layer, points, True, color, thickness)
+            cv2.polylines(mask, points, True, 255, thickness)
+        else:
+            pt1, pt2 = (x - ox, y - oy), (x + w - ox, y + h - oy)
+            cv2.rectangle(layer, pt1, pt2, color, thickness)
+            cv2.rectangle(mask, pt1, pt2, 255, thickness)
+
+        text = self._texts[index]
+        if text:
+            tx, ty = self._label_origin(index)
+            org = (tx - ox, ty - oy)
+            self.labels.draw(layer, text, org, self.label_color or color, mask=mask)
+
+    def _redraw_region(self, x0: int, y0: int, x1: int, y1: int):
+        """Limpia una región y redibuja, en orden, los espacios que la tocan"""
+        if x1 <= x0 or y1 <= y0:
+            return
+        layer = self._layer[y0:y1, x0:x1]
+        mask = self._mask[y0:y1, x0:x1]
+        self._partial_count -= self._count_partial(mask)
+        layer[:] = 0
+        mask[:] = 0
+
+        ext = self._extents
+        touching = np.flatnonzero(
+            (ext[:, 0] < x1) & (ext[:, 2] > x0) & (ext[:, 1] < y1) & (ext[:, 3] > y0)
+        )
+        for index in touching.tolist():
+            self._draw_space(index, layer, mask, (x0, y0))
+        np.equal(mask, 255, out=self._solid[y0:y1, x0:x1].view(bool))
+        np.subtract(255, mask[:, :, None], out=self._inverse[y0:y1, x0:x1])
+        self._partial_count += self._count_partial(mask)
+        self._partial_index = None
+
+    @staticmethod
+    def _count_partial(mask: np.ndarray) -> int:
+        """Píxeles con cobertura parcial (bordes suavizados) en una región"""
+        return int(np.count_nonzero(mask)) - int(np.count_nonzero(mask == 255))
+
+    def update(self, states: Sequence[int], texts: Optional[Sequence[str]] = None) -> int:
+        """
+        Actualiza el estado de cada espacio y redibuja solo los que cambiaron
+
+        Args:
+            states: Estado por espacio (clave de styles o HIDDEN)
+            texts: Etiqueta por espacio (opcional)
+
+        Returns:
+            Cantidad de espacios redibujados
+        """
+        if self._layer is None:
+            return 0
+
+        if self.volatile_labels and texts is not None:
+            # Las etiquetas volátiles no forman parte de la capa: no fuerzan redibujados
+            self._volatile_texts = list(texts)
+            texts = None
+
+        new_states = np.asarray(states, dtype=np.int32)
+        new_texts = list(texts) if texts is not None else self._texts
+        changed = np.flatnonzero(new_states != self._states)
+        if texts is not None:
+            text_changed = [i for i, (old, new) in enumerate(zip(self._texts, new_texts)) if old != new]
+            if text_changed:
+                changed = np.union1d(changed, text_changed).astype(np.int64)
+
+        if len(changed) == 0:
+            self.redrawn_last = 0
+            return 0
+
+        old_extents = self._extents[changed].copy()
+        self._states = new_states
+        self._texts = new_texts
+        for index in changed.tolist():
+            self._extents[index] = self._compute_extent(index)
+
+        if len(changed) * 2 > len(self._states):
+            # Cambió la mayoría: es más barato redibujar de una vez el rectángulo
+            # que cubre lo dibujado antes y ahora (no todo el frame)
+            areas = np.concatenate([old_extents, self._extents])
+            areas = areas[(areas[:, 2] > areas[:, 0]) & (areas[:, 3] > areas[:, 1])]
+            if len(areas):
+                self._redraw_region(int(areas[:, 0].min()), int(areas[:, 1].min()),
+                                    int(areas[:, 2].max()), int(areas[:, 3].max()))
+        else:
+            for old, index in zip(old_extents, changed.tolist()):
+                # Unión del área anterior y la nueva (ignorando espacios ocultos)
+                areas = [e for e in (old, self._extents[index]) if e[2] > e[0] and e[3] > e[1]]
+                if areas:
+                    stacked = np.array(areas)
+                    self._redraw_region(int(stacked[:, 0].min()), int(stacked[:, 1].min()),
+                                        int(stacked[:, 2].max()), int(stacked[:, 3].max()))
+
+        self.redrawn_last = len(changed)
+        return self.redrawn_last
+
+    def composite(self, frame: np.ndarray) -> np.ndarray:
+        """Copia la capa sobre el frame (en el lugar) con una sola operación enmascarada"""
+        if self._layer is None or frame.shape[:2] != self._shape:
+            return frame
+
+        # Mezclar todo el frame (frame·(1 - cobertura) + capa, dos operaciones) cuando
+        # hay muchos bordes suavizados (más de ~2% de píxeles, donde la mezcla indexada
+        # es más lenta) o cuando la capa acaba de cambiar y el índice parcial está vencido
+        full_blend = self._partial_count * 50 > self._mask.size or (
+            self._partial_index is None and self.redrawn_last > 0)
+        if full_blend:
+            # Solo dentro del rectángulo que contiene todo lo dibujado
+            ext = self._extents[(self._extents[:, 2] > self._extents[:, 0])]
+            if len(ext):
+                x0, y0 = ext[:, 0].min(), ext[:, 1].min()
+                x1, y1 = ext[:, 2].max(), ext[:, 3].max()
+                roi = frame[y0:y1, x0:x1]
+                cv2.multiply(roi, self._inverse[y0:y1, x0:x1], dst=roi, scale=1 / 255.0)
+                cv2.add(roi, self._layer[y0:y1, x0:x1], dst=roi)
+            return frame
+
+        cv2.copyTo(self._layer, self._solid, frame)
+        if self._partial_index is None:
+            self._update_partial()
+
+        # Píxeles con cobertura parcial (bordes suavizados): la capa está
+        # premultiplicada sobre negro, así que basta con atenuar el frame
+        if len(self._partial_index) and frame.flags['C_CONTIGUOUS']:
+            idx = self._partial_index
+            pixels = frame.reshape(-1, 3)
+            blended = pixels[idx] * self._partial_alpha + self._partial_color
+            pixels[idx] = np.clip(blended + 0.5, 0, 255).astype(np.uint8)
+        return frame
+
+    def _update_partial(self):
+        """Recalcula los píxeles de cobertura parcial tras un redibujado"""
+        coverage = self._mask.reshape(-1)
+        self._partial_index = np.flatnonzero((coverage != 0) & (coverage != 255))
+        alpha = coverage[self._partial_index].astype(np.float32)[:, None] / 255.0
+        self._partial_alpha = 1.0 - alpha
+        self._partial_color = self._layer.reshape(-1, 3)[self._partial_index].astype(np.float32)
+
+    def render(self, frame: np.ndarray, spaces: Sequence[ParkingSpace], states: Sequence[int],
+               texts: Optional[Sequence[str]] = None) -> np.ndarray:
+        """set_layout + update + composite en una llamada"""
+        self.set_layout(spaces, frame.shape)
+        self.update(states, texts)
+        self.composite(frame)
+        if self.volatile_labels:
+            self.draw_volatile_labels(frame)
+        return frame
+
+    def draw_volatile_labels(self, frame: np.ndarray):
+        """Copia las etiquetas volátiles (sprites de la caché) sobre el frame ya compuesto"""
+        if self._layer is None or frame.shape[:2] != self._shape:
+            return
+        for index, text in enumerate(self._volatile_texts):
+            state = int(self._states[index])
+            if not text or state == HIDDEN:
+                continue
+            color = self.label_color or self.styles[state][0]
+            self.labels.draw(frame, text, self._label_origin(index), color)
@@ -0,0 +1,139 @@
+"""
+Pipeline de renderizado de frames sobre un tk.Canvas
+Mantiene en caché el tamaño del canvas y la escala (se recalculan solo en
+<Configure>), redimensiona sobre buffers preasignados y actualiza en el lugar
+un único PhotoImage persistente, sin recrear el ítem de imagen del canvas.
+"""
+import tkinter as tk
+from typing import Optional, Tuple
+import cv2
+import numpy as np
+from PIL import Image, ImageTk
+
+class CanvasRenderer:
+    """Muestra frames BGR en un canvas reutilizando buffers y PhotoImage"""
+
+    def __init__(self, canvas: tk.Canvas, default_size: Tuple[int, int] = (800, 600),
+                 tag: str = "frame"):
+        """
+        Args:
+            canvas: Canvas destino
+            default_size: Tamaño usado mientras el canvas aún no tiene geometría
+            tag: Tag de los ítems creados por el renderer
+        """
+        self.canvas = canvas
+        self.default_size = default_size
+        self.tag = tag
+
+        self.canvas_size: Optional[Tuple[int, int]] = None
+        self.scale = 1.0
+        self.display_size = (0, 0)
+        self.offset = (0, 0)
+        self.frames_rendered = 0
+
+        self._source_shape: Optional[Tuple[int, ...]] = None
+        self._resized: Optional[np.ndarray] = None
+        self._rgb: Optional[np.ndarray] = None
+        self._photo: Optional[ImageTk.PhotoImage] = None
+        self._image_item: Optional[int] = None
+        self._message_item: Optional[int] = None
+
+    def on_configure(self, event):
+        """Actualiza el tamaño en caché (llamar desde el binding <Configure>)"""
+        size = (event.width, event.height)
+        if size != self.canvas_size and event.width > 1 and event.height > 1:
+            self.canvas_size = size
+            # Forzar recálculo de escala y buffers en el próximo frame
+            self._source_shape = None
+
+    def _get_canvas_size(self) -> Tuple[int, int]:
+        if self.canvas_size is None:
+            # Solo antes del primer <Configure>: consultar la geometría una vez
+            width, height = self.canvas.winfo_width(), self.canvas.winfo_height()
+            if width > 1 and height > 1:
+                self.canvas_size = (width, height)
+            else:
+                return self.default_size
+        return self.canvas_size
+
+    def _update_geometry(self, frame: np.ndarray):
+        """Recalcula escala, offsets y buffers cuando cambia el canvas o el frame"""
+        canvas_width, canvas_height = self._get_canvas_size()
+        height, width = frame.shape[:2]
+
+        self.scale = min(canvas_width / width, canvas_height / height)
+        new_size = (max(1, int(width * self.scale)), max(1, int(height * self.scale)))
+        self.offset = ((canvas_width - new_size[0]) // 2, (canvas_height - new_size[1]) // 2)
+        self._source_shape = frame.shape
+
+        if new_size != self.display_size or self._rgb is None:
+            self.display_size = new_size
+            channels_shape = (new_size[1], new_size[0]) + frame.shape[2:]
+            self._resized = np.empty(channels_shape, dtype=np.uint8)
+            self._rgb = np.empty((new_size[1], new_size[0], 3), dtype=np.uint8)
+            # El PhotoImage solo se recrea cuando cambia el tamaño mostrado
+            self._photo = ImageTk.PhotoImage("RGB", new_size)
+            if self._image_item is not None:
+                self.canvas.itemconfigure(self._image_item, image=self._photo)
+
+        if self._image_item is None:
+            self._image_item = self.canvas.create_image(
+                self.offset[0], self.offset[1], image=self._photo, anchor="nw", tags=(self.tag,))
+        else:
+            self.canvas.coords(self._image_item, self.offset[0], self.offset[1])
+
+    def render(self, frame: np.ndarray):
+        """Dibuja un frame BGR (o escala de grises) en el canvas"""
+        if self._source_shape != frame.shape or self._resized is None:
+            self._update_geometry(frame)
+
+        if self._resized.shape[:2] == frame.shape[:2]:
+            resized = frame
+        else:
+            resized = cv2.resize(frame, self.display_size, dst=self._resized)
+
+        if resized.ndim == 2:
+            cv2.cvtColor(resized, cv2.COLOR_GRAY2RGB, dst=self._rgb)
+        else:
+            cv2.cvtColor(resized, cv2.COLOR_BGR2RGB, dst=self._rgb)
+
+        self._photo.paste(Image.fromarray(self._rgb))
+        self._clear_message()
+        self.frames_rendered += 1
+
+    def show_message(self, text: str, color: str = "white"):
+        """Oculta la imagen y muestra un mensaje centrado"""
+        width, height = self._get_canvas_size()
+        if self._image_item is not None:
+            self.canvas.itemconfigure(self._image_item, state="hidden")
+        if self._message_item is None:
+            self._message_item = self.canvas.create_text(
+                width // 2, height // 2, text=text, fill=color,
+                font=("Arial", 12), justify="center", tags=(self.tag,))
+        else:
+            self.canvas.coords(self._message_item, width // 2, height // 2)
+            self.canvas.itemconfigure(self._message_item, text=text, fill=color)
+
+    def _clear_message(self):
+        if self._message_item is not None:
+            self.canvas.delete(self._message_item)
+            self._message_item = None
+            self.canvas.itemconfigure(self._image_item, state="normal")
+
+    def canvas_to_image_coords(self, canvas_x: float, canvas_y: float) -> Tuple[int, int]:
+        """Convierte coordenadas del canvas a coordenadas del frame original"""
+        if self.scale <= 0:
+            return int(canvas_x), int(canvas_y)
+        return (int((canvas_x - self.offset[0]) / self.scale),
+                int((canvas_y - self.offset[1]) / self.scale))
+
+    def reset(self):
+        """Elimina los ítems del canvas y libera los buffers"""
+        self.canvas.delete(self.tag)
+        self._image_item = None
+        self._message_item = None
+        self._photo = None
+        self._resized = None
+        self._rgb = None
+        self._source_shape = None
+        self.display_size = (0, 0)
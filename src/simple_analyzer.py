@@ -4,9 +4,11 @@ Basado en el enfoque directo de threshold simple
 """
 import cv2
 import numpy as np
-from typing import List, Dict, Optional
-from datetime import datetime
-from .models import ParkingSpace, OccupancyStatus, AnalysisStats
+from typing import List, Dict, Optional, Union
+from .models import ParkingSpace, OccupancyStatus, FrameOccupancy, BatchOccupancy, AnalysisStats
+from .batch_analysis import Frames, frame_list, map_frames, to_gray, valid_space_ids
+from .roi_stats import boxes_from_spaces, boxes_in_region, clip_boxes, roi_mean_std, union_box
+from .space_labels import get_label_map, has_polygons
 
 class SimpleOccupancyAnalyzer:
     """Analizador simple y efectivo de ocupación"""
@@ -18,146 +20,137 @@ class SimpleOccupancyAnalyzer:
                       Valores más bajos = más sensible a detectar ocupación
         """
         self.threshold = threshold
+        # Mejora de contraste local reutilizada entre frames
+        self.clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+        # Mapa de etiquetas para layouts con espacios poligonales (se reconstruye al cambiar)
+        self._label_map = None
+    
+    def _mean_std(self, image: np.ndarray, spaces: List[ParkingSpace], with_std: bool = True,
+                  shape: Optional[tuple] = None):
+        """
+        Media y desviación de cada espacio: integral para rectángulos, mapa de
+        etiquetas si el layout tiene polígonos
         
-    def analyze_spaces(self, frame: np.ndarray, spaces: List[ParkingSpace]) -> List[OccupancyStatus]:
+        Args:
+            shape: Forma del frame completo si image ya es el recorte de la unión de los espacios
+        """
+        if has_polygons(spaces):
+            self._label_map = get_label_map(self._label_map, spaces, shape or image.shape)
+            return self._label_map.mean_std(image, with_std, cropped=shape is not None)
+        if shape is not None:
+            corners = clip_boxes(boxes_from_spaces(spaces), shape)
+            return roi_mean_std(image, boxes_in_region(corners, union_box(corners)), with_std)
+        return roi_mean_std(image, boxes_from_spaces(spaces), with_std)
+    
+    def analyze_spaces(self, frame: np.ndarray, spaces: List[ParkingSpace]) -> FrameOccupancy:
         """
         Analiza la ocupación de espacios usando threshold simple
         
+        Las medias de todos los espacios salen de una única imagen integral
+        del frame en escala de grises.
+        
         Args:
             frame: Frame del video/imagen
             spaces: Lista de espacios a analizar
             
         Returns:
-            Lista de estados de ocupación
+            Estados de ocupación del frame (iterable como OccupancyStatus)
         """
-        results = []
-        
         # Convertir a escala de grises para el análisis
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        gray = to_gray(frame)
         
-        for space in spaces:
-            try:
-                # Extraer región de interés (ROI)
-                roi = gray[space.y:space.y + space.height, space.x:space.x + space.width]
-                
-                # Verificar que la ROI sea válida
-                if roi.size == 0:
-                    continue
-                    
-                # Calcular intensidad promedio normalizada
-                mean_intensity = np.mean(roi)
-                normalized_intensity = mean_intensity / 255.0
-                
-                # Determinar ocupación: espacios ocupados tienden a ser más oscuros
-                is_occupied = normalized_intensity < self.threshold
-                
-                # Calcular confianza basada en qué tan lejos está del umbral
-                distance_from_threshold = abs(normalized_intensity - self.threshold)
-                confidence = min(distance_from_threshold * 4, 1.0)  # Escalar a 0-1
-                
-                # Crear resultado
-                space_id = space.id or f"space_{len(results)}"
-                status = OccupancyStatus(
-                    space_id=space_id,
-                    is_occupied=is_occupied,
-                    confidence=confidence,
-                    timestamp=datetime.now().isoformat()
-                )
-                results.append(status)
-                
-            except Exception as e:
-                # En caso de error, marcar como desconocido
-                space_id = space.id or f"space_{len(results)}"
-                status = OccupancyStatus(
-                    space_id=space_id,
-                    is_occupied=False,
-                    confidence=0.0,
-                    timestamp=datetime.now().isoformat()
-                )
-                results.append(status)
-        
-        return results
+        # Intensidad promedio normalizada de cada ROI (se omiten las vacías)
+        means, _, valid = self._mean_std(gray, spaces, with_std=False)
+        intensity = means[valid] / 255.0
+        
+        # Determinar ocupación: espacios ocupados tienden a ser más oscuros
+        is_occupied = intensity < self.threshold
+        
+        # Calcular confianza basada en qué tan lejos está del umbral (escalada a 0-1)
+        confidence = np.minimum(np.abs(intensity - self.threshold) * 4, 1.0)
+        
+        return FrameOccupancy(valid_space_ids(spaces, valid), is_occupied, confidence, intensity)
     
-    def analyze_with_preprocessing(self, frame: np.ndarray, spaces: List[ParkingSpace]) -> List[OccupancyStatus]:
+    def analyze_batch(self, frames: Frames, spaces: List[ParkingSpace],
+                      workers: Optional[int] = None,
+                      is_batch: Optional[bool] = None) -> BatchOccupancy:
         """
-        Análisis con preprocesamiento mejorado para mejor detección
+        Analiza un lote de frames (arreglo apilado T×H×W[×3] o lista) con la misma lógica que analyze_spaces
+        
+        La conversión a gris y la integral de cada frame corren en un pool de
+        hilos; umbral y confianza se calculan sobre la matriz T×N.
+        
+        Args:
+            frames: Frames BGR o en escala de grises, todos del mismo tamaño
+            spaces: Espacios a analizar
+            workers: Hilos para el trabajo por frame (None = núcleos disponibles)
+            is_batch: Cómo leer un arreglo de 3 ejes (ver frame_list)
         """
-        results = []
+        frames = frame_list(frames, is_batch)
+        if not frames:
+            return BatchOccupancy.empty()
+        # El mapa de etiquetas (si hay polígonos) se construye antes de repartir los frames entre hilos
+        self._mean_std(np.zeros(frames[0].shape[:2], dtype=np.uint8), spaces, with_std=False)
         
+        def frame_means(frame: np.ndarray):
+            return self._mean_std(to_gray(frame), spaces, with_std=False)
+        
+        results = map_frames(frame_means, frames, workers)
+        valid = results[0][2]
+        intensity = np.stack([means for means, _, _ in results]).reshape(len(frames), -1)[:, valid] / 255.0
+        
+        # Misma lógica que analyze_spaces, vectorizada sobre frames y espacios
+        is_occupied = intensity < self.threshold
+        confidence = np.minimum(np.abs(intensity - self.threshold) * 4, 1.0)
+        
+        return BatchOccupancy(valid_space_ids(spaces, valid), is_occupied, confidence, intensity)
+    
+    def analyze_with_preprocessing(self, frame: np.ndarray, spaces: List[ParkingSpace]) -> FrameOccupancy:
+        """
+        Análisis con preprocesamiento mejorado para mejor detección
+        
+        CLAHE se aplica una sola vez sobre la región que cubre todos los
+        espacios; media y desviación salen de sus imágenes integrales.
+        """
         # Convertir a escala de grises
         gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
         
         # Aplicar filtro gaussiano para reducir ruido
         blurred = cv2.GaussianBlur(gray, (5, 5), 0)
         
-        for space in spaces:
-            try:
-                # Extraer ROI
-                roi = blurred[space.y:space.y + space.height, space.x:space.x + space.width]
-                
-                if roi.size == 0:
-                    continue
-                
-                # Aplicar mejora de contraste local
-                clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
-                enhanced = clahe.apply(roi)
-                
-                # Calcular estadísticas
-                mean_intensity = np.mean(enhanced)
-                std_intensity = np.std(enhanced)
-                normalized_intensity = mean_intensity / 255.0
-                
-                # Usar tanto media como desviación estándar para mejor detección
-                # Espacios ocupados tienden a tener menos variación (más uniformes)
-                variability_factor = std_intensity / 255.0
-                
-                # Ajustar umbral basado en variabilidad
-                adjusted_threshold = self.threshold + (variability_factor * 0.1)
-                
-                # Determinar ocupación
-                is_occupied = normalized_intensity < adjusted_threshold
-                
-                # Confianza mejorada
-                intensity_confidence = abs(normalized_intensity - adjusted_threshold) * 3
-                variability_confidence = min(float(variability_factor * 2), 1.0)
-                final_confidence = min((intensity_confidence + variability_confidence) / 2, 1.0)
-                
-                space_id = space.id or f"space_{len(results)}"
-                status = OccupancyStatus(
-                    space_id=space_id,
-                    is_occupied=is_occupied,
-                    confidence=final_confidence,
-                    timestamp=datetime.now().isoformat()
-                )
-                results.append(status)
-                
-            except Exception as e:
-                space_id = space.id or f"space_{len(results)}"
-                status = OccupancyStatus(
-                    space_id=space_id,
-                    is_occupied=False,
-                    confidence=0.0,
-                    timestamp=datetime.now().isoformat()
-                )
-                results.append(status)
-        
-        return results
+        # Aplicar mejora de contraste local sobre la unión de los espacios
+        corners = clip_boxes(boxes_from_spaces(spaces), blurred.shape)
+        region = union_box(corners)
+        x0, y0, x1, y1 = region
+        if x1 <= x0 or y1 <= y0:
+            return FrameOccupancy.empty()
+        enhanced = self.clahe.apply(blurred[y0:y1, x0:x1])
+        
+        # Calcular estadísticas (sobre el recorte de la unión de los espacios)
+        means, stds, valid = self._mean_std(enhanced, spaces, shape=blurred.shape)
+        normalized_intensity = means[valid] / 255.0
+        
+        # Usar tanto media como desviación estándar para mejor detección
+        # Espacios ocupados tienden a tener menos variación (más uniformes)
+        variability_factor = stds[valid] / 255.0
+        
+        # Ajustar umbral basado en variabilidad
+        adjusted_threshold = self.threshold + (variability_factor * 0.1)
+        
+        # Determinar ocupación
+        is_occupied = normalized_intensity < adjusted_threshold
+        
+        # Confianza mejorada
+        intensity_confidence = np.abs(normalized_intensity - adjusted_threshold) * 3
+        variability_confidence = np.minimum(variability_factor * 2, 1.0)
+        final_confidence = np.minimum((intensity_confidence + variability_confidence) / 2, 1.0)
+        
+        return FrameOccupancy(valid_space_ids(spaces, valid), is_occupied, final_confidence,
+                              normalized_intensity)
     
-    def calculate_statistics(self, occupancy_results: List[OccupancyStatus]) -> AnalysisStats:
-        """Calcula estadísticas generales"""
-        total_spaces = len(occupancy_results)
-        occupied_spaces = sum(1 for result in occupancy_results if result.is_occupied)
-        free_spaces = total_spaces - occupied_spaces
-        
-        occupancy_rate = (occupied_spaces / total_spaces * 100) if total_spaces > 0 else 0
-        
-        return AnalysisStats(
-            total_spaces=total_spaces,
-            occupied_spaces=occupied_spaces,
-            free_spaces=free_spaces,
-            occupancy_rate=occupancy_rate,
-            timestamp=datetime.now().isoformat()
-        )
+    def calculate_statistics(self, occupancy_results: Union[FrameOccupancy, List[OccupancyStatus]]) -> AnalysisStats:
+        """Calcula estadísticas generales (desde los arreglos si es un FrameOccupancy)"""
+        return AnalysisStats.from_results(occupancy_results)
     
     def set_threshold(self, threshold: float):
         """Actualiza el umbral de detección"""
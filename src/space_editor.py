@@ -7,22 +7,32 @@ import cv2
 import numpy as np
 from typing import List, Optional, Callable, Tuple
 from .models import ParkingSpace
+from .spatial_index import SpaceIndex
 
 class SpaceEditor:
     """Editor visual para espacios de estacionamiento"""
     
-    def __init__(self, parent: tk.Tk, frame: np.ndarray, initial_spaces: List[ParkingSpace]):
+    def __init__(self, parent: tk.Tk, frame: np.ndarray, initial_spaces: List[ParkingSpace],
+                 detector=None):
         self.parent = parent
+        self.detector = detector
         self.frame = frame.copy()
-        self.spaces = initial_spaces.copy() if initial_spaces else []
+        # Copia profunda: cancelar el editor no debe dejar movidos los espacios de quien lo abrió
+        self.spaces = [space.copy() for space in initial_spaces] if initial_spaces else []
         self.callback: Optional[Callable] = None
         
         # Estado del editor
         self.current_mode = "select"  # select, draw, move, resize, delete
         self.selected_space = None
+        self.selected_spaces: List[ParkingSpace] = []
         self.drawing_start = None
         self.drawing_current = None
         self.is_drawing = False
+        self.rubber_band_start = None
+        self.rubber_band_current = None
+        
+        # Índice espacial para la selección por clic y por área
+        self.space_index = SpaceIndex(self.spaces)
         
         # Ventana del editor
         self.window = None
@@ -177,9 +187,10 @@ class SpaceEditor:
         
     def draw_spaces_on_frame(self, frame):
         """Dibuja espacios en el frame"""
+        selected_ids = {id(space) for space in self.get_selection()}
         for i, space in enumerate(self.spaces):
             # Color basado en selección
-            if space == self.selected_space:
+            if id(space) in selected_ids:
                 color = (255, 255, 0)  # Amarillo para seleccionado
                 thickness = 3
             else:
@@ -200,11 +211,34 @@ class SpaceEditor:
         if self.is_drawing and self.drawing_start and self.drawing_current:
             cv2.rectangle(frame, self.drawing_start, self.drawing_current,
                          (255, 0, 0), 2)  # Rojo para el dibujo temporal
+        
+        # Dibujar área de selección múltiple
+        if self.rubber_band_start and self.rubber_band_current:
+            cv2.rectangle(frame, self.rubber_band_start, self.rubber_band_current,
+                         (255, 255, 255), 1)
+    
+    def get_space_index(self) -> SpaceIndex:
+        """Índice espacial sincronizado con la lista de espacios"""
+        self.space_index.ensure(self.spaces)
+        return self.space_index
+    
+    def get_selection(self) -> List[ParkingSpace]:
+        """Espacios seleccionados (selección múltiple o el seleccionado actual)"""
+        if self.selected_spaces:
+            return self.selected_spaces
+        return [self.selected_space] if self.selected_space else []
+    
+    def clear_selection(self):
+        """Quita la selección actual"""
+        self.selected_space = None
+        self.selected_spaces = []
+        self.rubber_band_start = None
+        self.rubber_band_current = None
     
     def on_mode_change(self):
         """Maneja cambio de modo"""
         self.current_mode = self.mode_var.get()
-        self.selected_space = None
+        self.clear_selection()
         
         # Actualizar cursor
         cursors = {
@@ -251,11 +285,16 @@ class SpaceEditor:
             self.handle_draw_drag(int(x), int(y))
         elif self.current_mode == "move" and self.selected_space:
             self.handle_move_drag(int(x), int(y))
+        elif self.current_mode == "select" and self.rubber_band_start:
+            self.rubber_band_current = (int(x), int(y))
+            self.update_display()
     
     def on_canvas_release(self, event):
         """Maneja liberación del mouse"""
         if self.current_mode == "draw" and self.is_drawing:
             self.handle_draw_end()
+        elif self.current_mode == "select" and self.rubber_band_start:
+            self.handle_rubber_band_end()
     
     def on_canvas_motion(self, event):
         """Maneja movimiento del mouse"""
@@ -269,20 +308,34 @@ class SpaceEditor:
     
     def handle_select_click(self, x, y):
         """Maneja selección de espacios"""
-        selected = None
-        for space in self.spaces:
-            if space.contains_point(x, y):
-                selected = space
-                break
+        selected = self.get_space_index().space_at(x, y)
         
+        self.clear_selection()
         self.selected_space = selected
         if selected:
             self.info_var.set(f"Seleccionado: {selected.id or 'Sin ID'}")
         else:
             self.info_var.set("Ningún espacio seleccionado")
+            if self.current_mode == "select":
+                # Clic en zona vacía: iniciar selección por área
+                self.rubber_band_start = (x, y)
         
         self.update_display()
     
+    def handle_rubber_band_end(self):
+        """Selecciona los espacios contenidos en el área arrastrada"""
+        if self.rubber_band_current:
+            x0, y0 = self.rubber_band_start
+            x1, y1 = self.rubber_band_current
+            self.selected_spaces = self.get_space_index().spaces_in_rect(
+                x0, y0, x1, y1, contained=True)
+            self.selected_space = self.selected_spaces[0] if self.selected_spaces else None
+            self.info_var.set(f"Seleccionados: {len(self.selected_spaces)} espacios")
+        
+        self.rubber_band_start = None
+        self.rubber_band_current = None
+        self.update_display()
+    
     def handle_draw_start(self, x, y):
         """Inicia dibujo de nuevo espacio"""
         self.drawing_start = (x, y)
@@ -310,7 +363,9 @@ class SpaceEditor:
             if w > 10 and h > 10:
                 space_id = f"NEW_{len(self.spaces):03d}"
                 new_space = ParkingSpace(x, y, w, h, id=space_id)
+                space_index = self.get_space_index()
                 self.spaces.append(new_space)
+                space_index.add(new_space)
                 self.info_var.set(f"Espacio creado: {space_id}")
             
         self.is_drawing = False
@@ -321,6 +376,8 @@ class SpaceEditor:
     def handle_move_click(self, x, y):
         """Maneja click para mover"""
         self.handle_select_click(x, y)
+        if self.selected_space:
+            self.drawing_start = (x, y)
     
     def handle_move_drag(self, x, y):
         """Maneja arrastre para mover"""
@@ -328,8 +385,8 @@ class SpaceEditor:
             dx = x - self.drawing_start[0]
             dy = y - self.drawing_start[1]
             
-            self.selected_space.x += dx
-            self.selected_space.y += dy
+            self.selected_space.translate(dx, dy)
+            self.get_space_index().move(self.selected_space)
             
             self.drawing_start = (x, y)
             self.update_display()
@@ -342,28 +399,32 @@ class SpaceEditor:
     
     def handle_delete_click(self, x, y):
         """Maneja click para eliminar"""
-        to_remove = None
-        for space in self.spaces:
-            if space.contains_point(x, y):
-                to_remove = space
-                break
+        space_index = self.get_space_index()
+        to_remove = space_index.space_at(x, y)
         
         if to_remove:
-            self.spaces.remove(to_remove)
+            # Eliminar por identidad (dos espacios pueden ser iguales por valor)
+            self.spaces[:] = [space for space in self.spaces if space is not to_remove]
+            space_index.remove(to_remove)
+            self.clear_selection()
             self.info_var.set(f"Espacio eliminado")
             self.update_display()
     
     def auto_detect(self):
         """Detección automática de espacios"""
-        from .detector import SmartDetector
-        detector = SmartDetector()
+        detector = self.detector
+        if detector is None:
+            from .detector import SmartDetector
+            detector = SmartDetector()
         detected_spaces = detector.detect_spaces_combined(self.frame)
         
         if detected_spaces:
             # Agregar espacios detectados
+            space_index = self.get_space_index()
             for space in detected_spaces:
                 space.id = f"AUTO_{len(self.spaces):03d}"
                 self.spaces.append(space)
+                space_index.add(space)
             
             self.info_var.set(f"Detectados {len(detected_spaces)} espacios")
             self.update_display()
@@ -374,7 +435,7 @@ class SpaceEditor:
         """Limpia todos los espacios"""
         if messagebox.askyesno("Confirmar", "¿Eliminar todos los espacios?"):
             self.spaces.clear()
-            self.selected_space = None
+            self.clear_selection()
             self.info_var.set("Todos los espacios eliminados")
             self.update_display()
     
@@ -0,0 +1,150 @@
+"""
+Mapa de etiquetas por píxel para espacios poligonales o rotados
+Cada píxel de la región que cubre el layout guarda el índice (1..N) del
+espacio al que pertenece (0 = ningún espacio). El mapa se rasteriza una vez
+por layout y resolución; luego el conteo de píxeles activos, o la suma de
+cualquier imagen, de todos los espacios sale de una sola pasada de
+np.bincount, con el mismo costo para polígonos arbitrarios que para
+rectángulos.
+
+Los píxeles cubiertos por más de un espacio se resuelven explícitamente
+según la política de solapamiento:
+    "exclude"  no cuentan para ningún espacio (por defecto)
+    "first"    pertenecen al primer espacio del layout que los cubre
+    "last"     pertenecen al último
+"""
+from typing import List, Optional, Sequence, Tuple
+import cv2
+import numpy as np
+from .models import ParkingSpace
+from .roi_stats import boxes_from_spaces, clip_boxes, union_box
+
+OVERLAP_POLICIES = ("exclude", "first", "last")
+
+def layout_key(spaces: Sequence[ParkingSpace], shape: Tuple[int, ...]) -> tuple:
+    """Clave que identifica un layout y una resolución (para reutilizar el mapa)"""
+    return (tuple(shape[:2]),
+            tuple((s.x, s.y, s.width, s.height, s.polygon) for s in spaces))
+
+def has_polygons(spaces: Sequence[ParkingSpace]) -> bool:
+    """Verifica si algún espacio del layout es poligonal"""
+    return any(space.polygon is not None for space in spaces)
+
+class SpaceLabelMap:
+    """Imagen de etiquetas de un layout para conteos por espacio con bincount"""
+
+    def __init__(self, spaces: Sequence[ParkingSpace], shape: Tuple[int, ...],
+                 overlap: str = "exclude"):
+        """
+        Args:
+            spaces: Layout (rectángulos y/o polígonos)
+            shape: Forma del frame (alto, ancho[, canales])
+            overlap: Política para píxeles de varios espacios (ver OVERLAP_POLICIES)
+        """
+        if overlap not in OVERLAP_POLICIES:
+            raise ValueError(f"Política de solapamiento desconocida: {overlap} "
+                             f"(opciones: {', '.join(OVERLAP_POLICIES)})")
+        self.key = layout_key(spaces, shape)
+        self.overlap = overlap
+        self.count = len(spaces)
+
+        corners = clip_boxes(boxes_from_spaces(spaces), shape)
+        self.region = union_box(corners)
+        x0, y0, x1, y1 = self.region
+        self.labels = np.zeros((max(0, y1 - y0), max(0, x1 - x0)), dtype=np.int32)
+        # Píxeles que cada espacio comparte con otros (descartados o cedidos)
+        self.overlap_pixels = np.zeros(self.count, dtype=np.int64)
+        if self.labels.size:
+            self._rasterize(spaces, corners)
+
+        self._flat = self.labels.ravel()
+        self.areas = np.bincount(self._flat, minlength=self.count + 1)[1:]
+        self.valid = self.areas > 0
+
+    def _space_mask(self, space: ParkingSpace, box: np.ndarray) -> np.ndarray:
+        """Máscara uint8 (0/1) del espacio dentro de su rectángulo recortado (coordenadas del frame)"""
+        bx0, by0, bx1, by1 = box.tolist()
+        mask = np.zeros((by1 - by0, bx1 - bx0), dtype=np.uint8)
+        if space.polygon is None:
+            mask.fill(1)
+        else:
+            points = np.array(space.polygon, dtype=np.int32) - (bx0, by0)
+            cv2.fillPoly(mask, [points], 1)
+        return mask
+
+    def _rasterize(self, spaces: Sequence[ParkingSpace], corners: np.ndarray):
+        x0, y0 = self.region[0], self.region[1]
+        local = corners - (x0, y0, x0, y0)
+        coverage = np.zeros(self.labels.shape, dtype=np.uint16)
+        masks: List[Optional[np.ndarray]] = []
+        for space, box, absolute in zip(spaces, local, corners):
+            if box[2] <= box[0] or box[3] <= box[1]:
+                masks.append(None)
+                continue
+            mask = self._space_mask(space, absolute)
+            coverage[box[1]:box[3], box[0]:box[2]] += mask
+            masks.append(mask)
+
+        # "first": se pinta en orden inverso para que gane el primer espacio
+        order = range(self.count - 1, -1, -1) if self.overlap == "first" else range(self.count)
+        for index in order:
+            mask = masks[index]
+            if mask is None:
+                continue
+            bx0, by0, bx1, by1 = local[index].tolist()
+            view = self.labels[by0:by1, bx0:bx1]
+            shared = (coverage[by0:by1, bx0:bx1] > 1) & (mask != 0)
+            self.overlap_pixels[index] = np.count_nonzero(shared)
+            view[mask != 0] = index + 1
+
+        if self.overlap == "exclude":
+            self.labels[coverage > 1] = 0
+
+    def matches(self, spaces: Sequence[ParkingSpace], shape: Tuple[int, ...]) -> bool:
+        """Verifica si el mapa corresponde a este layout y resolución"""
+        return self.key == layout_key(spaces, shape)
+
+    def _crop(self, image: np.ndarray, cropped: bool = False) -> np.ndarray:
+        """Recorte de la imagen a la región del mapa (cropped=True si ya lo está)"""
+        if cropped:
+            return image
+        x0, y0, x1, y1 = self.region
+        return image[y0:y1, x0:x1]
+
+    def counts(self, mask: np.ndarray, cropped: bool = False) -> np.ndarray:
+        """Píxeles distintos de cero de cada espacio (equivale a countNonZero por polígono)"""
+        active = self._flat[self._crop(mask, cropped).ravel() != 0]
+        return np.bincount(active, minlength=self.count + 1)[1:]
+
+    def sums(self, image: np.ndarray, cropped: bool = False) -> np.ndarray:
+        """Suma de los valores de un canal dentro de cada espacio"""
+        weights = self._crop(image, cropped).ravel()
+        return np.bincount(self._flat, weights=weights, minlength=self.count + 1)[1:]
+
+    def means(self, image: np.ndarray, cropped: bool = False) -> np.ndarray:
+        """Media de un canal dentro de cada espacio (0 en espacios vacíos)"""
+        return self.sums(image, cropped) / np.maximum(self.areas, 1)
+
+    def mean_std(self, image: np.ndarray, with_std: bool = True,
+                 cropped: bool = False) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Media y desviación estándar (poblacional) de cada espacio
+
+        Misma salida que roi_stats.roi_mean_std: (medias N, desviaciones N o
+        ceros, máscara N de espacios con área no vacía).
+        """
+        region = self._crop(image, cropped).astype(np.float64)
+        counts = np.maximum(self.areas, 1)
+        means = self.sums(region, cropped=True) / counts
+        stds = np.zeros(self.count)
+        if with_std:
+            squares = self.sums(region * region, cropped=True) / counts
+            stds = np.sqrt(np.maximum(squares - means * means, 0.0))
+        return means, stds, self.valid
+
+def get_label_map(current: Optional[SpaceLabelMap], spaces: Sequence[ParkingSpace],
+                  shape: Tuple[int, ...], overlap: str = "exclude") -> SpaceLabelMap:
+    """Reutiliza el mapa actual si corresponde al layout; si no, lo reconstruye"""
+    if current is not None and current.overlap == overlap and current.matches(spaces, shape):
+        return current
+    return SpaceLabelMap(spaces, shape, overlap)
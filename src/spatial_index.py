@@ -0,0 +1,234 @@
+"""
+Índice espacial para consultas de punto y rectángulo sobre espacios
+Grilla uniforme de buckets con inserción, movimiento y borrado incrementales,
+de modo que la selección en los editores no recorra todos los espacios.
+"""
+from typing import Dict, Hashable, Iterable, List, Optional, Sequence, Set, Tuple
+from .models import ParkingSpace
+
+Rect = Tuple[int, int, int, int]  # x, y, ancho, alto
+Cell = Tuple[int, int]
+
+class SpatialIndex:
+    """Grilla uniforme de rectángulos con claves arbitrarias"""
+
+    def __init__(self, cell_size: int = 128):
+        """
+        Args:
+            cell_size: Lado de cada celda de la grilla en píxeles
+        """
+        self.cell_size = max(1, int(cell_size))
+        self._rects: Dict[Hashable, Rect] = {}
+        self._order: Dict[Hashable, int] = {}
+        self._cells: Dict[Cell, Set[Hashable]] = {}
+        self._sequence = 0
+
+    def __len__(self) -> int:
+        return len(self._rects)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._rects
+
+    def _cell_range(self, x: int, y: int, w: int, h: int) -> Tuple[int, int, int, int]:
+        size = self.cell_size
+        return x // size, y // size, (x + w) // size, (y + h) // size
+
+    def _add_to_cells(self, key: Hashable, cell_range: Tuple[int, int, int, int]):
+        cx0, cy0, cx1, cy1 = cell_range
+        for cx in range(cx0, cx1 + 1):
+            for cy in range(cy0, cy1 + 1):
+                self._cells.setdefault((cx, cy), set()).add(key)
+
+    def _remove_from_cells(self, key: Hashable, cell_range: Tuple[int, int, int, int]):
+        cx0, cy0, cx1, cy1 = cell_range
+        for cx in range(cx0, cx1 + 1):
+            for cy in range(cy0, cy1 + 1):
+                bucket = self._cells.get((cx, cy))
+                if bucket is not None:
+                    bucket.discard(key)
+                    if not bucket:
+                        del self._cells[(cx, cy)]
+
+    def insert(self, key: Hashable, x: int, y: int, w: int, h: int):
+        """Agrega un rectángulo (o lo reemplaza si la clave ya existe)"""
+        if key in self._rects:
+            self.move(key, x, y, w, h)
+            return
+        rect = (int(x), int(y), int(w), int(h))
+        self._rects[key] = rect
+        self._order[key] = self._sequence
+        self._sequence += 1
+        self._add_to_cells(key, self._cell_range(*rect))
+
+    def remove(self, key: Hashable) -> bool:
+        """Elimina un rectángulo; retorna False si no existía"""
+        rect = self._rects.pop(key, None)
+        if rect is None:
+            return False
+        del self._order[key]
+        self._remove_from_cells(key, self._cell_range(*rect))
+        return True
+
+    def move(self, key: Hashable, x: int, y: int, w: int, h: int):
+        """Actualiza la geometría de un rectángulo conservando su orden"""
+        old = self._rects.get(key)
+        if old is None:
+            self.insert(key, x, y, w, h)
+            return
+        rect = (int(x), int(y), int(w), int(h))
+        self._rects[key] = rect
+        old_range, new_range = self._cell_range(*old), self._cell_range(*rect)
+        if old_range != new_range:
+            self._remove_from_cells(key, old_range)
+            self._add_to_cells(key, new_range)
+
+    def clear(self):
+        """Vacía el índice"""
+        self._rects.clear()
+        self._order.clear()
+        self._cells.clear()
+        self._sequence = 0
+
+    def bounds(self, key: Hashable) -> Optional[Rect]:
+        """Rectángulo indexado para una clave"""
+        return self._rects.get(key)
+
+    def _sorted(self, keys: Iterable[Hashable]) -> List[Hashable]:
+        """Ordena por orden de inserción (el mismo que tendría un recorrido lineal)"""
+        return sorted(keys, key=self._order.__getitem__)
+
+    def query_point(self, x: float, y: float) -> List[Hashable]:
+        """Claves cuyos rectángulos contienen el punto (bordes incluidos)"""
+        size = self.cell_size
+        bucket = self._cells.get((int(x // size), int(y // size)))
+        if not bucket:
+            return []
+        hits = []
+        for key in bucket:
+            rx, ry, rw, rh = self._rects[key]
+            if rx <= x <= rx + rw and ry <= y <= ry + rh:
+                hits.append(key)
+        return self._sorted(hits)
+
+    def query_rect(self, x0: float, y0: float, x1: float, y1: float,
+                   contained: bool = False) -> List[Hashable]:
+        """
+        Claves cuyos rectángulos intersectan (o están contenidos en) un área
+
+        Args:
+            x0, y0, x1, y1: Esquinas del área (en cualquier orden)
+            contained: Solo rectángulos completamente dentro del área
+        """
+        x0, x1 = min(x0, x1), max(x0, x1)
+        y0, y1 = min(y0, y1), max(y0, y1)
+        size = self.cell_size
+        cx0, cy0, cx1, cy1 = int(x0 // size), int(y0 // size), int(x1 // size), int(y1 // size)
+
+        candidates: Set[Hashable] = set()
+        if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > len(self._cells):
+            # Área grande: recorrer solo las celdas ocupadas
+            for (cx, cy), bucket in self._cells.items():
+                if cx0 <= cx <= cx1 and cy0 <= cy <= cy1:
+                    candidates.update(bucket)
+        else:
+            for cx in range(cx0, cx1 + 1):
+                for cy in range(cy0, cy1 + 1):
+                    bucket = self._cells.get((cx, cy))
+                    if bucket:
+                        candidates.update(bucket)
+
+        hits = []
+        for key in candidates:
+            rx, ry, rw, rh = self._rects[key]
+            if contained:
+                if x0 <= rx and rx + rw <= x1 and y0 <= ry and ry + rh <= y1:
+                    hits.append(key)
+            elif rx <= x1 and x0 <= rx + rw and ry <= y1 and y0 <= ry + rh:
+                hits.append(key)
+        return self._sorted(hits)
+
+def suggest_cell_size(sizes: Sequence[Tuple[int, int]], default: int = 128) -> int:
+    """Tamaño de celda a partir de la mediana del lado mayor de los espacios"""
+    if not sizes:
+        return default
+    longest = sorted(max(w, h) for w, h in sizes)
+    return max(16, min(1024, 2 * longest[len(longest) // 2]))
+
+class SpaceIndex:
+    """Índice espacial sincronizado con una lista de ParkingSpace"""
+
+    def __init__(self, spaces: Optional[List[ParkingSpace]] = None, cell_size: Optional[int] = None):
+        """
+        Args:
+            spaces: Lista de espacios a indexar
+            cell_size: Tamaño de celda fijo (None lo estima del layout)
+        """
+        self.fixed_cell_size = cell_size
+        self._index = SpatialIndex(cell_size or 128)
+        self._spaces: Dict[int, ParkingSpace] = {}
+        self._source: Optional[List[ParkingSpace]] = None
+        self._source_len = 0
+        if spaces is not None:
+            self.rebuild(spaces)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def rebuild(self, spaces: List[ParkingSpace]):
+        """Reconstruye el índice completo a partir de la lista"""
+        cell_size = self.fixed_cell_size or suggest_cell_size([(s.width, s.height) for s in spaces])
+        self._index = SpatialIndex(cell_size)
+        self._spaces = {}
+        for space in spaces:
+            self._spaces[id(space)] = space
+            self._index.insert(id(space), space.x, space.y, space.width, space.height)
+        self._source = spaces
+        self._source_len = len(spaces)
+
+    def ensure(self, spaces: List[ParkingSpace]):
+        """Reconstruye si la lista fue reemplazada o cambió de tamaño sin notificar al índice"""
+        if spaces is not self._source or len(spaces) != self._source_len:
+            self.rebuild(spaces)
+
+    def invalidate(self):
+        """Fuerza la reconstrucción en el próximo ensure (tras cambios estructurales)"""
+        self._source = None
+
+    def add(self, space: ParkingSpace):
+        """Registra un espacio agregado al final de la lista"""
+        if id(space) in self._spaces:
+            self.move(space)
+            return
+        self._spaces[id(space)] = space
+        self._index.insert(id(space), space.x, space.y, space.width, space.height)
+        self._source_len += 1
+
+    def remove(self, space: ParkingSpace):
+        """Registra un espacio eliminado de la lista"""
+        if self._index.remove(id(space)):
+            del self._spaces[id(space)]
+            self._source_len -= 1
+
+    def move(self, space: ParkingSpace):
+        """Actualiza la geometría indexada de un espacio movido o redimensionado"""
+        if id(space) in self._spaces:
+            self._index.move(id(space), space.x, space.y, space.width, space.height)
+
+    def spaces_at(self, x: float, y: float) -> List[ParkingSpace]:
+        """Espacios que contienen el punto, en el orden de la lista"""
+        # La grilla filtra por rectángulo; contains_point descarta las esquinas de los polígonos
+        candidates = (self._spaces[key] for key in self._index.query_point(x, y))
+        return [space for space in candidates if space.contains_point(x, y)]
+
+    def space_at(self, x: float, y: float) -> Optional[ParkingSpace]:
+        """Primer espacio que contiene el punto (mismo resultado que un recorrido lineal)"""
+        for key in self._index.query_point(x, y):
+            space = self._spaces[key]
+            if space.contains_point(x, y):
+                return space
+        return None
+
+    def spaces_in_rect(self, x0: float, y0: float, x1: float, y1: float,
+                       contained: bool = False) -> List[ParkingSpace]:
+        """Espacios que intersectan (o están contenidos en) un área"""
+        return [self._spaces[key] for key in self._index.query_rect(x0, y0, x1, y1, contained)]
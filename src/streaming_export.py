@@ -0,0 +1,226 @@
+"""
+Exportadores en streaming para CSV y JSONL
+Aceptan registros de forma incremental (o desde cualquier iterador/generador),
+acumulan las escrituras en bloques y vacían el buffer por tamaño o por tiempo,
+de modo que un análisis largo puede exportarse mientras ocurre con memoria constante.
+"""
+import csv
+import io
+import os
+import gzip
+import json
+import lzma
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+from .models import OccupancyStatus, AnalysisStats
+
+# Compresiones soportadas por la librería estándar
+COMPRESSION_EXTENSIONS = {
+    '.gz': 'gzip',
+    '.xz': 'lzma',
+    '.lzma': 'lzma',
+}
+
+def detect_compression(filepath: str) -> Optional[str]:
+    """Deduce la compresión a partir de la extensión del archivo"""
+    lower = filepath.lower()
+    for ext, compression in COMPRESSION_EXTENSIONS.items():
+        if lower.endswith(ext):
+            return compression
+    return None
+
+def open_text_output(filepath: str, compression: Optional[str] = None, append: bool = False):
+    """Abre un archivo de texto para escritura, opcionalmente comprimido"""
+    mode = 'at' if append else 'wt'
+    if compression == 'gzip':
+        return gzip.open(filepath, mode, encoding='utf-8', newline='')
+    if compression == 'lzma':
+        return lzma.open(filepath, mode, encoding='utf-8', newline='')
+    if compression is not None:
+        raise ValueError(f"Compresión no soportada: {compression}")
+    return open(filepath, mode[0], encoding='utf-8', newline='')
+
+class StreamingExporter(ABC):
+    """Base de los exportadores en streaming"""
+
+    def __init__(self, filepath: str, chunk_size: int = 500, flush_interval: float = 5.0,
+                 compression: Optional[str] = "auto", append: bool = False):
+        """
+        Args:
+            filepath: Archivo de salida
+            chunk_size: Registros acumulados antes de escribir al archivo
+            flush_interval: Segundos máximos que un registro espera en el buffer
+                            (0 o None desactiva el vaciado por tiempo)
+            compression: 'gzip', 'lzma', None o 'auto' (según extensión)
+            append: Agrega al final del archivo en lugar de sobrescribirlo
+        """
+        self.filepath = filepath
+        self.chunk_size = max(1, chunk_size)
+        self.flush_interval = flush_interval
+        self.compression = detect_compression(filepath) if compression == "auto" else compression
+        self.records_written = 0
+
+        self._buffer: List[str] = []
+        self._lock = threading.Lock()
+        self._closed = False
+        has_content = append and os.path.exists(filepath) and os.path.getsize(filepath) > 0
+        self._file = open_text_output(filepath, self.compression, append=append)
+        self._write_preamble(has_content)
+
+        self._timer_stop = threading.Event()
+        self._timer_thread = None
+        if flush_interval:
+            self._timer_thread = threading.Thread(target=self._timer_loop, daemon=True)
+            self._timer_thread.start()
+
+    def _write_preamble(self, has_content: bool):
+        """Escribe encabezados si el formato los requiere"""
+        pass
+
+    @abstractmethod
+    def _format_record(self, record: Any) -> str:
+        """Convierte un registro en una o más líneas de texto"""
+
+    def _timer_loop(self):
+        """Vacía el buffer periódicamente aunque no se alcance chunk_size"""
+        while not self._timer_stop.wait(self.flush_interval):
+            self.flush()
+
+    def write(self, record: Any):
+        """Agrega un registro al exportador"""
+        line = self._format_record(record)
+        with self._lock:
+            if self._closed:
+                raise ValueError("El exportador está cerrado")
+            self._buffer.append(line)
+            self.records_written += 1
+            if len(self._buffer) >= self.chunk_size:
+                self._flush_locked()
+
+    def write_all(self, records: Iterable[Any]) -> int:
+        """Consume un iterador o generador completo y retorna cuántos registros escribió"""
+        count = 0
+        for record in records:
+            self.write(record)
+            count += 1
+        return count
+
+    def _flush_locked(self):
+        if self._buffer:
+            self._file.write("".join(self._buffer))
+            self._buffer.clear()
+        self._file.flush()
+
+    def flush(self):
+        """Escribe al archivo los registros pendientes"""
+        with self._lock:
+            if not self._closed:
+                self._flush_locked()
+
+    def close(self):
+        """Vacía el buffer y cierra el archivo"""
+        self._timer_stop.set()
+        with self._lock:
+            if self._closed:
+                return
+            self._flush_locked()
+            self._file.close()
+            self._closed = True
+        if self._timer_thread and self._timer_thread is not threading.current_thread():
+            self._timer_thread.join(timeout=1.0)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+class CSVStreamExporter(StreamingExporter):
+    """Exportador CSV en streaming"""
+
+    def __init__(self, filepath: str, header: Optional[Sequence[str]] = None,
+                 row_builder: Optional[Callable[[Any], Sequence[Any]]] = None, **kwargs):
+        """
+        Args:
+            header: Encabezados de columnas (opcional)
+            row_builder: Función que convierte un registro en una fila;
+                         por defecto el registro ya es una secuencia
+        """
+        self.header = list(header) if header else None
+        self.row_builder = row_builder
+        self._line_buffer = io.StringIO()
+        self._csv_writer = csv.writer(self._line_buffer)
+        super().__init__(filepath, **kwargs)
+
+    def _write_preamble(self, has_content: bool):
+        if self.header and not has_content:
+            self._file.write(self._to_line(self.header))
+
+    def _to_line(self, row: Sequence[Any]) -> str:
+        self._line_buffer.seek(0)
+        self._line_buffer.truncate()
+        self._csv_writer.writerow(row)
+        return self._line_buffer.getvalue()
+
+    def _format_record(self, record: Any) -> str:
+        row = self.row_builder(record) if self.row_builder else record
+        with self._lock:
+            return self._to_line(row)
+
+class JSONLStreamExporter(StreamingExporter):
+    """Exportador JSON Lines en streaming (un objeto JSON por línea)"""
+
+    def __init__(self, filepath: str, record_builder: Optional[Callable[[Any], Dict[str, Any]]] = None,
+                 **kwargs):
+        """
+        Args:
+            record_builder: Función que convierte un registro en diccionario;
+                            por defecto usa to_dict() si existe
+        """
+        self.record_builder = record_builder
+        super().__init__(filepath, **kwargs)
+
+    def _format_record(self, record: Any) -> str:
+        if self.record_builder:
+            data = self.record_builder(record)
+        elif hasattr(record, 'to_dict'):
+            data = record.to_dict()
+        else:
+            data = record
+        return json.dumps(data, ensure_ascii=False) + "\n"
+
+# Formatos de fila usados por FileManager
+ANALYSIS_CSV_HEADER = [
+    'Timestamp', 'Total_Spaces', 'Occupied_Spaces',
+    'Free_Spaces', 'Occupancy_Rate', 'Availability_Rate'
+]
+
+OCCUPANCY_CSV_HEADER = ['Timestamp', 'Space_ID', 'Is_Occupied', 'Confidence']
+
+def analysis_stats_row(stats: AnalysisStats) -> List[Any]:
+    """Fila CSV de unas estadísticas de análisis"""
+    return [
+        stats.timestamp,
+        stats.total_spaces,
+        stats.occupied_spaces,
+        stats.free_spaces,
+        f"{stats.occupancy_rate:.2f}",
+        f"{stats.availability_rate:.2f}"
+    ]
+
+def occupancy_status_row(status: OccupancyStatus) -> List[Any]:
+    """Fila CSV de un estado de ocupación"""
+    return [
+        status.timestamp,
+        status.space_id,
+        'Yes' if status.is_occupied else 'No',
+        f"{status.confidence:.3f}"
+    ]
+
+def iter_statuses(occupancy_history: Iterable[Iterable[OccupancyStatus]]) -> Iterable[OccupancyStatus]:
+    """Aplana un historial de frames en estados individuales sin materializarlo"""
+    for frame_results in occupancy_history:
+        for status in frame_results:
+            yield status
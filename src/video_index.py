@@ -0,0 +1,177 @@
+"""
+Índice de keyframes y caché de frames decodificados para video grabado
+cap.set(CAP_PROP_POS_FRAMES, n) es lento y a veces impreciso en archivos
+H.264 largos. Una pasada única de indexado (solo demultiplexado, sin
+decodificar) registra la posición y el timestamp de cada keyframe en un
+archivo auxiliar junto al video; los saltos se hacen al keyframe anterior y
+se decodifica hacia adelante hasta el frame pedido. Los frames decodificados
+alrededor del cursor se guardan en una caché LRU para que avanzar, retroceder
+y recorrer el video sea inmediato.
+"""
+import json
+import os
+from collections import OrderedDict
+from typing import Optional, Tuple
+import cv2
+import numpy as np
+
+INDEX_VERSION = 1
+INDEX_SUFFIX = ".keyframes.json"
+
+def index_path(video_path: str) -> str:
+    """Ruta del archivo auxiliar con el índice de un video"""
+    return video_path + INDEX_SUFFIX
+
+def _source_signature(video_path: str) -> Tuple[int, int]:
+    stat = os.stat(video_path)
+    return stat.st_size, int(stat.st_mtime)
+
+class KeyframeIndex:
+    """Posiciones (número de frame) y timestamps (ms) de los keyframes de un video"""
+
+    def __init__(self, keyframes, timestamps, frame_count: int, fps: float,
+                 has_keyframe_info: bool = True, source: Tuple[int, int] = (0, 0)):
+        self.keyframes = np.asarray(keyframes, dtype=np.int64)
+        self.timestamps = np.asarray(timestamps, dtype=np.float64)
+        self.frame_count = int(frame_count)
+        self.fps = float(fps)
+        # False si el backend no informa keyframes (los saltos usan cap.set directamente)
+        self.has_keyframe_info = has_keyframe_info
+        self.source = tuple(source)
+
+    def __len__(self) -> int:
+        return len(self.keyframes)
+
+    def keyframe_before(self, frame_number: int) -> int:
+        """Keyframe más cercano en o antes de frame_number (0 si no hay ninguno)"""
+        position = int(np.searchsorted(self.keyframes, frame_number, side='right')) - 1
+        return int(self.keyframes[position]) if position >= 0 else 0
+
+    @classmethod
+    def build(cls, video_path: str) -> Optional['KeyframeIndex']:
+        """
+        Indexa un video en una pasada
+
+        Con el backend FFmpeg se leen paquetes sin decodificar
+        (CAP_PROP_FORMAT = -1) y CAP_PROP_LRF_HAS_KEY_FRAME indica los
+        keyframes. Con otros backends solo se cuentan los frames.
+        """
+        cap = cv2.VideoCapture(video_path, cv2.CAP_FFMPEG, [cv2.CAP_PROP_FORMAT, -1])
+        has_keyframe_info = cap.isOpened()
+        if not has_keyframe_info:
+            cap = cv2.VideoCapture(video_path)
+            if not cap.isOpened():
+                return None
+
+        try:
+            fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+            keyframes, timestamps = [], []
+            frame_number = 0
+            while cap.grab():
+                if has_keyframe_info and cap.get(cv2.CAP_PROP_LRF_HAS_KEY_FRAME) > 0:
+                    keyframes.append(frame_number)
+                    timestamps.append(cap.get(cv2.CAP_PROP_POS_MSEC))
+                frame_number += 1
+        finally:
+            cap.release()
+
+        if not keyframes:
+            has_keyframe_info = False
+            keyframes, timestamps = [0], [0.0]
+        return cls(keyframes, timestamps, frame_number, fps, has_keyframe_info,
+                   _source_signature(video_path))
+
+    def to_dict(self) -> dict:
+        return {
+            'version': INDEX_VERSION,
+            'source': list(self.source),
+            'frame_count': self.frame_count,
+            'fps': self.fps,
+            'has_keyframe_info': self.has_keyframe_info,
+            'keyframes': self.keyframes.tolist(),
+            'timestamps': [round(t, 3) for t in self.timestamps.tolist()],
+        }
+
+    def save(self, filepath: str) -> bool:
+        """Guarda el índice (escritura atómica)"""
+        try:
+            tmp_path = filepath + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.to_dict(), f, separators=(',', ':'))
+            os.replace(tmp_path, filepath)
+            return True
+        except Exception as e:
+            print(f"Error guardando índice de keyframes: {e}")
+            return False
+
+    @classmethod
+    def load(cls, filepath: str) -> Optional['KeyframeIndex']:
+        try:
+            with open(filepath, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get('version') != INDEX_VERSION:
+            return None
+        return cls(data['keyframes'], data['timestamps'], data['frame_count'], data['fps'],
+                   data.get('has_keyframe_info', True), data.get('source', (0, 0)))
+
+    @classmethod
+    def load_or_build(cls, video_path: str) -> Optional['KeyframeIndex']:
+        """Usa el índice guardado si corresponde al archivo; si no, indexa y lo guarda"""
+        sidecar = index_path(video_path)
+        index = cls.load(sidecar)
+        if index is not None and index.source == _source_signature(video_path):
+            return index
+        index = cls.build(video_path)
+        if index is not None:
+            index.save(sidecar)
+        return index
+
+class FrameCache:
+    """Caché LRU de frames decodificados acotada por memoria"""
+
+    def __init__(self, max_bytes: int = 128 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._frames: "OrderedDict[int, np.ndarray]" = OrderedDict()
+        self._total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    def __contains__(self, frame_number: int) -> bool:
+        return frame_number in self._frames
+
+    def get(self, frame_number: int) -> Optional[np.ndarray]:
+        frame = self._frames.get(frame_number)
+        if frame is None:
+            self.misses += 1
+            return None
+        self._frames.move_to_end(frame_number)
+        self.hits += 1
+        return frame
+
+    def put(self, frame_number: int, frame: np.ndarray):
+        old = self._frames.pop(frame_number, None)
+        if old is not None:
+            self._total_bytes -= old.nbytes
+        self._frames[frame_number] = frame
+        self._total_bytes += frame.nbytes
+        while self._total_bytes > self.max_bytes and len(self._frames) > 1:
+            _, evicted = self._frames.popitem(last=False)
+            self._total_bytes -= evicted.nbytes
+
+    def clear(self):
+        self._frames.clear()
+        self._total_bytes = 0
+
+    def get_stats(self) -> dict:
+        return {
+            'frames': len(self._frames),
+            'bytes': self._total_bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
@@ -6,11 +6,18 @@ import numpy as np
 from typing import Optional, Tuple, Callable
 import threading
 import time
+from .video_index import KeyframeIndex, FrameCache
 
 class VideoManager:
     """Maneja la captura y reproducción de video"""
     
-    def __init__(self):
+    def __init__(self, frame_cache_mb: float = 128, cache_behind: int = 15):
+        """
+        Args:
+            frame_cache_mb: Memoria máxima de la caché de frames decodificados
+            cache_behind: Frames previos al destino que se guardan al saltar
+                          (retroceder frame a frame no vuelve a saltar)
+        """
         self.cap = None
         self.is_paused = True
         self.current_frame = None
@@ -19,26 +26,64 @@ class VideoManager:
         self._thread = None
         self._stop_event = threading.Event()
         
+        # Navegación en archivos: índice de keyframes, caché LRU y posición del decodificador
+        self.index: Optional[KeyframeIndex] = None
+        self.frame_cache = FrameCache(int(frame_cache_mb * 1024 * 1024))
+        self.cache_behind = cache_behind
+        self.position = 0        # Número del próximo frame que entrega cap.read()
+        self.frame_number = -1   # Número del frame actual
+        self._lock = threading.RLock()
+        self._index_thread = None
+    
+    @property
+    def is_file(self) -> bool:
+        return bool(self.video_path) and not self.video_path.startswith("Camera_")
+    
+    def _reset_navigation(self):
+        self.index = None
+        self.frame_cache.clear()
+        self.position = 0
+        self.frame_number = -1
+        
     def load_video(self, path: str) -> bool:
         """Carga un archivo de video"""
         try:
-            if self.cap:
-                self.cap.release()
-            
-            self.cap = cv2.VideoCapture(path)
-            if not self.cap.isOpened():
-                return False
+            with self._lock:
+                if self.cap:
+                    self.cap.release()
                 
-            self.video_path = path
-            # Leer primer frame
-            ret, frame = self.cap.read()
-            if ret:
-                self.current_frame = frame.copy()
+                self.cap = cv2.VideoCapture(path)
+                if not self.cap.isOpened():
+                    return False
+                    
+                self.video_path = path
+                self._reset_navigation()
+                # Leer primer frame
+                self._read()
+            
+            # Indexado de keyframes en segundo plano (se reutiliza el archivo auxiliar si existe)
+            self._index_thread = threading.Thread(target=self._load_index, args=(path,), daemon=True)
+            self._index_thread.start()
             return True
         except Exception as e:
             print(f"Error cargando video: {e}")
             return False
     
+    def _load_index(self, path: str):
+        try:
+            index = KeyframeIndex.load_or_build(path)
+        except Exception as e:
+            print(f"Error indexando video: {e}")
+            return
+        if index is not None and path == self.video_path:
+            self.index = index
+    
+    def wait_for_index(self, timeout: Optional[float] = None) -> Optional[KeyframeIndex]:
+        """Espera a que termine el indexado del video actual"""
+        if self._index_thread is not None:
+            self._index_thread.join(timeout)
+        return self.index
+    
     def load_camera(self, camera_index: int = 0) -> bool:
         """Carga una cámara"""
         try:
@@ -50,19 +95,36 @@ class VideoManager:
                 return False
                 
             self.video_path = f"Camera_{camera_index}"
+            self._reset_navigation()
             return True
         except Exception as e:
             print(f"Error cargando cámara: {e}")
             return False
     
+    def _read(self) -> Optional[np.ndarray]:
+        """Lee el próximo frame del decodificador y actualiza la posición"""
+        ret, frame = self.cap.read()
+        if not ret:
+            return None
+        self.frame_number = self.position
+        self.position += 1
+        self.current_frame = frame.copy()
+        if self.is_file:
+            self.frame_cache.put(self.frame_number, self.current_frame)
+        return frame
+    
     def get_frame(self) -> Optional[np.ndarray]:
         """Obtiene el frame actual"""
-        if self.cap and self.cap.isOpened():
-            ret, frame = self.cap.read()
-            if ret:
-                self.current_frame = frame.copy()
-                return frame
-        return self.current_frame
+        with self._lock:
+            if self.cap and self.cap.isOpened():
+                # Tras un salto servido desde la caché el decodificador quedó en otra posición
+                if self.is_file and self.frame_number >= 0 and self.position != self.frame_number + 1:
+                    frame = self.seek_frame(self.frame_number + 1)
+                    return frame if frame is not None else self.current_frame
+                frame = self._read()
+                if frame is not None:
+                    return frame
+            return self.current_frame
     
     def start_capture(self, callback: Callable = None):
         """Inicia la captura continua"""
@@ -96,15 +158,14 @@ class VideoManager:
         """Loop principal de captura"""
         while not self._stop_event.is_set():
             if not self.is_paused and self.cap and self.cap.isOpened():
-                ret, frame = self.cap.read()
-                if ret:
-                    self.current_frame = frame.copy()
-                    if self.frame_callback:
-                        self.frame_callback(frame)
-                else:
-                    # Si el video terminó, reiniciar
-                    if self.video_path and not self.video_path.startswith("Camera_"):
+                with self._lock:
+                    frame = self._read()
+                    if frame is None and self.is_file:
+                        # Si el video terminó, reiniciar
                         self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                        self.position = 0
+                if frame is not None and self.frame_callback:
+                    self.frame_callback(frame)
             
             time.sleep(0.033)  # ~30 FPS
     
@@ -117,18 +178,79 @@ class VideoManager:
             'width': int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
             'height': int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
             'fps': self.cap.get(cv2.CAP_PROP_FPS),
-            'frame_count': int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT)),
-            'current_frame': int(self.cap.get(cv2.CAP_PROP_POS_FRAMES))
+            'frame_count': self.frame_count(),
+            'current_frame': self.frame_number if self.is_file else int(self.cap.get(cv2.CAP_PROP_POS_FRAMES)),
+            'keyframes': len(self.index) if self.index is not None and self.index.has_keyframe_info else 0
         }
     
-    def seek_frame(self, frame_number: int):
-        """Salta a un frame específico"""
-        if self.cap:
+    def frame_count(self) -> int:
+        """Cantidad de frames (exacta si el video ya está indexado)"""
+        if self.index is not None:
+            return self.index.frame_count
+        return int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT)) if self.cap else 0
+    
+    def seek_frame(self, frame_number: int) -> Optional[np.ndarray]:
+        """
+        Salta a un frame específico y lo retorna
+        
+        Los frames en caché se devuelven sin decodificar; si no, se decodifica
+        hacia adelante desde la posición actual (si no hay un keyframe en el
+        medio) o desde el keyframe anterior del índice.
+        """
+        if not self.cap:
+            return None
+        with self._lock:
+            if not self.is_file:
+                self.cap.set(cv2.CAP_PROP_POS_FRAMES, frame_number)
+                return None
+            
+            count = self.frame_count()
+            frame_number = max(0, min(frame_number, count - 1)) if count > 0 else max(0, frame_number)
+            frame = self.frame_cache.get(frame_number)
+            if frame is None:
+                frame = self._decode_frame(frame_number)
+                if frame is None:
+                    return None
+            self.current_frame = frame
+            self.frame_number = frame_number
+            return frame.copy()
+    
+    def step_frame(self, delta: int = 1) -> Optional[np.ndarray]:
+        """Avanza (o retrocede con delta negativo) frame a frame"""
+        return self.seek_frame(self.frame_number + delta)
+    
+    def _decode_frame(self, frame_number: int) -> Optional[np.ndarray]:
+        """Decodifica un frame; guarda en caché los cache_behind frames previos"""
+        index = self.index
+        if index is not None and index.has_keyframe_info:
+            start = index.keyframe_before(frame_number)
+            # Seguir decodificando es más barato que saltar si no hay un keyframe en el medio
+            if not (start <= self.position <= frame_number):
+                self.cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+                self.position = start
+        elif not (self.position <= frame_number <= self.position + self.cache_behind):
+            # Sin índice: salto directo como antes
             self.cap.set(cv2.CAP_PROP_POS_FRAMES, frame_number)
+            self.position = frame_number
+        
+        frame = None
+        first_cached = frame_number - self.cache_behind
+        while self.position <= frame_number:
+            if self.position >= first_cached:
+                ret, frame = self.cap.read()
+                if not ret:
+                    return None
+                self.frame_cache.put(self.position, frame)
+            elif not self.cap.grab():
+                return None
+            self.position += 1
+        return frame
     
     def release(self):
         """Libera recursos"""
         self.stop_capture()
-        if self.cap:
-            self.cap.release()
-            self.cap = None
+        with self._lock:
+            if self.cap:
+                self.cap.release()
+                self.cap = None
+            self._reset_navigation()
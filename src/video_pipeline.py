@@ -0,0 +1,230 @@
+"""
+Pipeline de video en etapas: decodificación y análisis en hilos propios
+Las etapas se conectan con colas acotadas y el hilo de visualización solo toma
+el resultado más reciente, de modo que los FPS logrados quedan limitados por
+la etapa más lenta y no por la suma de todas.
+
+Cada frame lleva la generación en la que se decodificó; reiniciar abre una
+generación nueva y los frames y resultados de la anterior (en cola o en pleno
+análisis) se descartan en lugar de mostrarse. Pausar no descarta frames: al
+reanudar la reproducción sigue desde el siguiente frame decodificado.
+"""
+import queue
+import threading
+import time
+from typing import Any, Callable, Optional, Tuple
+import cv2
+import numpy as np
+
+# Analizador: frame BGR -> resultado (el frame puede anotarse en el lugar)
+AnalyzeFunction = Callable[[np.ndarray], Any]
+
+class LatestResult:
+    """Casilla de un solo elemento: cada publicación reemplaza a la anterior"""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._item: Optional[Tuple[int, np.ndarray, Any]] = None
+        self._generation = 0
+        self.replaced = 0  # Resultados descartados sin llegar a mostrarse
+
+    def publish(self, item: Tuple[int, np.ndarray, Any], generation: int = 0):
+        with self._condition:
+            if self._item is not None:
+                self.replaced += 1
+            self._item = item
+            self._generation = generation
+            self._condition.notify_all()
+
+    def take(self, timeout: Optional[float] = None,
+             generation: Optional[int] = None) -> Optional[Tuple[int, np.ndarray, Any]]:
+        """
+        Retira el resultado más reciente (espera hasta timeout si no hay ninguno)
+
+        Con generation, un resultado de otra generación se descarta y se retorna None.
+        """
+        with self._condition:
+            if self._item is None:
+                self._condition.wait(timeout)
+            item, self._item = self._item, None
+            if item is not None and generation is not None and self._generation != generation:
+                return None
+            return item
+
+    def clear(self):
+        with self._condition:
+            self._item = None
+
+class FramePipeline:
+    """Decodifica y analiza frames de un VideoCapture en hilos separados"""
+
+    def __init__(self, capture: cv2.VideoCapture, analyze: AnalyzeFunction,
+                 queue_size: int = 4, loop: bool = True, pace: bool = True):
+        """
+        Args:
+            capture: Captura ya abierta (solo la usa el hilo de decodificación)
+            analyze: Función de análisis ejecutada en el hilo de análisis
+            queue_size: Frames decodificados en espera como máximo
+            loop: Reiniciar desde el principio al llegar al final
+            pace: Limitar la decodificación a los FPS del video
+        """
+        self.capture = capture
+        self.analyze = analyze
+        self.loop = loop
+        fps = capture.get(cv2.CAP_PROP_FPS) if pace else 0
+        self.frame_interval = 1.0 / fps if fps and fps > 0 else 0.0
+
+        self.decoded = 0
+        self.analyzed = 0
+        self.finished = threading.Event()  # Fin del video (sin loop) o error de lectura
+
+        self._frames: "queue.Queue[Tuple[int, int, np.ndarray]]" = queue.Queue(maxsize=max(1, queue_size))
+        self._latest = LatestResult()
+        self._stop = threading.Event()
+        self._running = threading.Event()
+        self._running.set()
+        self._restart = threading.Event()
+        self._generation = 0  # Se incrementa al pausar o reiniciar
+        self._threads = []
+
+    # --- Control --------------------------------------------------------
+
+    def start(self):
+        """Inicia los hilos de decodificación y análisis"""
+        self._threads = [
+            threading.Thread(target=self._decode_loop, name="PipelineDecode", daemon=True),
+            threading.Thread(target=self._analyze_loop, name="PipelineAnalyze", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout: float = 2.0):
+        """Detiene los hilos y espera a que terminen"""
+        self._stop.set()
+        self._running.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _new_generation(self):
+        """Invalida los frames en cola y el análisis en curso"""
+        self._generation += 1
+        self._drain_frames()
+        self._latest.clear()
+
+    def pause(self):
+        # Sin generación nueva: los frames en cola siguen siendo los próximos
+        # y descartarlos haría saltar la reproducción al reanudar
+        self._running.clear()
+        self._latest.clear()
+
+    def resume(self):
+        self._running.set()
+
+    @property
+    def paused(self) -> bool:
+        return not self._running.is_set()
+
+    def restart(self):
+        """Vuelve al primer frame (lo ejecuta el hilo de decodificación)"""
+        # La bandera va antes que la generación: un frame etiquetado con la
+        # generación nueva siempre se lee después de procesar el reinicio
+        self._restart.set()
+        self._new_generation()
+        self._running.set()
+
+    # --- Consumo --------------------------------------------------------
+
+    def latest(self, timeout: Optional[float] = None) -> Optional[Tuple[int, np.ndarray, Any]]:
+        """Último resultado listo como (número de frame, frame anotado, resultado)"""
+        return self._latest.take(timeout, self._generation)
+
+    def is_done(self) -> bool:
+        """True cuando el video terminó y ya se analizaron todos los frames pendientes"""
+        return self.finished.is_set() and not any(thread.is_alive() for thread in self._threads)
+
+    @property
+    def dropped(self) -> int:
+        """Resultados reemplazados antes de mostrarse (visualización más lenta)"""
+        return self._latest.replaced
+
+    # --- Etapas ---------------------------------------------------------
+
+    def _put_frame(self, item: Tuple[int, int, np.ndarray]) -> bool:
+        """Encola un frame esperando espacio; False si se pidió detener o reiniciar"""
+        while not self._stop.is_set() and not self._restart.is_set():
+            try:
+                self._frames.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _drain_frames(self):
+        while True:
+            try:
+                self._frames.get_nowait()
+            except queue.Empty:
+                return
+
+    def _decode_loop(self):
+        frame_number = 0
+        next_time = time.perf_counter()
+        while not self._stop.is_set():
+            if not self._running.wait(0.1):
+                next_time = time.perf_counter()
+                continue
+
+            generation = self._generation
+            if self._restart.is_set():
+                self._restart.clear()
+                self.capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                self._drain_frames()
+                self._latest.clear()
+                frame_number = 0
+                next_time = time.perf_counter()
+                generation = self._generation
+
+            success, frame = self.capture.read()
+            if not success:
+                # Fin del archivo: se detecta por el fallo de read(), sin consultar propiedades
+                if self.loop and frame_number > 0:
+                    self.capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                    frame_number = 0
+                    continue
+                self.finished.set()
+                break
+
+            if self.frame_interval:
+                # Mantener la velocidad original del video
+                next_time += self.frame_interval
+                delay = next_time - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    next_time = time.perf_counter()
+
+            if self._put_frame((generation, frame_number, frame)):
+                self.decoded += 1
+            frame_number += 1
+
+    def _analyze_loop(self):
+        while not self._stop.is_set():
+            if not self._running.wait(0.1):
+                continue  # En pausa los frames esperan en la cola
+            try:
+                generation, frame_number, frame = self._frames.get(timeout=0.1)
+            except queue.Empty:
+                if self.finished.is_set():
+                    break
+                continue
+            if generation != self._generation:
+                continue  # Frame anterior a un reinicio
+            try:
+                result = self.analyze(frame)
+            except Exception as e:
+                print(f"Error analizando frame {frame_number}: {e}")
+                continue
+            self.analyzed += 1
+            if generation == self._generation:
+                self._latest.publish((frame_number, frame, result), generation)
@@ -4,9 +4,12 @@ Replica exactamente el preprocesamiento y detección que funciona
 """
 import cv2
 import numpy as np
-from typing import List, Dict, Optional
-from datetime import datetime
-from .models import ParkingSpace, OccupancyStatus, AnalysisStats
+from typing import List, Dict, Optional, Union
+from .models import ParkingSpace, OccupancyStatus, FrameOccupancy, BatchOccupancy, AnalysisStats
+from .batch_analysis import Frames, frame_list, map_frames, to_gray, valid_space_ids
+from .roi_stats import boxes_from_spaces, roi_nonzero_counts
+from .space_labels import get_label_map, has_polygons
+from .overlay import SpaceOverlay, HIDDEN
 
 class WorkingOccupancyAnalyzer:
     """Analizador basado en el código que REALMENTE funciona"""
@@ -19,71 +22,90 @@ class WorkingOccupancyAnalyzer:
                            >= pixel_threshold = OCUPADO (hay un auto)
         """
         self.pixel_threshold = pixel_threshold
+        # Overlay de visualización: libre verde grueso, ocupado rojo fino (como main.py)
+        self.overlay = SpaceOverlay(
+            styles={0: ((0, 255, 0), 5), 1: ((0, 0, 255), 2)},
+            label_anchor="bottom", label_offset=(0, -3), font_scale=0.5, font_thickness=1,
+            volatile_labels=True  # El conteo de píxeles cambia en cada frame
+        )
+        # Mapa de etiquetas para layouts con espacios poligonales (se reconstruye al cambiar)
+        self._label_map = None
+        
+    def _decide(self, counts: np.ndarray, areas: np.ndarray):
+        """Ocupación y confianza a partir de los conteos (vectorizado, 1-D o T×N)"""
+        # LÓGICA EXACTA del main.py:
+        # count < 900 = LIBRE (color verde)
+        # count >= 900 = OCUPADO (color rojo)
+        is_occupied = counts >= self.pixel_threshold
         
-    def analyze_spaces(self, frame: np.ndarray, spaces: List[ParkingSpace]) -> List[OccupancyStatus]:
+        # Confianza basada en qué tan lejos está del umbral (área = máximo posible)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            confidence = np.minimum(np.abs(counts - self.pixel_threshold) / (areas * 0.3), 1.0)
+        return is_occupied, confidence
+    
+    def analyze_spaces(self, frame: np.ndarray, spaces: List[ParkingSpace]) -> FrameOccupancy:
         """
         Analiza espacios usando el método que REALMENTE funciona
         Replica exactamente el main.py exitoso
-        """
-        results = []
         
+        Los píxeles blancos de todos los espacios se cuentan con una única
+        imagen integral del frame preprocesado (recortes ajustados al frame).
+        
+        Returns:
+            FrameOccupancy con un único timestamp (iterable como OccupancyStatus)
+        """
         # PREPROCESAMIENTO EXACTO del main.py que funciona
-        img_gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        img_blur = cv2.GaussianBlur(img_gray, (3, 3), 1)
-        img_threshold = cv2.adaptiveThreshold(
-            img_blur, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-            cv2.THRESH_BINARY_INV, 25, 16
-        )
-        img_median = cv2.medianBlur(img_threshold, 5)
-        kernel = np.ones((3, 3), np.uint8)
-        img_processed = cv2.dilate(img_median, kernel, iterations=1)
+        img_processed = self.get_processed_frame(frame)
         
-        for space in spaces:
-            try:
-                # Extraer exactamente como en main.py
-                x, y = space.x, space.y
-                width, height = space.width, space.height
-                
-                # Recortar región del espacio
-                img_crop = img_processed[y:y + height, x:x + width]
-                
-                if img_crop.size == 0:
-                    continue
-                
-                # DETECCIÓN EXACTA: contar píxeles blancos
-                pixel_count = cv2.countNonZero(img_crop)
-                
-                # LÓGICA EXACTA del main.py:
-                # count < 900 = LIBRE (color verde)
-                # count >= 900 = OCUPADO (color rojo)
-                is_occupied = pixel_count >= self.pixel_threshold
-                
-                # Calcular confianza basada en qué tan lejos está del umbral
-                distance_from_threshold = abs(pixel_count - self.pixel_threshold)
-                max_pixels = width * height  # Máximo posible
-                confidence = min(distance_from_threshold / (max_pixels * 0.3), 1.0)
-                
-                space_id = space.id or f"space_{len(results)}"
-                status = OccupancyStatus(
-                    space_id=space_id,
-                    is_occupied=is_occupied,
-                    confidence=confidence,
-                    timestamp=datetime.now().isoformat()
-                )
-                results.append(status)
-                
-            except Exception as e:
-                # Error fallback
-                space_id = space.id or f"space_{len(results)}"
-                status = OccupancyStatus(
-                    space_id=space_id,
-                    is_occupied=False,
-                    confidence=0.0,
-                    timestamp=datetime.now().isoformat()
-                )
-                results.append(status)
+        # DETECCIÓN EXACTA: contar píxeles blancos (se omiten recortes vacíos)
+        counts, areas, valid = self._count_pixels(img_processed, spaces)
+        is_occupied, confidence = self._decide(counts[valid], areas[valid])
         
-        return results
+        return FrameOccupancy(valid_space_ids(spaces, valid), is_occupied, confidence, counts[valid])
+    
+    def _count_pixels(self, img_processed: np.ndarray, spaces: List[ParkingSpace]):
+        """
+        Píxeles blancos, área y validez de cada espacio
+        
+        Los rectángulos se cuentan con la imagen integral; si el layout tiene
+        polígonos se usa el mapa de etiquetas (un bincount por frame).
+        """
+        if has_polygons(spaces):
+            self._label_map = get_label_map(self._label_map, spaces, img_processed.shape)
+            return (self._label_map.counts(img_processed),
+                    self._label_map.areas.astype(np.float64), self._label_map.valid)
+        boxes = boxes_from_spaces(spaces)
+        counts, valid = roi_nonzero_counts(img_processed, boxes)
+        return counts, (boxes[:, 2] * boxes[:, 3]).astype(np.float64), valid
+    
+    def analyze_batch(self, frames: Frames, spaces: List[ParkingSpace],
+                      workers: Optional[int] = None,
+                      is_batch: Optional[bool] = None) -> BatchOccupancy:
+        """
+        Analiza un lote de frames (arreglo apilado T×H×W[×3] o lista) con la misma lógica que analyze_spaces
+        
+        El preprocesamiento y el conteo por integral de cada frame corren en un
+        pool de hilos; umbral y confianza se calculan sobre la matriz T×N.
+        
+        Args:
+            frames: Frames BGR o en escala de grises, todos del mismo tamaño
+            spaces: Espacios a analizar
+            workers: Hilos para el trabajo por frame (None = núcleos disponibles)
+            is_batch: Cómo leer un arreglo de 3 ejes (ver frame_list)
+        """
+        frames = frame_list(frames, is_batch)
+        if not frames:
+            return BatchOccupancy.empty()
+        # El mapa de etiquetas se construye antes de repartir los frames entre hilos
+        _, areas, valid = self._count_pixels(np.zeros(frames[0].shape[:2], dtype=np.uint8), spaces)
+        
+        def count_pixels(frame: np.ndarray) -> np.ndarray:
+            return self._count_pixels(self.get_processed_frame(frame), spaces)[0]
+        
+        counts = np.stack(map_frames(count_pixels, frames, workers)).reshape(len(frames), -1)[:, valid]
+        is_occupied, confidence = self._decide(counts, areas[valid])
+        
+        return BatchOccupancy(valid_space_ids(spaces, valid), is_occupied, confidence, counts)
     
     def analyze_with_debug_info(self, frame: np.ndarray, spaces: List[ParkingSpace]) -> List[Dict]:
         """
@@ -148,7 +170,7 @@ class WorkingOccupancyAnalyzer:
         Devuelve el frame procesado exactamente como en main.py
         Útil para debugging visual
         """
-        img_gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        img_gray = to_gray(frame)
         img_blur = cv2.GaussianBlur(img_gray, (3, 3), 1)
         img_threshold = cv2.adaptiveThreshold(
             img_blur, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
@@ -172,31 +194,23 @@ class WorkingOccupancyAnalyzer:
         img_result = frame.copy()
         
         space_counter = 0  # Contador de espacios libres
+        states = [HIDDEN] * len(spaces)
+        labels = [""] * len(spaces)
         
         for debug_info in debug_results:
             if 'error' in debug_info:
                 continue
-                
-            x, y = debug_info['position']
-            width, height = debug_info['size']
-            pixel_count = debug_info['pixel_count']
-            color = debug_info['color']
-            thickness = debug_info['thickness']
             
             if not debug_info['is_occupied']:
                 space_counter += 1
             
-            # Dibujar rectángulo como en main.py
-            cv2.rectangle(img_result, (x, y), (x + width, y + height), color, thickness)
-            
-            # Mostrar conteo de píxeles como en main.py
-            try:
-                # Simular cvzone.putTextRect con cv2.putText
-                text = str(pixel_count)
-                cv2.putText(img_result, text, (x, y + height - 3), 
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1)
-            except:
-                pass
+            # Rectángulo y conteo de píxeles como en main.py
+            index = debug_info['space_index']
+            states[index] = 1 if debug_info['is_occupied'] else 0
+            labels[index] = str(debug_info['pixel_count'])
+        
+        # Solo se redibujan los espacios cuyo estado o conteo cambió
+        self.overlay.render(img_result, spaces, states, labels)
         
         # Mostrar total como en main.py
         total_spaces = len([r for r in debug_results if 'error' not in r])
@@ -206,21 +220,9 @@ class WorkingOccupancyAnalyzer:
         
         return img_result
     
-    def calculate_statistics(self, occupancy_results: List[OccupancyStatus]) -> AnalysisStats:
-        """Calcula estadísticas generales"""
-        total_spaces = len(occupancy_results)
-        occupied_spaces = sum(1 for result in occupancy_results if result.is_occupied)
-        free_spaces = total_spaces - occupied_spaces
-        
-        occupancy_rate = (occupied_spaces / total_spaces * 100) if total_spaces > 0 else 0
-        
-        return AnalysisStats(
-            total_spaces=total_spaces,
-            occupied_spaces=occupied_spaces,
-            free_spaces=free_spaces,
-            occupancy_rate=occupancy_rate,
-            timestamp=datetime.now().isoformat()
-        )
+    def calculate_statistics(self, occupancy_results: Union[FrameOccupancy, List[OccupancyStatus]]) -> AnalysisStats:
+        """Calcula estadísticas generales (desde los arreglos si es un FrameOccupancy)"""
+        return AnalysisStats.from_results(occupancy_results)
     
     def set_pixel_threshold(self, threshold: int):
         """Actualiza el umbral de píxeles"""